@@ -7,7 +7,7 @@ Features:
 - User authentication with JWT
 - Document upload and encryption
 - Ownership verification
-- TinyDB database storage
+- Pluggable database storage (TinyDB or SQLite)
 """
 
 import os
@@ -16,6 +16,7 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 
 from config import get_config
+from commands import register_commands
 from routes.auth import auth_bp
 from routes.documents import documents_bp
 from routes.admin import admin_bp
@@ -73,6 +74,9 @@ def create_app():
     app.register_blueprint(documents_bp, url_prefix='/api')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     
+    # Register CLI commands
+    register_commands(app)
+    
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
     def health_check():
@@ -106,6 +110,7 @@ def create_app():
                 },
                 'admin': {
                     'stats': 'GET /api/admin/stats',
+                    'opsStats': 'GET /api/admin/stats/ops',
                     'users': 'GET /api/admin/users',
                     'documents': 'GET /api/admin/documents',
                     'loginHistory': 'GET /api/admin/login-history',
@@ -0,0 +1,104 @@
+"""
+Database File Format Benchmark
+==============================
+Compares the TinyDB on-disk formats (`json`, `compact`, `binary`; see
+`utils.serialization`) on a realistic dataset: users with PEM key pairs
+and documents shaped like the ones /api/upload stores. For each format it
+reports the file size, the time to write the file (encode + atomic
+replace) and the time to load it back.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_formats
+    python -m benchmarks.bench_formats --users 5000 --documents 100000
+"""
+
+import os
+import sys
+import time
+import base64
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import serialization  # noqa: E402
+from utils.crypto import generate_ecc_keypair, sign_document  # noqa: E402
+from utils.storage import AtomicFileStorage  # noqa: E402
+
+
+def dataset(users: int, documents: int) -> dict:
+    # Real key and signature sizes; the content itself is irrelevant here
+    private_key, public_key = generate_ecc_keypair()
+    signature = sign_document('x' * 64, private_key)
+
+    user_table = {}
+    for i in range(users):
+        user_table[str(i + 1)] = {
+            'id': f"user_{i:012x}",
+            'username': f"user{i}",
+            'email': f"user{i}@example.com",
+            'password_hash': os.urandom(32).hex(),
+            'public_key': public_key,
+            'private_key': private_key,
+            'created_at': '2024-01-01T00:00:00.000000Z',
+        }
+
+    doc_table = {}
+    for i in range(documents):
+        doc_table[str(i + 1)] = {
+            'id': f"doc_{i:016x}",
+            'user_id': f"user_{i % max(users, 1):012x}",
+            'original_name': f"Quarterly report {i}.pdf",
+            'hash': os.urandom(32).hex(),
+            'timestamp': '2024-01-01T00:00:00.000000Z',
+            'signature': signature,
+            'blob_ref': os.urandom(32).hex(),
+            'encryption_nonce': base64.b64encode(os.urandom(12)).decode(),
+            'encryption_key': base64.b64encode(os.urandom(32)).decode(),
+            'file_size': 100_000 + i,
+            'metadata': {
+                'owner_name': 'Jane Doe',
+                'description': 'Signed copy of the original manuscript, draft 3',
+                'document_type': 'pdf',
+                'work_type': 'human_made',
+                'proof_of_work': None,
+            },
+            'created_at': '2024-01-01T00:00:00.000000Z',
+        }
+
+    return {'users': user_table, 'documents': doc_table, '_meta': {'1': {'journal_seq': 0}}}
+
+
+def best_of(repeat: int, fn) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--documents', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = dataset(args.users, args.documents)
+    encoder = 'orjson' if serialization.orjson is not None else 'json (orjson not installed)'
+    print(f"\n{args.users} users, {args.documents} documents | compact encoder: {encoder}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in serialization.FORMATS:
+            storage = AtomicFileStorage(os.path.join(tmp, f"db.{fmt}"), fmt)
+            write = best_of(args.repeat, lambda: storage.write(data))
+            load = best_of(args.repeat, storage.read)
+            assert storage.read() == data
+            size = os.path.getsize(storage.path)
+            print(f"{fmt:>8} | {size / 1e6:8.2f} MB | write {write * 1000:8.1f} ms | "
+                  f"load {load * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
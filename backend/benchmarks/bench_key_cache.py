@@ -0,0 +1,66 @@
+"""
+Key Cache Benchmark
+===================
+Measures sign_document / verify_signature throughput with PEM keys parsed
+on every call (cache disabled) and served from `utils.keycache`.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_key_cache
+    python -m benchmarks.bench_key_cache --users 100 --ops 5000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import crypto  # noqa: E402
+from utils.keycache import KeyCache  # noqa: E402
+
+
+def ops_per_s(fn, ops: int) -> float:
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return ops / (time.perf_counter() - start)
+
+
+def bench(users, ops: int, maxsize: int):
+    crypto.key_cache = cache = KeyCache(maxsize)
+    picks = [random.randrange(len(users)) for _ in range(ops)]
+    signed = []
+
+    def sign(i):
+        user_id, private_pem, _ = users[picks[i]]
+        signed.append(crypto.sign_document(f"hash:{i}:{user_id}", private_pem, user_id))
+
+    def verify(i):
+        user_id, _, public_pem = users[picks[i]]
+        assert crypto.verify_signature(f"hash:{i}:{user_id}", signed[i], public_pem, user_id)
+
+    sign_rate = ops_per_s(sign, ops)
+    verify_rate = ops_per_s(verify, ops)
+    return sign_rate, verify_rate, cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--ops', type=int, default=3000)
+    args = parser.parse_args()
+
+    random.seed(42)
+    users = [(f"user_{i:012x}",) + crypto.generate_ecc_keypair() for i in range(args.users)]
+
+    print(f"sign/verify throughput, {args.users} users, {args.ops} ops each")
+    for label, maxsize in (('no cache', 0), ('cache', 1024)):
+        sign_rate, verify_rate, stats = bench(users, args.ops, maxsize)
+        print(f"{label:>9} | sign {sign_rate:9,.0f}/s | verify {verify_rate:9,.0f}/s | "
+              f"hit rate {stats['hitRate']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Document Lookup Benchmark
+=========================
+Compares indexed lookups in TinyDBEngine against a linear TinyDB Query
+scan for the document hot paths (by id, by hash, by user_id).
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_lookups
+    python -m benchmarks.bench_lookups --sizes 1000,100000
+"""
+
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tinydb import Query  # noqa: E402
+
+from utils.storage import Index, TinyDBEngine  # noqa: E402
+
+SCHEMA = {'documents': (Index('id'), Index('hash'), Index('user_id'))}
+
+
+def make_documents(n: int, users: int = 1000):
+    for i in range(n):
+        yield {
+            'id': f"doc_{i:016x}",
+            'user_id': f"user_{i % users:012x}",
+            'hash': hashlib.sha256(str(i).encode()).hexdigest(),
+            'original_name': f"file_{i}.pdf",
+            'timestamp': f"2024-01-01T00:00:{i % 60:02d}Z",
+            'file_size': 1024,
+        }
+
+
+def per_call_us(fn, args, repeat: int) -> float:
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(args[i % len(args)])
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def bench(n: int, scans: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = TinyDBEngine(os.path.join(tmp, 'db.json'), SCHEMA)
+        t0 = time.perf_counter()
+        engine.insert_many('documents', make_documents(n))
+        load_s = time.perf_counter() - t0
+
+        sample = random.sample(range(n), min(n, 1000))
+        ids = [f"doc_{i:016x}" for i in sample]
+        hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in sample]
+        users = [f"user_{i % 1000:012x}" for i in sample]
+
+        by_id = per_call_us(lambda v: engine.get('documents', 'id', v), ids, 10000)
+        by_hash = per_call_us(lambda v: engine.get('documents', 'hash', v), hashes, 10000)
+        by_user = per_call_us(lambda v: engine.search('documents', 'user_id', v), users, 1000)
+
+        table = engine.db.table('documents')
+        table.clear_cache()
+        doc = Query()
+        scan = per_call_us(lambda v: table.search(doc.hash == v), hashes[:scans], scans)
+        engine.close()
+
+    print(f"{n:>9,} docs | load {load_s:7.2f}s | "
+          f"id {by_id:7.2f}us | hash {by_hash:7.2f}us | user_id {by_user:8.2f}us | "
+          f"scan by hash {scan:12.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,100000,1000000')
+    parser.add_argument('--scans', type=int, default=5, help='Linear scans to time per size')
+    args = parser.parse_args()
+
+    random.seed(42)
+    print("Indexed lookups vs. linear Query scan (per call)")
+    for n in (int(s) for s in args.sizes.split(',')):
+        bench(n, args.scans)
+
+
+if __name__ == '__main__':
+    main()
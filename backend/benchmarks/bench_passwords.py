@@ -0,0 +1,113 @@
+"""
+Password Hashing Benchmark
+==========================
+Measures /api/login throughput and latency (p50/p99) at each password hash
+cost setting, with concurrent clients going through the bounded hashing
+pool (`utils.passwords`). Clients turned away with 503 (pool and queue
+full) retry; the 503s are counted and the wait is part of their latency.
+
+Runs against a throwaway database in a temporary folder.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_passwords
+    python -m benchmarks.bench_passwords --clients 32 --workers 2 --queue 4
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The database singleton reads its location from the environment on import
+_tmp = tempfile.TemporaryDirectory()
+os.environ.update({
+    'DATABASE_PATH': os.path.join(_tmp.name, 'db.json'),
+    'SQLITE_DATABASE_PATH': os.path.join(_tmp.name, 'db.sqlite3'),
+    'UPLOAD_FOLDER': os.path.join(_tmp.name, 'uploads'),
+    'LOGIN_LOG_DIR': os.path.join(_tmp.name, 'logins'),
+    'SNAPSHOT_DIR': os.path.join(_tmp.name, 'snapshots'),
+})
+
+from app import app  # noqa: E402
+from routes import auth  # noqa: E402
+from utils.passwords import PasswordHasher, argon2  # noqa: E402
+
+SETTINGS = [
+    ('scrypt ln=14 (16 MB)', {'scheme': 'scrypt', 'scrypt_log_n': 14}),
+    ('scrypt ln=15 (32 MB)', {'scheme': 'scrypt', 'scrypt_log_n': 15}),
+    ('scrypt ln=16 (64 MB)', {'scheme': 'scrypt', 'scrypt_log_n': 16}),
+]
+if argon2 is not None:
+    SETTINGS += [
+        ('argon2id t=3 (64 MB)', {'scheme': 'argon2id', 'argon2_time_cost': 3, 'argon2_memory_cost': 65536}),
+        ('argon2id t=2 (256 MB)', {'scheme': 'argon2id', 'argon2_time_cost': 2, 'argon2_memory_cost': 262144}),
+    ]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def run(label: str, settings: dict, clients: int, logins: int, workers: int, queue: int):
+    auth.password_hasher = hasher = PasswordHasher(workers=workers, queue=queue, **settings)
+    email = f"bench{len(label)}_{time.monotonic_ns()}@example.com"
+    client = app.test_client()
+    response = client.post('/api/register', json={'username': email, 'email': email, 'password': 'bench-password'})
+    assert response.status_code == 201, response.get_json()
+
+    latencies, busy = [], []
+    lock = threading.Lock()
+    counter = iter(range(logins))
+
+    def worker():
+        local_client = app.test_client()
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            t0 = time.perf_counter()
+            # A client turned away with 503 backs off briefly and retries
+            while True:
+                status = local_client.post('/api/login', json={'email': email, 'password': 'bench-password'}).status_code
+                assert status in (200, 503), status
+                if status == 200:
+                    break
+                with lock:
+                    busy.append(status)
+                time.sleep(0.1)
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - start
+
+    print(f"{label:>22} | {len(latencies) / total:7.1f} logins/s | p50 {percentile(latencies, 0.5) * 1000:7.1f} ms | "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms | 503s {len(busy):4} | scheme {hasher.scheme}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queue', type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"login throughput, {args.clients} clients, {args.logins} logins, "
+          f"{args.workers} hashing workers, queue {args.queue}, {os.cpu_count()} CPUs")
+    for label, settings in SETTINGS:
+        run(label, settings, args.clients, args.logins, args.workers, args.queue)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Key Rotation Benchmark
+======================
+Measures rotating the master key (KEK) with envelope encryption, i.e.
+`RewrapJob` rewrapping every document's data key in the database, against
+the alternative of re-encrypting every document's content under a new key.
+Rewrapping cost follows the number of documents; re-encryption follows
+their total size.
+
+Runs against a throwaway database in a temporary folder.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_rewrap
+    python -m benchmarks.bench_rewrap --cases 200x1024,200x1048576,2000x1024
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The database singleton reads its location from the environment on import
+_tmp = tempfile.TemporaryDirectory()
+os.environ.update({
+    'DATABASE_PATH': os.path.join(_tmp.name, 'db.json'),
+    'SQLITE_DATABASE_PATH': os.path.join(_tmp.name, 'db.sqlite3'),
+    'UPLOAD_FOLDER': os.path.join(_tmp.name, 'uploads'),
+    'LOGIN_LOG_DIR': os.path.join(_tmp.name, 'logins'),
+    'SNAPSHOT_DIR': os.path.join(_tmp.name, 'snapshots'),
+    'ENCRYPTION_KEKS': '',
+})
+
+from utils.crypto import SegmentEncryptor, SegmentDecryptor  # noqa: E402
+from utils.database import db, split_document  # noqa: E402
+from utils.envelope import KeyRing, RewrapJob, parse_keks, generate_kek  # noqa: E402
+
+
+def encrypt(doc_id: str, data: bytes, key: bytes = None):
+    encryptor = SegmentEncryptor(doc_id, key)
+    return encryptor, encryptor.update(data) + encryptor.finalize()
+
+
+def reencrypt_all(docs) -> float:
+    """Decrypt and re-encrypt every document under a fresh key."""
+    start = time.perf_counter()
+    for doc_id, encryptor, ciphertext in docs:
+        decryptor = SegmentDecryptor(doc_id, encryptor.key, encryptor.params['nonce'], len(ciphertext))
+        stride = decryptor.segment_size + 16
+        plain = b''.join(decryptor.decrypt_segment(i, ciphertext[i * stride:(i + 1) * stride])
+                         for i in range(decryptor.segments))
+        encrypt(doc_id, plain)
+    return time.perf_counter() - start
+
+
+def rewrap_all(count: int, old: KeyRing, new: KeyRing, docs) -> float:
+    db.clear_all()
+    records = [{'id': doc_id, 'hash': doc_id, 'user_id': 'user_bench',
+                **encryptor.params, **old.wrap(doc_id, encryptor.key)}
+               for doc_id, encryptor, _ in docs[:count]]
+    metas, payloads = zip(*(split_document(record) for record in records))
+    db.engine.insert_many(db.document_payloads, payloads)
+    db.engine.insert_many(db.documents, metas)
+    db.wait_for_commit()
+    job = RewrapJob(db, new, 0, os.path.join(_tmp.name, 'rewrap.lock'))
+    start = time.perf_counter()
+    result = job.run()
+    elapsed = time.perf_counter() - start
+    assert result['rewrapped'] == count and not job.pending()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', default='200x1024,200x1048576,2000x1024',
+                        help='comma-separated DOCSxBYTES cases')
+    args = parser.parse_args()
+
+    keks = parse_keks(','.join((generate_kek('old'), generate_kek('new'))))
+    old, new = KeyRing(keks, 'old'), KeyRing(keks, 'new')
+
+    print("KEK rotation: rewrap data keys vs re-encrypt content")
+    for case in args.cases.split(','):
+        count, size = (int(n) for n in case.split('x'))
+        payload = os.urandom(size)
+        docs = []
+        for i in range(count):
+            doc_id = f"doc_{i:016x}"
+            docs.append((doc_id,) + encrypt(doc_id, payload))
+
+        rewrap_s = rewrap_all(count, old, new, docs)
+        reencrypt_s = reencrypt_all(docs)
+        total_mb = count * size / 1e6
+        print(f"{count:>6} docs x {size:>9,} B ({total_mb:8.1f} MB) | rewrap {rewrap_s * 1000:8.1f} ms "
+              f"({count / rewrap_s:8,.0f} docs/s) | re-encrypt {reencrypt_s * 1000:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
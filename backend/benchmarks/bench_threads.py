@@ -0,0 +1,126 @@
+"""
+Threaded Read Throughput Benchmark
+==================================
+Measures request throughput for the read-heavy endpoints (`/api/verify`
+by hash and `/api/download`) when one app instance serves requests from
+several threads, as with `gunicorn --worker-class gthread --threads N`.
+A background thread keeps uploading documents so readers compete with
+writes.
+
+Each thread count runs twice: with the TinyDB engine's reader/writer lock,
+and with a single exclusive lock (the previous behaviour) for comparison.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_threads
+    python -m benchmarks.bench_threads --threads 1,2,4,8,16 --requests 2000 --size 262144
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+class ExclusiveLock:
+    """Stand-in for the old single RLock: readers serialize as well."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    def read(self):
+        return self._lock
+
+    def write(self):
+        return self._lock
+
+
+def upload(client, headers, payload: bytes, name: str) -> dict:
+    r = client.post('/api/upload', headers=headers, content_type='multipart/form-data',
+                    data={'file': (io.BytesIO(payload), name)})
+    assert r.status_code == 201, r.get_json()
+    return r.get_json()['document']
+
+
+def run(app, headers, docs, threads: int, requests: int, writes: bool) -> float:
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+    stop = threading.Event()
+
+    def reader(n):
+        client = app.test_client()
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            doc = docs[(n + i) % len(docs)]
+            if i % 2:
+                r = client.post('/api/verify', json={'hash': doc['hash']})
+                assert r.get_json()['verified']
+            else:
+                r = client.get(f"/api/download/{doc['id']}", headers=headers)
+                assert r.status_code == 200
+
+    def writer():
+        client = app.test_client()
+        n = 0
+        while not stop.is_set():
+            upload(client, headers, os.urandom(4096), f"w{n}.txt")
+            n += 1
+
+    background = threading.Thread(target=writer) if writes else None
+    if background:
+        background.start()
+    start = time.perf_counter()
+    pool = [threading.Thread(target=reader, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    if background:
+        background.join()
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', default='1,2,4,8')
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per run')
+    parser.add_argument('--documents', type=int, default=50)
+    parser.add_argument('--size', type=int, default=64 * 1024, help='Document size in bytes')
+    parser.add_argument('--no-writes', action='store_true', help='Disable the background uploader')
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='inventa-threads-'))
+    os.environ['STORAGE_ENGINE'] = 'tinydb'
+
+    from app import app
+    from utils.database import db
+    from utils.rwlock import RWLock
+
+    client = app.test_client()
+    r = client.post('/api/register', json={'username': 'bench', 'email': 'bench@example.com', 'password': 'pw'})
+    headers = {'Authorization': f"Bearer {r.get_json()['token']}"}
+    docs = [upload(client, headers, os.urandom(args.size), f"d{i}.txt") for i in range(args.documents)]
+
+    print(f"\n{os.cpu_count()} CPUs | {args.requests} requests per run | "
+          f"{args.size // 1024} KB documents | background writes: {not args.no_writes}")
+    for threads in (int(t) for t in args.threads.split(',')):
+        results = []
+        for lock in (RWLock(), ExclusiveLock()):
+            db.engine._rw = lock
+            results.append(run(app, headers, docs, threads, args.requests, not args.no_writes))
+        print(f"{threads:>3} threads | rwlock {results[0]:8.0f} req/s | "
+              f"exclusive {results[1]:8.0f} req/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Write-Behind Benchmark
+======================
+Measures per-write latency (p50/p99) for concurrent document inserts on
+TinyDBEngine, with and without write-behind group commit. In write-behind
+mode every writer still waits for its commit ticket, i.e. the write is
+durable before it is counted.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_write_behind
+    python -m benchmarks.bench_write_behind --threads 1,8,32 --existing 5000
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.storage import Index, TinyDBEngine  # noqa: E402
+
+SCHEMA = {'documents': (Index('id'), Index('hash'), Index('user_id'))}
+
+
+def record(i: int) -> dict:
+    return {
+        'id': f"doc_{i:016x}",
+        'user_id': f"user_{i % 100:012x}",
+        'hash': f"{i:064x}",
+        'original_name': f"file_{i}.pdf",
+        'blob_ref': f"{i:064x}",
+    }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(write_behind: bool, threads: int, writes: int, existing: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = TinyDBEngine(os.path.join(tmp, 'db.json'), SCHEMA, write_behind=write_behind)
+        engine.insert_many('documents', (record(i) for i in range(existing)))
+        engine.wait_for_commit()
+
+        latencies = []
+        lock = threading.Lock()
+        counter = iter(range(existing, existing + writes))
+
+        def worker():
+            local = []
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    break
+                t0 = time.perf_counter()
+                engine.insert('documents', record(i))
+                engine.wait_for_commit()
+                local.append(time.perf_counter() - t0)
+            with lock:
+                latencies.extend(local)
+
+        start = time.perf_counter()
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+        engine.close()
+
+    mode = 'write-behind ' if write_behind else 'write-through'
+    print(f"{mode} | {threads:>3} threads | {writes / elapsed:8.0f} writes/s | "
+          f"p50 {percentile(latencies, 0.50) * 1000:8.2f}ms | "
+          f"p99 {percentile(latencies, 0.99) * 1000:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', default='1,4,16')
+    parser.add_argument('--writes', type=int, default=400)
+    parser.add_argument('--existing', type=int, default=2000, help='Records preloaded into the table')
+    args = parser.parse_args()
+
+    for threads in (int(t) for t in args.threads.split(',')):
+        for write_behind in (False, True):
+            run(write_behind, threads, args.writes, args.existing)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Multi-Worker Stress Test
+========================
+Runs several worker processes against the same data directory, each
+with its own app instance (like `gunicorn wsgi:app -w 4`), doing
+concurrent registrations, logins and uploads. When all of them are done,
+a fresh Database instance must see every user, document and login record
+the workers created. Exits non-zero if any record was lost.
+
+Usage (from the backend folder):
+    python -m benchmarks.stress_workers
+    python -m benchmarks.stress_workers --workers 4 --users 25 --engine sqlite
+"""
+
+import io
+import os
+import sys
+import argparse
+import tempfile
+import multiprocessing
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+def worker(worker_id: int, users: int, uploads: int, queue):
+    sys.path.insert(0, BACKEND)
+    from app import app
+
+    client = app.test_client()
+    created = {'users': [], 'documents': [], 'logins': 0}
+
+    for u in range(users):
+        email = f"w{worker_id}u{u}@example.com"
+        r = client.post('/api/register', json={
+            'username': f"w{worker_id}u{u}", 'email': email, 'password': 'pw'
+        })
+        assert r.status_code == 201, r.get_json()
+        body = r.get_json()
+        created['users'].append(body['user']['id'])
+        created['logins'] += 1
+
+        r = client.post('/api/login', json={'email': email, 'password': 'wrong'})
+        assert r.status_code == 401
+        r = client.post('/api/login', json={'email': email, 'password': 'pw'})
+        assert r.status_code == 200
+        created['logins'] += 2
+
+        headers = {'Authorization': f"Bearer {body['token']}"}
+        for n in range(uploads):
+            payload = f"worker {worker_id} user {u} file {n}".encode() + os.urandom(64)
+            r = client.post('/api/upload', headers=headers, content_type='multipart/form-data',
+                            data={'file': (io.BytesIO(payload), f"f{n}.txt")})
+            assert r.status_code == 201, r.get_json()
+            created['documents'].append(r.get_json()['document']['id'])
+
+    queue.put(created)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=15, help='Users registered per worker')
+    parser.add_argument('--uploads', type=int, default=3, help='Uploads per user')
+    parser.add_argument('--engine', default='tinydb')
+    parser.add_argument('--write-behind', action='store_true')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='inventa-stress-')
+    os.chdir(tmp)
+    os.environ['STORAGE_ENGINE'] = args.engine
+    os.environ['WRITE_BEHIND'] = str(args.write_behind)
+    os.environ['WRITE_BEHIND_CHECKPOINT_OPS'] = '50'  # exercise checkpoints mid-run
+    os.environ['LOGIN_LOG_SEGMENT_BYTES'] = '4096'  # exercise segment rotation mid-run
+
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(w, args.users, args.uploads, queue))
+             for w in range(args.workers)]
+    for p in procs:
+        p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    if any(p.exitcode for p in procs):
+        sys.exit('A worker failed')
+
+    from utils.database import db
+
+    user_ids = {u['id'] for u in db.get_all_users()}
+    doc_ids = {d['id'] for d in db.get_all_documents()}
+    expected_users = [u for r in results for u in r['users']]
+    expected_docs = [d for r in results for d in r['documents']]
+    expected_logins = sum(r['logins'] for r in results)
+
+    lost_users = [u for u in expected_users if u not in user_ids]
+    lost_docs = [d for d in expected_docs if d not in doc_ids]
+    logins = db.get_stats()['login_history_count']
+
+    print(f"\nworkers={args.workers} engine={args.engine} write_behind={args.write_behind} data={tmp}")
+    print(f"users:     {len(user_ids)}/{len(expected_users)} (lost {len(lost_users)})")
+    print(f"documents: {len(doc_ids)}/{len(expected_docs)} (lost {len(lost_docs)})")
+    print(f"logins:    {logins}/{expected_logins}")
+
+    if lost_users or lost_docs or logins != expected_logins \
+            or len(user_ids) != len(expected_users) or len(doc_ids) != len(expected_docs):
+        sys.exit('FAIL: records were lost or duplicated')
+    print('OK: no lost records')
+
+
+if __name__ == '__main__':
+    main()
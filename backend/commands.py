@@ -0,0 +1,224 @@
+"""
+Inventa CLI Commands
+====================
+Maintenance commands registered on the Flask CLI.
+
+Usage:
+    flask --app app db migrate-sqlite
+    flask --app app db migrate-blobs
+    flask --app app db convert-format --format compact
+    flask --app app db export backup.ndjson.gz
+    flask --app app db import backup.ndjson.gz
+    flask --app app db compact --if-garbage 0.3
+    flask --app app db snapshot
+    flask --app app db restore-snapshot data/snapshots/inventa_db-20250101T000000Z.json
+    flask --app app db generate-kek k2
+    flask --app app db rewrap-keys --rate 0
+"""
+
+import os
+
+import click
+from flask.cli import AppGroup
+
+from config import get_config
+
+config = get_config()
+
+db_cli = AppGroup('db', help='Database maintenance commands.')
+
+
+@db_cli.command('migrate-sqlite')
+@click.option('--source', default=None, help='TinyDB JSON file (default: DATABASE_PATH).')
+@click.option('--target', default=None, help='SQLite database file (default: SQLITE_DATABASE_PATH).')
+@click.option('--force', is_flag=True, help='Copy even if the target already has data.')
+def migrate_sqlite(source, target, force):
+    """Copy an existing TinyDB JSON database into SQLite."""
+    from utils.database import SCHEMA
+    from utils.storage import create_engine, migrate_tinydb_file
+
+    source = source or config.DATABASE_PATH
+    target = target or config.SQLITE_DATABASE_PATH
+
+    engine = create_engine('sqlite', target, SCHEMA)
+    try:
+        copied = migrate_tinydb_file(source, engine, force=force)
+    except (FileNotFoundError, RuntimeError) as e:
+        raise click.ClickException(str(e))
+    finally:
+        engine.close()
+
+    for table, count in copied.items():
+        click.echo(f"   - {table}: {count} records")
+    click.echo(f"✅ Migrated {source} -> {target}")
+    click.echo("   Set STORAGE_ENGINE=sqlite to use it.")
+
+
+@db_cli.command('migrate-blobs')
+def migrate_blobs():
+    """Move inline encrypted payloads and proof-of-work files into the blob store."""
+    from utils.database import db
+    from utils.blobstore import blobs, migrate_inline_payloads, migrate_inline_proofs
+
+    result = migrate_inline_payloads(db, blobs)
+    click.echo(f"✅ Moved {result['moved']} payloads to {blobs.root} "
+               f"({result['skipped']} already migrated)")
+    result = migrate_inline_proofs(db, blobs)
+    click.echo(f"✅ Moved {result['moved']} proof-of-work files to {blobs.root} "
+               f"({result['skipped']} without inline files)")
+
+
+@db_cli.command('convert-format')
+@click.option('--format', 'fmt', required=True, type=click.Choice(['json', 'compact', 'binary']),
+              help='Target on-disk format.')
+@click.option('--path', default=None, help='TinyDB database file (default: DATABASE_PATH).')
+@click.option('--output', default=None, help='Write a converted copy here instead of converting in place.')
+def convert_format(fmt, path, output):
+    """Rewrite the TinyDB database file in another on-disk format."""
+    from utils.storage import convert_tinydb_file
+
+    path = path or config.DATABASE_PATH
+    before = os.path.getsize(path) if os.path.exists(path) else 0
+    try:
+        counts = convert_tinydb_file(path, fmt, output=output)
+    except (FileNotFoundError, ValueError) as e:
+        raise click.ClickException(str(e))
+
+    target = output or path
+    for table, count in counts.items():
+        click.echo(f"   - {table}: {count} records")
+    click.echo(f"✅ Wrote {target} as {fmt} ({before:,} -> {os.path.getsize(target):,} bytes)")
+    if not output and fmt != config.DATABASE_FORMAT:
+        click.echo(f"   Set DATABASE_FORMAT={fmt} so checkpoints keep this format.")
+
+
+@db_cli.command('export')
+@click.argument('output', type=click.File('wb', lazy=False))
+@click.option('--redact', is_flag=True, help='Drop password hashes, private keys and file keys.')
+@click.option('--gzip/--no-gzip', 'compress', default=None,
+              help='Compress the output (default: when OUTPUT ends in .gz).')
+def export_data(output, redact, compress):
+    """Stream the database to the OUTPUT file as NDJSON."""
+    from utils.database import db
+    from utils.export import ndjson_chunks, gzip_chunks
+
+    if compress is None:
+        compress = output.name.endswith('.gz')
+    chunks = ndjson_chunks(db.iter_export(redact=redact))
+    if compress:
+        chunks = gzip_chunks(chunks)
+    for chunk in chunks:
+        output.write(chunk)
+    output.flush()
+    click.echo(f"✅ Exported to {output.name}")
+
+
+@db_cli.command('import')
+@click.argument('source', type=click.File('rb'))
+@click.option('--replace', is_flag=True, help='Delete all existing data first.')
+def import_data(source, replace):
+    """
+    Restore an NDJSON export (gzipped or not) from SOURCE ('-' for stdin).
+    Encrypted files live in the blob store and are not part of exports;
+    copy UPLOAD_FOLDER alongside to restore them.
+    """
+    from utils.database import db, DuplicateKeyError
+    from utils.export import read_ndjson
+
+    stats = db.get_stats()
+    if stats['users_count'] or stats['documents_count'] or stats['login_history_count']:
+        if not replace:
+            raise click.ClickException('Database is not empty (use --replace to overwrite it)')
+        db.clear_all()
+
+    try:
+        counts = db.import_entries(read_ndjson(source))
+    except (ValueError, DuplicateKeyError) as e:
+        raise click.ClickException(str(e))
+
+    for table, count in counts.items():
+        click.echo(f"   - {table}: {count} records")
+    click.echo(f"✅ Imported {source.name}")
+
+
+@db_cli.command('compact')
+@click.option('--if-garbage', 'min_garbage', type=click.FloatRange(0, 1), default=None,
+              help='Only compact if at least this share (0-1) of the file is superseded data.')
+def compact(min_garbage):
+    """Rewrite the database without superseded data (safe while the app is running)."""
+    from utils.database import db, storage_path
+
+    path = storage_path(db.engine.name)
+    before, ratio = disk_size(path), db.engine.garbage_ratio()
+    if not db.compact(min_garbage):
+        click.echo(f"Nothing to do (garbage ratio {ratio:.2f})")
+        return
+    click.echo(f"✅ Compacted {path} (garbage ratio {ratio:.2f}, "
+               f"{before:,} -> {disk_size(path):,} bytes on disk)")
+
+
+def disk_size(path):
+    """Bytes taken by a database file plus its TinyDB journal or SQLite WAL."""
+    return sum(os.path.getsize(p) for p in (path, path + '.journal', path + '-wal')
+               if os.path.exists(p))
+
+
+@db_cli.command('snapshot')
+@click.option('--output', default=None, help='Snapshot file (default: a timestamped file in SNAPSHOT_DIR).')
+def snapshot(output):
+    """Write a point-in-time copy of users and documents (safe while the app is running)."""
+    from utils.database import db
+
+    path = db.snapshot(output)
+    click.echo(f"✅ Snapshot written to {path} ({os.path.getsize(path):,} bytes)")
+    click.echo("   Login history is not included; use `db export` for a full backup.")
+
+
+@db_cli.command('restore-snapshot')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def restore_snapshot(source, yes):
+    """Replace users and documents with the contents of a snapshot."""
+    from utils.database import db
+
+    if not yes:
+        click.confirm('This replaces all users and documents. Continue?', abort=True)
+    try:
+        db.restore_snapshot(source)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    stats = db.get_stats()
+    click.echo(f"✅ Restored {source} ({stats['users_count']} users, "
+               f"{stats['documents_count']} documents)")
+
+
+@db_cli.command('generate-kek')
+@click.argument('kek_id')
+def generate_kek_command(kek_id):
+    """Print a new master key entry for ENCRYPTION_KEKS."""
+    from utils.envelope import generate_kek
+
+    click.echo(generate_kek(kek_id))
+    click.echo("   Put it first in ENCRYPTION_KEKS (keep the old keys until rewrap-keys is done).", err=True)
+
+
+@db_cli.command('rewrap-keys')
+@click.option('--rate', type=float, default=None, help='Documents per second (default: REWRAP_RATE, 0 = unlimited).')
+@click.option('--limit', type=int, default=None, help='Rewrap at most this many documents.')
+def rewrap_keys(rate, limit):
+    """Wrap every document key with the active master key (KEK rotation)."""
+    from utils.envelope import key_ring, rewrap_job
+
+    if not key_ring.enabled:
+        raise click.ClickException('Set ENCRYPTION_KEKS first (see `db generate-kek`).')
+    try:
+        result = rewrap_job.run(limit=limit, rate=rate)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"✅ Rewrapped {result['rewrapped']} document keys with KEK {key_ring.active!r} "
+               f"({result['failed']} failed, {result['remaining']} left)")
+
+
+def register_commands(app):
+    """Attach CLI command groups to the Flask app."""
+    app.cli.add_command(db_cli)
@@ -25,14 +25,46 @@ class Config:
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
     # Database Settings
+    STORAGE_ENGINE = os.getenv('STORAGE_ENGINE', 'tinydb')  # 'tinydb' or 'sqlite'
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'data/inventa_db.json')
+    SQLITE_DATABASE_PATH = os.getenv('SQLITE_DATABASE_PATH', 'data/inventa.sqlite3')
+    # TinyDB file format: 'json' (indented), 'compact' or 'binary' (see utils.serialization)
+    DATABASE_FORMAT = os.getenv('DATABASE_FORMAT', 'json')
+    
+    # TinyDB journal: writes are group-committed to a journal and the JSON
+    # file is rewritten only at checkpoints. With WRITE_BEHIND, writes
+    # return before their fsync (see Database.wait_for_commit)
+    WRITE_BEHIND = os.getenv('WRITE_BEHIND', 'False').lower() == 'true'
+    WRITE_BEHIND_WINDOW_MS = float(os.getenv('WRITE_BEHIND_WINDOW_MS', 5))
+    WRITE_BEHIND_MAX_OPS = int(os.getenv('WRITE_BEHIND_MAX_OPS', 64))
+    WRITE_BEHIND_CHECKPOINT_OPS = int(os.getenv('WRITE_BEHIND_CHECKPOINT_OPS', 1000))
+    WRITE_BEHIND_CHECKPOINT_SECONDS = float(os.getenv('WRITE_BEHIND_CHECKPOINT_SECONDS', 30))
+    # Compact (checkpoint) early once the journal is this share of the bytes
+    # on disk and at least COMPACT_MIN_BYTES; `flask db compact` runs it by hand
+    COMPACT_GARBAGE_RATIO = float(os.getenv('COMPACT_GARBAGE_RATIO', 0.5))
+    COMPACT_MIN_BYTES = int(os.getenv('COMPACT_MIN_BYTES', 1024 * 1024))
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'data/snapshots')
     USERS_TABLE = 'users'
     DOCUMENTS_TABLE = 'documents'
+    DOCUMENT_PAYLOADS_TABLE = 'document_payloads'
     LOGIN_HISTORY_TABLE = 'login_history'
     
+    # Login History Log (append-only JSONL segments)
+    LOGIN_LOG_DIR = os.getenv('LOGIN_LOG_DIR', 'data/login_history')
+    LOGIN_LOG_SEGMENT_BYTES = int(os.getenv('LOGIN_LOG_SEGMENT_BYTES', 8 * 1024 * 1024))
+    LOGIN_LOG_SEGMENT_SECONDS = int(os.getenv('LOGIN_LOG_SEGMENT_SECONDS', 24 * 3600))
+    LOGIN_LOG_FSYNC_EVERY = int(os.getenv('LOGIN_LOG_FSYNC_EVERY', 1))  # 0 = never fsync
+    
+    # Listings (?limit=&after= keyset pagination)
+    DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 50))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 500))
+    
     # File Upload Settings
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50 MB max file size
+    # Resumable uploads (/api/uploads): chunk size and idle session lifetime
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))
+    UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 24 * 3600))
     ALLOWED_EXTENSIONS = {
         'pdf', 'doc', 'docx', 'txt', 'rtf',  # Documents
         'png', 'jpg', 'jpeg', 'gif', 'bmp', 'svg',  # Images
@@ -43,6 +75,31 @@ class Config:
     
     # Encryption Settings
     AES_KEY_SIZE = 32  # 256 bits
+    KEY_CACHE_SIZE = int(os.getenv('KEY_CACHE_SIZE', 1024))  # parsed ECC keys kept in memory
+    # Pre-generated key pairs for registration: refill to HIGH once below LOW (HIGH=0 disables)
+    KEYPAIR_POOL_LOW = int(os.getenv('KEYPAIR_POOL_LOW', 8))
+    KEYPAIR_POOL_HIGH = int(os.getenv('KEYPAIR_POOL_HIGH', 32))
+    # Envelope encryption: KEKs as "id:base64key,..." (the active one wraps new
+    # document keys; default the first), unwrapped keys cached, rewrap pace
+    ENCRYPTION_KEKS = os.getenv('ENCRYPTION_KEKS', '')
+    ENCRYPTION_ACTIVE_KEK = os.getenv('ENCRYPTION_ACTIVE_KEK', '')
+    DEK_CACHE_SIZE = int(os.getenv('DEK_CACHE_SIZE', 256))
+    REWRAP_RATE = float(os.getenv('REWRAP_RATE', 50))  # documents per second, 0 = unlimited
+    # /api/verify-signature/batch: proofs per request, verification threads
+    VERIFY_BATCH_MAX = int(os.getenv('VERIFY_BATCH_MAX', 1000))
+    VERIFY_WORKERS = int(os.getenv('VERIFY_WORKERS', 4))
+    
+    # Password hashing: 'scrypt' or 'argon2id' (needs argon2-cffi) and their
+    # costs; hashes run WORKERS at a time with up to QUEUE waiting (then 503)
+    PASSWORD_SCHEME = os.getenv('PASSWORD_SCHEME', 'scrypt')
+    PASSWORD_SCRYPT_LOG_N = int(os.getenv('PASSWORD_SCRYPT_LOG_N', 15))  # N = 2^15, 32 MB with r=8
+    PASSWORD_SCRYPT_R = int(os.getenv('PASSWORD_SCRYPT_R', 8))
+    PASSWORD_SCRYPT_P = int(os.getenv('PASSWORD_SCRYPT_P', 1))
+    PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', 3))
+    PASSWORD_ARGON2_MEMORY_COST = int(os.getenv('PASSWORD_ARGON2_MEMORY_COST', 65536))  # KiB
+    PASSWORD_ARGON2_PARALLELISM = int(os.getenv('PASSWORD_ARGON2_PARALLELISM', 1))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 16))
     
     # CORS Settings
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*')
@@ -4,13 +4,24 @@ Inventa Admin Routes
 Admin endpoints for database management and analytics.
 """
 
-from flask import Blueprint, request, jsonify
+from datetime import datetime
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
-from utils.database import db
+from utils.database import db, public_metadata
+from utils.export import ndjson_chunks, gzip_chunks
+from utils.keycache import key_cache
+from utils.keypool import keypair_pool
+from utils.envelope import key_ring
+from utils.passwords import password_hasher
+from utils.pagination import page_args, LOG_CURSOR
 
 admin_bp = Blueprint('admin', __name__)
 
+# Document fields rendered by the admin listing (never the payload)
+DOCUMENT_LIST_FIELDS = ('id', 'original_name', 'hash', 'timestamp', 'user_id', 'file_size', 'metadata')
+
 
 @admin_bp.route('/stats', methods=['GET'])
 def get_stats():
@@ -39,34 +50,71 @@ def get_stats():
         }), 500
 
 
+@admin_bp.route('/stats/ops', methods=['GET'])
+@jwt_required()
+def get_ops_stats():
+    """
+    Get runtime telemetry for this worker process (caches, pools, keys).
+    Requires authentication.
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'stats': {
+                'keyCache': key_cache.stats(),
+                'keyPairPool': keypair_pool.stats(),
+                'dataKeys': key_ring.stats(),
+                'passwordHashing': password_hasher.stats()
+            }
+        }), 200
+        
+    except Exception as e:
+        print(f"Get ops stats error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to get statistics'
+        }), 500
+
+
+def format_login_entry(entry):
+    """Shape a login history record for API responses."""
+    return {
+        'id': entry.get('id'),
+        'userId': entry.get('user_id'),
+        'userEmail': entry.get('user_email'),
+        'userName': entry.get('user_name'),
+        'status': entry.get('status'),
+        'action': entry.get('action', 'login'),
+        'failReason': entry.get('fail_reason'),
+        'userAgent': entry.get('user_agent'),
+        'timestamp': entry.get('timestamp')
+    }
+
+
 @admin_bp.route('/login-history', methods=['GET'])
 def get_login_history():
     """
-    Get login history.
+    Get login history, most recent first.
+    
+    Query (optional): limit (default 100), after - pass the previous
+    response's nextCursor to get the next page.
     """
     try:
-        limit = request.args.get('limit', 100, type=int)
-        history = db.get_login_history(limit)
+        limit, after = page_args(request.args, default_limit=100, cursor_types=LOG_CURSOR, lenient=True)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        history, next_cursor = db.get_login_history_page(limit, after)
         
         # Format for response
-        formatted_history = []
-        for entry in history:
-            formatted_history.append({
-                'id': entry.get('id'),
-                'userId': entry.get('user_id'),
-                'userEmail': entry.get('user_email'),
-                'userName': entry.get('user_name'),
-                'status': entry.get('status'),
-                'action': entry.get('action', 'login'),
-                'failReason': entry.get('fail_reason'),
-                'userAgent': entry.get('user_agent'),
-                'timestamp': entry.get('timestamp')
-            })
+        formatted_history = [format_login_entry(entry) for entry in history]
         
         return jsonify({
             'success': True,
             'history': formatted_history,
-            'count': len(formatted_history)
+            'count': len(formatted_history),
+            'nextCursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -77,13 +125,69 @@ def get_login_history():
         }), 500
 
 
+@admin_bp.route('/users/<user_id>/login-history', methods=['GET'])
+def get_user_login_history(user_id):
+    """
+    Get login history for one user, most recent first.
+    
+    Query (optional): limit (default 100), after - pass the previous
+    response's nextCursor to get the next page.
+    """
+    try:
+        limit, after = page_args(request.args, default_limit=100, cursor_types=LOG_CURSOR, lenient=True)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        user = db.get_user_by_id(user_id)
+        if not user:
+            return jsonify({
+                'success': False,
+                'error': 'User not found'
+            }), 404
+        
+        history, next_cursor = db.get_user_login_history_page(user_id, limit, after)
+        formatted_history = [format_login_entry(entry) for entry in history]
+        
+        return jsonify({
+            'success': True,
+            'user': {
+                'id': user.get('id'),
+                'username': user.get('username'),
+                'email': user.get('email')
+            },
+            'history': formatted_history,
+            'count': len(formatted_history),
+            'nextCursor': next_cursor
+        }), 200
+        
+    except Exception as e:
+        print(f"Get user login history error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to get login history'
+        }), 500
+
+
 @admin_bp.route('/users', methods=['GET'])
 def get_all_users():
     """
     Get all users (without sensitive data).
+    
+    Query (optional): limit, after - keyset pagination, oldest first; pass
+    the previous response's nextCursor as `after`.
     """
     try:
-        users = db.get_all_users()
+        limit, after = page_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        next_cursor = None
+        if limit is None:
+            users = db.get_all_users()
+        else:
+            users, next_cursor = db.get_users_page(limit, after)
         
         # Remove sensitive data
         safe_users = []
@@ -99,7 +203,8 @@ def get_all_users():
         return jsonify({
             'success': True,
             'users': safe_users,
-            'count': len(safe_users)
+            'count': len(safe_users),
+            'nextCursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -113,10 +218,22 @@ def get_all_users():
 @admin_bp.route('/documents', methods=['GET'])
 def get_all_documents():
     """
-    Get all documents (public metadata only).
+    Get all documents (public metadata only), newest first.
+    
+    Query (optional): limit, after - keyset pagination; pass the previous
+    response's nextCursor as `after`.
     """
     try:
-        documents = db.get_all_documents()
+        limit, after = page_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        next_cursor = None
+        if limit is None:
+            documents = db.get_all_documents(fields=DOCUMENT_LIST_FIELDS)
+        else:
+            documents, next_cursor = db.get_documents_page(limit, after, fields=DOCUMENT_LIST_FIELDS)
         
         # Format for response
         safe_documents = []
@@ -128,16 +245,18 @@ def get_all_documents():
                 'timestamp': doc.get('timestamp'),
                 'userId': doc.get('user_id'),
                 'fileSize': doc.get('file_size', 0),
-                'metadata': doc.get('metadata', {})
+                'metadata': public_metadata(doc.get('metadata'))
             })
         
-        # Sort by timestamp descending
-        safe_documents.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        # Sort by timestamp descending (pages already come ordered)
+        if limit is None:
+            safe_documents.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
         
         return jsonify({
             'success': True,
             'documents': safe_documents,
-            'count': len(safe_documents)
+            'count': len(safe_documents),
+            'nextCursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -153,7 +272,15 @@ def export_database():
     """
     Export the entire database.
     WARNING: This includes sensitive data. Use with caution!
+    
+    Query (optional):
+    - format=ndjson: stream one record per line instead of a single JSON
+      document (constant memory; sensitive fields removed per record)
+    - compress=gzip: gzip the NDJSON stream on the fly
     """
+    if request.args.get('format') == 'ndjson':
+        return stream_export(compress=request.args.get('compress') == 'gzip')
+    
     try:
         data = db.export_all()
         
@@ -179,3 +306,20 @@ def export_database():
             'success': False,
             'error': 'Failed to export database'
         }), 500
+
+
+def stream_export(compress: bool = False):
+    """Streaming NDJSON export response (redacted), optionally gzipped."""
+    chunks = ndjson_chunks(db.iter_export(redact=True))
+    filename = f"inventa-export-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.ndjson"
+    mimetype = 'application/x-ndjson'
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
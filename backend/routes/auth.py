@@ -16,18 +16,27 @@ from datetime import datetime
 import hashlib
 import os
 
-from utils.database import db
+from utils.database import db, DuplicateKeyError
+from utils.keypool import keypair_pool
+from utils.passwords import password_hasher, HashingBusyError
 from utils.crypto import (
     generate_user_id,
-    hash_password,
-    verify_password,
-    generate_ecc_keypair,
     generate_timestamp
 )
 
 auth_bp = Blueprint('auth', __name__)
 
 
+def busy_response():
+    """503 for when too many password hashes are already in progress."""
+    response = jsonify({
+        'success': False,
+        'error': 'Server is busy. Please try again shortly.'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """
@@ -84,8 +93,14 @@ def register():
                 'error': 'Username already taken'
             }), 409
         
-        # Generate ECC key pair for the user
-        private_key, public_key = generate_ecc_keypair()
+        # Memory-hard hash, on the bounded hashing pool
+        try:
+            password_hash = password_hasher.hash(password)
+        except HashingBusyError:
+            return busy_response()
+        
+        # ECC key pair for the user, pre-generated in the background
+        private_key, public_key = keypair_pool.take()
         
         # Create user object
         user_id = generate_user_id()
@@ -93,14 +108,21 @@ def register():
             'id': user_id,
             'username': username,
             'email': email,
-            'password_hash': hash_password(password),
+            'password_hash': password_hash,
             'public_key': public_key,
             'private_key': private_key,  # In production, encrypt this!
             'created_at': generate_timestamp()
         }
         
-        # Save to database
-        db.create_user(user)
+        # Save to database (the unique indexes close the race between the
+        # existence checks above and this insert)
+        try:
+            db.create_user(user)
+        except DuplicateKeyError as e:
+            return jsonify({
+                'success': False,
+                'error': 'Username already taken' if e.field == 'username' else 'Email already registered'
+            }), 409
         
         # Generate JWT token
         access_token = create_access_token(identity=user_id)
@@ -117,6 +139,9 @@ def register():
             'user_agent': request.headers.get('User-Agent', 'Unknown')
         })
         
+        # Don't acknowledge the account until it is durable
+        db.wait_for_commit()
+        
         # Return user data (excluding sensitive fields)
         safe_user = {
             'id': user['id'],
@@ -200,7 +225,12 @@ def login():
             }), 401
         
         # Verify password
-        if not verify_password(password, user['password_hash']):
+        try:
+            password_ok = password_hasher.verify(password, user['password_hash'])
+        except HashingBusyError:
+            return busy_response()
+        
+        if not password_ok:
             # Record failed login
             db.record_login({
                 'id': f"login_{hashlib.sha256(os.urandom(16)).hexdigest()[:12]}",
@@ -217,6 +247,13 @@ def login():
                 'error': 'Invalid email or password'
             }), 401
         
+        # Upgrade legacy SHA-256 hashes (or older settings) while we have the password
+        if password_hasher.needs_rehash(user['password_hash']):
+            try:
+                db.update_user(user['id'], {'password_hash': password_hasher.hash(password)})
+            except HashingBusyError:
+                pass  # keep the old hash until the next login
+        
         # Generate JWT token
         access_token = create_access_token(identity=user['id'])
         refresh_token = create_refresh_token(identity=user['id'])
@@ -6,19 +6,30 @@ Handles document upload, retrieval, and ownership proof generation.
 
 import os
 import base64
-from flask import Blueprint, request, jsonify, send_file
+import mimetypes
+from itertools import chain
+from flask import Blueprint, Response, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import io
 
 from config import get_config
-from utils.database import db
+from utils.database import db, public_metadata
+from utils.blobstore import blobs
+from utils.envelope import key_ring
+from utils.pagination import page_args
+from utils.uploads import DocumentUpload, UploadError
+from utils.upload_sessions import upload_sessions, SessionError
+from utils.verification import proof_verifier, signature_message
 from utils.crypto import (
     generate_document_id,
     hash_file,
-    encrypt_file,
     decrypt_file,
+    ENCRYPTION_VERSION,
+    SEGMENT_SIZE,
+    SegmentDecryptor,
     sign_document,
     generate_timestamp,
     create_ownership_proof
@@ -27,6 +38,9 @@ from utils.crypto import (
 config = get_config()
 documents_bp = Blueprint('documents', __name__)
 
+# Document fields rendered by the listing (never the payload)
+LIST_FIELDS = ('id', 'original_name', 'hash', 'timestamp', 'signature', 'file_size', 'metadata', 'user_id')
+
 
 def allowed_file(filename):
     """Check if the file extension is allowed."""
@@ -36,6 +50,146 @@ def allowed_file(filename):
     return ext in config.ALLOWED_EXTENSIONS
 
 
+def read_encrypted_payload(payload):
+    """Return a document's ciphertext from the blob store (or legacy inline data)."""
+    if payload.get('blob_ref'):
+        return blobs.get(payload['blob_ref'])
+    return payload['encrypted_data']
+
+
+def open_document_content(document_id, payload):
+    """
+    Return (size, read_range) for a document's plaintext, where
+    read_range(start=0, end=None) yields the bytes [start, end).
+    
+    Segmented payloads (encryption_version 2) are decrypted straight from
+    the blob, only the segments a range covers; legacy single-shot ones
+    are decrypted whole first. Raises ValueError if decryption fails.
+    """
+    if payload.get('encryption_version') == ENCRYPTION_VERSION:
+        ref = payload['blob_ref']
+        decryptor = SegmentDecryptor(
+            document_id,
+            key_ring.unwrap(document_id, payload),
+            payload['encryption_nonce'],
+            blobs.size(ref),
+            payload.get('segment_size', SEGMENT_SIZE)
+        )
+        
+        def read_range(start=0, end=None):
+            with blobs.open(ref) as f:
+                yield from decryptor.iter_range(f, start, end)
+        
+        return decryptor.size, read_range
+    
+    data = decrypt_file(
+        read_encrypted_payload(payload),
+        payload['encryption_nonce'],
+        base64.b64encode(key_ring.unwrap(document_id, payload)).decode('utf-8')
+    )
+    if data is None:
+        raise ValueError('Single-shot ciphertext failed authentication')
+    
+    def read_range(start=0, end=None):
+        yield data[start:end]
+    
+    return len(data), read_range
+
+
+def duplicate_response(doc_hash):
+    """409 response if a document with this hash is already registered, else None."""
+    existing_doc = db.get_document_by_hash(doc_hash)
+    if not existing_doc:
+        return None
+    return jsonify({
+        'success': False,
+        'error': 'This document has already been registered',
+        'existingDocument': {
+            'id': existing_doc['id'],
+            'registeredAt': existing_doc['timestamp'],
+            'ownerId': existing_doc['user_id']
+        }
+    }), 409
+
+
+def register_document(user, doc_id, upload):
+    """
+    Sign and save the document received by `upload` (its blobs committed)
+    and return the 201 response. Form fields come from `upload.fields`.
+    """
+    # Get metadata from form
+    owner_name = upload.fields.get('ownerName', user['username'])
+    description = upload.fields.get('description', '')
+    document_type = upload.fields.get('documentType', 'other')
+    work_type = upload.fields.get('workType', 'human')
+    
+    original_filename = secure_filename(upload.filename)
+    doc_hash = upload.document.hash
+    encryption = upload.document.encryptor.params
+    
+    # Generate timestamp
+    timestamp = generate_timestamp()
+    
+    # Create signature data (hash + timestamp + user_id)
+    signature_data = signature_message(doc_hash, timestamp, user['id'])
+    signature = sign_document(signature_data, user['private_key'], user['id'])
+    
+    # The proof of work file (if provided) is a blob; metadata keeps a reference
+    proof_of_work = None
+    if upload.proof is not None:
+        proof_of_work = {
+            'filename': secure_filename(upload.proof_filename),
+            'blob_ref': upload.proof.ref,
+            'size': upload.proof.size
+        }
+    
+    # Create document record
+    document = {
+        'id': doc_id,
+        'user_id': user['id'],
+        'original_name': original_filename,
+        'hash': doc_hash,
+        'timestamp': timestamp,
+        'signature': signature,
+        'blob_ref': upload.document.blob.ref,
+        'encryption_version': encryption['encryption_version'],
+        'segment_size': encryption['segment_size'],
+        'encryption_nonce': encryption['nonce'],
+        # The document key, wrapped with the active master key
+        **key_ring.wrap(doc_id, upload.document.encryptor.key),
+        'file_size': upload.document.size,
+        'metadata': {
+            'owner_name': owner_name,
+            'description': description,
+            'document_type': document_type,
+            'work_type': work_type,
+            'proof_of_work': proof_of_work
+        }
+    }
+    
+    # Save to database and wait until the record is durable
+    db.create_document(document)
+    db.wait_for_commit()
+    
+    # Return response (exclude encryption key and encrypted data)
+    safe_document = {
+        'id': document['id'],
+        'originalName': document['original_name'],
+        'hash': document['hash'],
+        'timestamp': document['timestamp'],
+        'signature': document['signature'],
+        'fileSize': document['file_size'],
+        'metadata': document['metadata'],
+        'userId': document['user_id']
+    }
+    
+    return jsonify({
+        'success': True,
+        'message': 'Document registered successfully',
+        'document': safe_document
+    }), 201
+
+
 @documents_bp.route('/upload', methods=['POST'])
 @jwt_required()
 def upload_document():
@@ -50,6 +204,10 @@ def upload_document():
     - workType: Type of work (human, ai)
     - proofOfWork: (optional) Proof of work file
     
+    The body is processed as it arrives (see `utils.uploads`): the file is
+    hashed and encrypted chunk by chunk, straight into the blob store.
+    Large files can also be sent resumably, see `create_upload_session`.
+    
     Response:
     {
         "success": true,
@@ -66,125 +224,316 @@ def upload_document():
                 'error': 'User not found'
             }), 404
         
-        # Check if file is in request
-        if 'file' not in request.files:
+        boundary = request.mimetype_params.get('boundary')
+        if request.mimetype != 'multipart/form-data' or not boundary:
             return jsonify({
                 'success': False,
                 'error': 'No file provided'
             }), 400
         
-        file = request.files['file']
+        # Generate document ID (the encryption is bound to it)
+        doc_id = generate_document_id()
+        
+        with DocumentUpload(blobs, doc_id, allowed=allowed_file) as upload:
+            try:
+                upload.receive(request.stream, boundary.encode('latin-1'))
+            except UploadError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            
+            # Check if file is in request
+            if upload.filename is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'No file provided'
+                }), 400
+            
+            if upload.filename == '':
+                return jsonify({
+                    'success': False,
+                    'error': 'No file selected'
+                }), 400
+            
+            # Check if document already exists, by the hash computed while
+            # the file streamed in (leaving the block discards the blobs)
+            duplicate = duplicate_response(upload.document.hash)
+            if duplicate:
+                return duplicate
+            
+            # Keep the ciphertext (and proof of work file) blobs
+            upload.commit()
+        
+        return register_document(user, doc_id, upload)
+        
+    except RequestEntityTooLarge:
+        return jsonify({
+            'success': False,
+            'error': 'File too large'
+        }), 413
+    except Exception as e:
+        print(f"Upload error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to upload document. Please try again.'
+        }), 500
+
+
+# ==================== RESUMABLE UPLOADS ====================
+
+def owned_session(session_id, user_id):
+    """Return (session, None) or (None, error response) for a session of `user_id`."""
+    session = upload_sessions.get(session_id)
+    if session is None:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Upload session not found or expired'
+        }), 404)
+    if session.user_id != user_id:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Access denied. This upload session belongs to another user.'
+        }), 403)
+    return session, None
+
+
+@documents_bp.route('/uploads', methods=['POST'])
+@jwt_required()
+def create_upload_session():
+    """
+    Start a resumable upload.
+    
+    Request JSON: { "filename": "song.mp3", "size": 52428800 }
+    
+    Then PUT each chunk (raw bytes, `chunkSize` each, the last one shorter)
+    to /api/uploads/<sessionId>/chunks/<index>, in any order, and POST
+    /api/uploads/<sessionId>/finalize. GET /api/uploads/<sessionId> tells
+    which chunks are still missing after an interruption.
+    
+    Response:
+    {
+        "success": true,
+        "session": { "sessionId", "chunkSize", "chunkCount", "expiresAt", ... }
+    }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename') or ''
+        size = data.get('size')
         
-        if file.filename == '':
+        if not filename:
             return jsonify({
                 'success': False,
                 'error': 'No file selected'
             }), 400
         
-        if not allowed_file(file.filename):
+        if not allowed_file(filename):
             return jsonify({
                 'success': False,
                 'error': 'File type not allowed'
             }), 400
         
-        # Get metadata from form
-        owner_name = request.form.get('ownerName', user['username'])
-        description = request.form.get('description', '')
-        document_type = request.form.get('documentType', 'other')
-        work_type = request.form.get('workType', 'human')
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            return jsonify({
+                'success': False,
+                'error': 'size must be the file size in bytes'
+            }), 400
+        
+        if size > config.MAX_CONTENT_LENGTH:
+            return jsonify({
+                'success': False,
+                'error': 'File too large'
+            }), 413
+        
+        session = upload_sessions.create(get_jwt_identity(), filename, size)
+        
+        return jsonify({
+            'success': True,
+            'session': session.to_dict()
+        }), 201
+        
+    except Exception as e:
+        print(f"Create upload session error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to start upload'
+        }), 500
+
+
+@documents_bp.route('/uploads/<session_id>', methods=['GET'])
+@jwt_required()
+def get_upload_session(session_id):
+    """Get an upload session's progress (received and missing chunks)."""
+    try:
+        session, error = owned_session(session_id, get_jwt_identity())
+        if error:
+            return error
+        
+        return jsonify({
+            'success': True,
+            'session': dict(session.to_dict(), hashedBytes=session.hashed_bytes())
+        }), 200
+        
+    except Exception as e:
+        print(f"Get upload session error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to get upload session'
+        }), 500
+
+
+@documents_bp.route('/uploads/<session_id>/chunks/<int:index>', methods=['PUT'])
+@jwt_required()
+def put_upload_chunk(session_id, index):
+    """
+    Store one chunk (raw request body). Re-sending a chunk that was
+    already stored is accepted and ignored, so failed requests can simply
+    be retried.
+    """
+    try:
+        session, error = owned_session(session_id, get_jwt_identity())
+        if error:
+            return error
         
-        # Read file data
-        file_data = file.read()
-        original_filename = secure_filename(file.filename)
+        with session.locked():
+            stored = session.write_chunk(index, request.stream)
         
-        # Generate document hash (fingerprint)
-        doc_hash = hash_file(file_data)
+        return jsonify({
+            'success': True,
+            'index': index,
+            'stored': stored,
+            'receivedChunks': len(session.received()),
+            'chunkCount': session.chunk_count
+        }), 200
         
-        # Check if document already exists
-        existing_doc = db.get_document_by_hash(doc_hash)
-        if existing_doc:
+    except SessionError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status
+    except RequestEntityTooLarge:
+        return jsonify({
+            'success': False,
+            'error': 'Chunk too large'
+        }), 413
+    except Exception as e:
+        print(f"Upload chunk error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to store chunk. Please retry it.'
+        }), 500
+
+
+@documents_bp.route('/uploads/<session_id>/finalize', methods=['POST'])
+@jwt_required()
+def finalize_upload_session(session_id):
+    """
+    Register the document uploaded in a session, exactly as /api/upload
+    would (duplicate check, encryption, signature), then drop the session.
+    
+    Request (optional): multipart/form-data with the /api/upload fields
+    other than `file` (ownerName, description, documentType, workType,
+    proofOfWork).
+    """
+    try:
+        user_id = get_jwt_identity()
+        user = db.get_user_by_id(user_id)
+        
+        if not user:
             return jsonify({
                 'success': False,
-                'error': 'This document has already been registered',
-                'existingDocument': {
-                    'id': existing_doc['id'],
-                    'registeredAt': existing_doc['timestamp'],
-                    'ownerId': existing_doc['user_id']
-                }
-            }), 409
-        
-        # Encrypt the document
-        encryption_result = encrypt_file(file_data)
-        
-        # Generate timestamp
-        timestamp = generate_timestamp()
-        
-        # Create signature data (hash + timestamp + user_id)
-        signature_data = f"{doc_hash}:{timestamp}:{user_id}"
-        signature = sign_document(signature_data, user['private_key'])
-        
-        # Handle proof of work file if provided
-        proof_of_work = None
-        if 'proofOfWork' in request.files:
-            proof_file = request.files['proofOfWork']
-            if proof_file.filename:
-                proof_data = proof_file.read()
-                proof_of_work = {
-                    'filename': secure_filename(proof_file.filename),
-                    'data': base64.b64encode(proof_data).decode('utf-8'),
-                    'size': len(proof_data)
-                }
-        
-        # Generate document ID
+                'error': 'User not found'
+            }), 404
+        
+        session, error = owned_session(session_id, user_id)
+        if error:
+            return error
+        
         doc_id = generate_document_id()
         
-        # Create document record
-        document = {
-            'id': doc_id,
-            'user_id': user_id,
-            'original_name': original_filename,
-            'hash': doc_hash,
-            'timestamp': timestamp,
-            'signature': signature,
-            'encrypted_data': encryption_result['encrypted_data'],
-            'encryption_nonce': encryption_result['nonce'],
-            'encryption_key': encryption_result['key'],
-            'file_size': len(file_data),
-            'metadata': {
-                'owner_name': owner_name,
-                'description': description,
-                'document_type': document_type,
-                'work_type': work_type,
-                'proof_of_work': proof_of_work
-            }
-        }
+        with session.locked(exclusive=True), DocumentUpload(blobs, doc_id) as upload:
+            missing = session.missing()
+            if missing:
+                return jsonify({
+                    'success': False,
+                    'error': 'Upload is incomplete',
+                    'missingChunks': missing
+                }), 400
+            
+            boundary = request.mimetype_params.get('boundary')
+            if request.mimetype == 'multipart/form-data' and boundary:
+                try:
+                    upload.receive(request.stream, boundary.encode('latin-1'))
+                except UploadError as e:
+                    return jsonify({
+                        'success': False,
+                        'error': str(e)
+                    }), 400
+                if upload.filename is not None:
+                    return jsonify({
+                        'success': False,
+                        'error': 'The file itself is sent in chunks, not with finalize'
+                    }), 400
+            
+            # The hash was computed as the chunks came in: check for a
+            # duplicate before spending time on encryption
+            duplicate = duplicate_response(session.digest())
+            if duplicate:
+                session.delete()
+                return duplicate
+            
+            upload.receive_file(session.filename, session.read())
+            upload.commit()
+            session.delete()
+        
+        return register_document(user, doc_id, upload)
+        
+    except SessionError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status
+    except RequestEntityTooLarge:
+        return jsonify({
+            'success': False,
+            'error': 'File too large'
+        }), 413
+    except Exception as e:
+        print(f"Finalize upload error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to upload document. Please try again.'
+        }), 500
+
+
+@documents_bp.route('/uploads/<session_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_upload_session(session_id):
+    """Abandon an upload session and delete its chunks."""
+    try:
+        session, error = owned_session(session_id, get_jwt_identity())
+        if error:
+            return error
         
-        # Save to database
-        db.create_document(document)
-        
-        # Return response (exclude encryption key and encrypted data)
-        safe_document = {
-            'id': document['id'],
-            'originalName': document['original_name'],
-            'hash': document['hash'],
-            'timestamp': document['timestamp'],
-            'signature': document['signature'],
-            'fileSize': document['file_size'],
-            'metadata': document['metadata'],
-            'userId': document['user_id']
-        }
+        with session.locked(exclusive=True):
+            session.delete()
         
         return jsonify({
             'success': True,
-            'message': 'Document registered successfully',
-            'document': safe_document
-        }), 201
+            'message': 'Upload cancelled'
+        }), 200
         
+    except SessionError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status
     except Exception as e:
-        print(f"Upload error: {e}")
+        print(f"Cancel upload error: {e}")
         return jsonify({
             'success': False,
-            'error': 'Failed to upload document. Please try again.'
+            'error': 'Failed to cancel upload'
         }), 500
 
 
@@ -192,11 +541,24 @@ def upload_document():
 @jwt_required()
 def get_user_documents():
     """
-    Get all documents for the authenticated user.
+    Get documents for the authenticated user, newest first.
+    
+    Query (optional): limit, after - keyset pagination; pass the previous
+    response's nextCursor as `after`. Without them, all documents are returned.
     """
+    try:
+        limit, after = page_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
     try:
         user_id = get_jwt_identity()
-        documents = db.get_documents_by_user(user_id)
+        next_cursor = None
+        if limit is None:
+            documents = db.get_documents_by_user(user_id, fields=LIST_FIELDS)
+        else:
+            documents, next_cursor = db.get_documents_page(limit, after, user_id=user_id,
+                                                           fields=LIST_FIELDS)
         
         # Format documents for response
         safe_documents = []
@@ -208,17 +570,19 @@ def get_user_documents():
                 'timestamp': doc['timestamp'],
                 'signature': doc['signature'],
                 'fileSize': doc.get('file_size', 0),
-                'metadata': doc.get('metadata', {}),
+                'metadata': public_metadata(doc.get('metadata')),
                 'userId': doc['user_id']
             })
         
-        # Sort by timestamp descending
-        safe_documents.sort(key=lambda x: x['timestamp'], reverse=True)
+        # Sort by timestamp descending (pages already come ordered)
+        if limit is None:
+            safe_documents.sort(key=lambda x: x['timestamp'], reverse=True)
         
         return jsonify({
             'success': True,
             'documents': safe_documents,
-            'count': len(safe_documents)
+            'count': len(safe_documents),
+            'nextCursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -265,6 +629,7 @@ def get_ownership_proof(document_id):
             }), 404
         
         # Generate ownership proof
+        document['metadata'] = public_metadata(document.get('metadata'))
         proof = create_ownership_proof(document, user)
         
         return jsonify({
@@ -352,7 +717,7 @@ def verify_document():
                 'filename': document['original_name'],
                 'registeredAt': document['timestamp'],
                 'signature': document['signature'],
-                'metadata': document.get('metadata', {})
+                'metadata': public_metadata(document.get('metadata'))
             },
             'owner': {
                 'id': user['id'] if user else None,
@@ -371,12 +736,160 @@ def verify_document():
         }), 500
 
 
+@documents_bp.route('/verify-signature', methods=['POST'])
+def verify_ownership_signature():
+    """
+    Cryptographically verify an ownership proof.
+    This endpoint is public (no authentication required).
+    
+    Request JSON: a proof as returned by /api/proof/<id> (document_hash,
+    timestamp, owner_id, signature), or just a document_id/document_hash
+    to check the registered record's own signature.
+    
+    Response:
+    {
+        "success": true,
+        "verified": true/false,
+        "signatureValid": true/false,
+        "registered": true/false,
+        ...
+    }
+    """
+    try:
+        proof = request.get_json(silent=True)
+        if not proof:
+            return jsonify({
+                'success': False,
+                'error': 'No proof provided'
+            }), 400
+        
+        result = proof_verifier.verify(proof)
+        
+        return jsonify(dict(result, success=True)), 200
+        
+    except Exception as e:
+        print(f"Verify signature error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Verification failed. Please try again.'
+        }), 500
+
+
+@documents_bp.route('/verify-signature/batch', methods=['POST'])
+def verify_ownership_signatures():
+    """
+    Verify many ownership proofs at once, in parallel.
+    This endpoint is public (no authentication required).
+    
+    Request JSON: { "proofs": [ <proof>, ... ] } (up to VERIFY_BATCH_MAX)
+    
+    Response:
+    {
+        "success": true,
+        "results": [ { "index": 0, "verified": ..., ... }, ... ],
+        "count": 2,
+        "verifiedCount": 1
+    }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        proofs = data.get('proofs') if isinstance(data, dict) else None
+        
+        if not isinstance(proofs, list) or not proofs:
+            return jsonify({
+                'success': False,
+                'error': 'proofs must be a non-empty list'
+            }), 400
+        
+        if len(proofs) > config.VERIFY_BATCH_MAX:
+            return jsonify({
+                'success': False,
+                'error': f'At most {config.VERIFY_BATCH_MAX} proofs per request'
+            }), 413
+        
+        results = [
+            dict(result, index=index)
+            for index, result in enumerate(proof_verifier.verify_many(proofs))
+        ]
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'count': len(results),
+            'verifiedCount': sum(1 for result in results if result['verified'])
+        }), 200
+        
+    except Exception as e:
+        print(f"Batch verify error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Verification failed. Please try again.'
+        }), 500
+
+
+@documents_bp.route('/proof-of-work/<document_id>', methods=['GET'])
+@jwt_required()
+def download_proof_of_work(document_id):
+    """
+    Download the proof of work file attached to a document.
+    Only the document owner can download. Served straight from the blob
+    store (streamed, with Range and conditional request support).
+    """
+    try:
+        user_id = get_jwt_identity()
+        
+        document = db.get_document_by_id(document_id)
+        
+        if not document:
+            return jsonify({
+                'success': False,
+                'error': 'Document not found'
+            }), 404
+        
+        # Verify ownership
+        if document['user_id'] != user_id:
+            return jsonify({
+                'success': False,
+                'error': 'Access denied. You are not the owner of this document.'
+            }), 403
+        
+        proof = (document.get('metadata') or {}).get('proof_of_work')
+        if not proof:
+            return jsonify({
+                'success': False,
+                'error': 'No proof of work file attached to this document'
+            }), 404
+        
+        filename = proof.get('filename') or 'proof_of_work'
+        if proof.get('blob_ref'):
+            return send_file(blobs.path(proof['blob_ref']), download_name=filename, as_attachment=True)
+        
+        # Records written before proofs moved to the blob store
+        return send_file(
+            io.BytesIO(base64.b64decode(proof['data'])),
+            download_name=filename,
+            as_attachment=True
+        )
+        
+    except Exception as e:
+        print(f"Proof of work download error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to download proof of work file'
+        }), 500
+
+
 @documents_bp.route('/download/<document_id>', methods=['GET'])
 @jwt_required()
 def download_document(document_id):
     """
-    Download the original document (decrypted).
+    Download the original document (decrypted, streamed).
     Only the document owner can download.
+    
+    The ETag is the document hash: `If-None-Match` answers 304 without
+    touching the content. A single `Range` is served as 206 by decrypting
+    only the segments it covers (416 if it lies outside the file); other
+    requests get the whole document.
     """
     try:
         user_id = get_jwt_identity()
@@ -397,25 +910,61 @@ def download_document(document_id):
                 'error': 'Access denied. You are not the owner of this document.'
             }), 403
         
-        # Decrypt the document
-        decrypted_data = decrypt_file(
-            document['encrypted_data'],
-            document['encryption_nonce'],
-            document['encryption_key']
-        )
+        etag = document['hash']
+        headers = {'Accept-Ranges': 'bytes', 'Cache-Control': 'private'}
         
-        if not decrypted_data:
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304, headers=headers)
+            response.set_etag(etag)
+            return response
+        
+        payload = db.get_document_payload(document_id)
+        if not payload:
+            return jsonify({
+                'success': False,
+                'error': 'Document content not found'
+            }), 404
+        
+        # Decrypt the document as it is sent; the first chunk is decrypted
+        # up front so a bad key or tag still gets an error response
+        try:
+            size, read_range = open_document_content(document_id, payload)
+            
+            status, start, stop = 200, 0, size
+            # Ranges only apply to the version the client has (If-Range)
+            byte_range = request.range
+            if_range = request.if_range
+            if (byte_range is not None and len(byte_range.ranges) == 1
+                    and (not request.headers.get('If-Range') or if_range.etag == etag)):
+                bounds = byte_range.range_for_length(size)
+                if bounds is None:
+                    response = Response(status=416, headers=headers)
+                    response.headers['Content-Range'] = f'bytes */{size}'
+                    response.set_etag(etag)
+                    return response
+                status, (start, stop) = 206, bounds
+                headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+            
+            chunks = read_range(start, stop)
+            first = next(chunks, b'')
+        except ValueError as e:
+            print(f"Decryption error: {e}")
             return jsonify({
                 'success': False,
                 'error': 'Failed to decrypt document'
             }), 500
         
-        # Send file
-        return send_file(
-            io.BytesIO(decrypted_data),
-            download_name=document['original_name'],
-            as_attachment=True
+        filename = document['original_name']
+        headers['Content-Length'] = str(stop - start)
+        headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response = Response(
+            chain([first], chunks),
+            status=status,
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            headers=headers
         )
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         print(f"Download error: {e}")
@@ -0,0 +1,67 @@
+"""
+Test configuration
+==================
+Points the app at a throwaway folder before anything imports `config`
+(the database, blob store and upload sessions are created on import), and
+provides a Flask test client plus a helper to register users.
+
+The tests run from inside that folder with a relative UPLOAD_FOLDER, so
+paths resolved against the working directory differ from paths resolved
+against the app's root_path (backend/), as they do in deployments that do
+not start the server from backend/.
+
+Usage (from the backend folder):
+    python -m pytest
+"""
+
+import os
+import sys
+import uuid
+import shutil
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_tmp = tempfile.mkdtemp(prefix='inventa-tests-')
+os.environ.update({
+    'STORAGE_ENGINE': 'tinydb',
+    'DATABASE_PATH': os.path.join(_tmp, 'db.json'),
+    'SQLITE_DATABASE_PATH': os.path.join(_tmp, 'db.sqlite3'),
+    'UPLOAD_FOLDER': 'uploads',
+    'UPLOAD_CHUNK_SIZE': str(64 * 1024),
+    'LOGIN_LOG_DIR': os.path.join(_tmp, 'logins'),
+    'SNAPSHOT_DIR': os.path.join(_tmp, 'snapshots'),
+    'PASSWORD_SCRYPT_LOG_N': '10',  # fast hashes; the scheme is the same
+})
+os.chdir(_tmp)
+
+from app import app  # noqa: E402
+from utils.database import db  # noqa: E402
+
+
+def pytest_sessionfinish(session, exitstatus):
+    db.engine.close()
+    os.chdir(BACKEND_DIR)
+    shutil.rmtree(_tmp, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.fixture
+def register(client):
+    """Register a new user; returns (user record, Authorization headers)."""
+    def register_user(password='correct horse'):
+        name = f"user_{uuid.uuid4().hex[:12]}"
+        response = client.post('/api/register', json={
+            'username': name, 'email': f"{name}@example.com", 'password': password
+        })
+        assert response.status_code == 201, response.get_json()
+        body = response.get_json()
+        return db.get_user_by_id(body['user']['id']), {'Authorization': f"Bearer {body['token']}"}
+    return register_user
@@ -0,0 +1,45 @@
+"""
+Password hashing: versioned hashes and the upgrade of legacy SHA-256 ones.
+"""
+
+import hashlib
+
+from utils.database import db
+from utils.passwords import PasswordHasher
+
+
+def login(client, user, password):
+    return client.post('/api/login', json={'email': user['email'], 'password': password})
+
+
+def test_new_accounts_get_salted_hashes(register):
+    user, _ = register(password='hunter22')
+    assert user['password_hash'].startswith('$scrypt$')
+    other, _ = register(password='hunter22')
+    assert other['password_hash'] != user['password_hash']
+
+
+def test_legacy_hash_is_upgraded_on_login(client, register):
+    user, _ = register(password='old password')
+    legacy = hashlib.sha256(b'old password').hexdigest()
+    db.update_user(user['id'], {'password_hash': legacy})
+
+    assert login(client, user, 'wrong password').status_code == 401
+    assert db.get_user_by_id(user['id'])['password_hash'] == legacy
+
+    assert login(client, user, 'old password').status_code == 200
+    upgraded = db.get_user_by_id(user['id'])['password_hash']
+    assert upgraded.startswith('$scrypt$')
+
+    # The new hash keeps working, and is not rehashed again
+    assert login(client, user, 'old password').status_code == 200
+    assert db.get_user_by_id(user['id'])['password_hash'] == upgraded
+
+
+def test_needs_rehash_follows_settings():
+    weak, strong = PasswordHasher(scrypt_log_n=10), PasswordHasher(scrypt_log_n=11)
+    stored = weak.hash('secret')
+    assert not weak.needs_rehash(stored)
+    assert strong.needs_rehash(stored)
+    assert strong.verify('secret', stored)
+    assert not strong.verify('Secret', stored)
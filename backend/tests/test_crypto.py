@@ -0,0 +1,77 @@
+"""
+Segmented encryption (format v2): round trips, ranges and tamper rejection.
+"""
+
+import io
+import os
+
+import pytest
+
+from utils.crypto import TAG_SIZE, SegmentDecryptor, SegmentEncryptor
+
+SEGMENT = 1024
+
+
+def encrypt(plain, doc_id='doc_1', chunk=700):
+    encryptor = SegmentEncryptor(doc_id, segment_size=SEGMENT)
+    out = b''.join(encryptor.update(plain[i:i + chunk]) for i in range(0, len(plain), chunk))
+    return encryptor, out + encryptor.finalize()
+
+
+def decrypt(encryptor, ciphertext, doc_id='doc_1', start=0, end=None):
+    decryptor = SegmentDecryptor(doc_id, encryptor.key, encryptor.params['nonce'],
+                                 len(ciphertext), segment_size=SEGMENT)
+    return b''.join(decryptor.iter_range(io.BytesIO(ciphertext), start, end))
+
+
+@pytest.mark.parametrize('size', [0, 1, SEGMENT - 1, SEGMENT, SEGMENT + 1, 5 * SEGMENT, 5 * SEGMENT + 17])
+def test_round_trip(size):
+    plain = os.urandom(size)
+    encryptor, ciphertext = encrypt(plain)
+    assert len(ciphertext) == size + max(1, -(-size // SEGMENT)) * TAG_SIZE
+    assert decrypt(encryptor, ciphertext) == plain
+
+
+def test_ranges_decrypt_only_what_they_cover():
+    plain = os.urandom(4 * SEGMENT + 100)
+    encryptor, ciphertext = encrypt(plain)
+    for start, end in [(0, 1), (SEGMENT - 1, SEGMENT + 1), (2 * SEGMENT, 3 * SEGMENT),
+                       (4 * SEGMENT + 50, None), (10, 10 * SEGMENT)]:
+        assert decrypt(encryptor, ciphertext, start=start, end=end) == plain[start:end]
+
+
+def test_flipped_byte_is_rejected():
+    encryptor, ciphertext = encrypt(os.urandom(3 * SEGMENT))
+    tampered = bytearray(ciphertext)
+    tampered[SEGMENT + TAG_SIZE + 5] ^= 1
+    with pytest.raises(ValueError, match='Segment 1'):
+        decrypt(encryptor, bytes(tampered))
+    # Ranges that do not touch the damaged segment still decrypt
+    assert len(decrypt(encryptor, bytes(tampered), end=SEGMENT)) == SEGMENT
+
+
+def test_reordered_segments_are_rejected():
+    encryptor, ciphertext = encrypt(os.urandom(3 * SEGMENT))
+    stride = SEGMENT + TAG_SIZE
+    swapped = ciphertext[stride:2 * stride] + ciphertext[:stride] + ciphertext[2 * stride:]
+    with pytest.raises(ValueError):
+        decrypt(encryptor, swapped)
+
+
+def test_truncation_is_rejected():
+    encryptor, ciphertext = encrypt(os.urandom(3 * SEGMENT))
+    # Dropping whole trailing segments leaves a non-final segment last
+    with pytest.raises(ValueError):
+        decrypt(encryptor, ciphertext[:2 * (SEGMENT + TAG_SIZE)])
+
+
+def test_other_document_id_is_rejected():
+    encryptor, ciphertext = encrypt(os.urandom(100), doc_id='doc_1')
+    with pytest.raises(ValueError):
+        decrypt(encryptor, ciphertext, doc_id='doc_2')
+
+
+def test_empty_file_is_still_authenticated():
+    encryptor, ciphertext = encrypt(b'')
+    with pytest.raises(ValueError):
+        decrypt(encryptor, bytes([ciphertext[0] ^ 1]) + ciphertext[1:])
@@ -0,0 +1,156 @@
+"""
+Document routes: uploads (direct and resumable), downloads with
+conditional and Range requests, and proof-of-work files.
+"""
+
+import io
+import os
+
+import pytest
+
+from app import app
+from utils.blobstore import blobs
+from utils.crypto import hash_file
+
+SIZE = 200 * 1024 + 123  # several encryption segments
+
+
+def upload(client, headers, content, proof=None):
+    data = {'file': (io.BytesIO(content), 'work.pdf'), 'ownerName': 'Tester'}
+    if proof is not None:
+        data['proofOfWork'] = (io.BytesIO(proof), 'sketch.txt')
+    response = client.post('/api/upload', headers=headers, data=data, content_type='multipart/form-data')
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['document']
+
+
+@pytest.fixture
+def uploaded(client, register):
+    _, headers = register()
+    content = os.urandom(SIZE)
+    return upload(client, headers, content), content, headers
+
+
+# ---------- downloads ----------
+
+def test_download_whole_file(client, uploaded):
+    doc, content, headers = uploaded
+    response = client.get(f"/api/download/{doc['id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.data == content
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag'].strip('"') == doc['hash']
+
+
+def test_download_not_modified(client, uploaded):
+    doc, _, headers = uploaded
+    response = client.get(f"/api/download/{doc['id']}",
+                          headers=dict(headers, **{'If-None-Match': f'"{doc["hash"]}"'}))
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+@pytest.mark.parametrize('header, start, end', [
+    ('bytes=0-99', 0, 100),
+    ('bytes=65530-65545', 65530, 65546),  # across a segment boundary
+    (f'bytes={SIZE - 10}-', SIZE - 10, SIZE),
+    ('bytes=-10', SIZE - 10, SIZE),
+])
+def test_download_range(client, uploaded, header, start, end):
+    doc, content, headers = uploaded
+    response = client.get(f"/api/download/{doc['id']}", headers=dict(headers, Range=header))
+    assert response.status_code == 206
+    assert response.data == content[start:end]
+    assert response.headers['Content-Range'] == f'bytes {start}-{end - 1}/{SIZE}'
+
+
+def test_download_range_not_satisfiable(client, uploaded):
+    doc, _, headers = uploaded
+    response = client.get(f"/api/download/{doc['id']}", headers=dict(headers, Range=f'bytes={SIZE}-'))
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{SIZE}'
+
+
+def test_download_range_ignored_for_stale_if_range(client, uploaded):
+    doc, content, headers = uploaded
+    response = client.get(f"/api/download/{doc['id']}",
+                          headers=dict(headers, Range='bytes=0-9', **{'If-Range': '"stale"'}))
+    assert response.status_code == 200
+    assert response.data == content
+
+
+def test_download_requires_owner(client, uploaded, register):
+    doc, _, _ = uploaded
+    _, other = register()
+    assert client.get(f"/api/download/{doc['id']}", headers=other).status_code == 403
+
+
+# ---------- proof of work ----------
+
+def test_proof_of_work_download_outside_backend_folder(client, register):
+    # Regression: a relative UPLOAD_FOLDER made blob paths relative to the
+    # working directory, which send_file resolves against app.root_path
+    assert os.path.realpath(os.getcwd()) != os.path.realpath(app.root_path)
+    assert os.path.isabs(blobs.root)
+
+    _, headers = register()
+    doc = upload(client, headers, os.urandom(1000), proof=b'first draft')
+    response = client.get(f"/api/proof-of-work/{doc['id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.data == b'first draft'
+    assert 'sketch.txt' in response.headers['Content-Disposition']
+
+
+# ---------- resumable uploads ----------
+
+def start_session(client, headers, content):
+    response = client.post('/api/uploads', headers=headers, json={'filename': 'track.mp3', 'size': len(content)})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['session']
+
+
+def put_chunk(client, headers, session, index, content):
+    size = session['chunkSize']
+    return client.put(f"/api/uploads/{session['sessionId']}/chunks/{index}", headers=headers,
+                      data=content[index * size:(index + 1) * size])
+
+
+def test_chunked_upload_out_of_order(client, register):
+    _, headers = register()
+    content = os.urandom(SIZE)
+    session = start_session(client, headers, content)
+    assert session['chunkCount'] == 4
+
+    for index in (2, 0, 3):
+        assert put_chunk(client, headers, session, index, content).status_code == 200
+    # Re-sending a stored chunk is accepted
+    assert put_chunk(client, headers, session, 2, content).get_json()['stored'] is False
+
+    response = client.post(f"/api/uploads/{session['sessionId']}/finalize", headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['missingChunks'] == [1]
+
+    assert put_chunk(client, headers, session, 1, content).status_code == 200
+    response = client.post(f"/api/uploads/{session['sessionId']}/finalize", headers=headers)
+    assert response.status_code == 201, response.get_json()
+    doc = response.get_json()['document']
+    assert doc['hash'] == hash_file(content)
+
+    assert client.get(f"/api/download/{doc['id']}", headers=headers).data == content
+    # The session is gone once the document is registered
+    assert client.get(f"/api/uploads/{session['sessionId']}", headers=headers).status_code == 404
+
+
+def test_chunk_of_wrong_size_is_rejected(client, register):
+    _, headers = register()
+    content = os.urandom(SIZE)
+    session = start_session(client, headers, content)
+    response = client.put(f"/api/uploads/{session['sessionId']}/chunks/0", headers=headers, data=b'short')
+    assert response.status_code == 400
+
+
+def test_upload_session_belongs_to_its_user(client, register):
+    _, headers = register()
+    _, other = register()
+    session = start_session(client, headers, os.urandom(10))
+    assert client.get(f"/api/uploads/{session['sessionId']}", headers=other).status_code == 403
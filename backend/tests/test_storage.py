@@ -0,0 +1,101 @@
+"""
+Storage engine parity: TinyDB and SQLite answer the same API the same way.
+"""
+
+import os
+
+import pytest
+
+from utils.storage import DuplicateKeyError, Index, create_engine
+
+SCHEMA = {
+    'users': (
+        Index('id', unique=True),
+        Index('email', nocase=True, unique=True),
+        Index('created_at', ordered=True),
+    ),
+    'documents': (
+        Index('id'), Index('user_id'),
+        Index('timestamp', ordered=True, group='user_id'),
+    ),
+}
+
+
+@pytest.fixture(params=['tinydb', 'sqlite'])
+def engine(request, tmp_path):
+    name = 'db.json' if request.param == 'tinydb' else 'db.sqlite3'
+    engine = create_engine(request.param, os.path.join(tmp_path, name), SCHEMA)
+    yield engine
+    engine.close()
+
+
+def user(n, email=None):
+    return {'id': f"user_{n:04d}", 'email': email or f"u{n}@example.com", 'created_at': f"2024-01-01T00:00:{n:02d}"}
+
+
+def test_insert_and_get(engine):
+    engine.insert('users', user(1))
+    assert engine.get('users', 'id', 'user_0001') == user(1)
+    assert engine.get('users', 'id', 'user_0002') is None
+    assert engine.count('users') == 1
+
+
+def test_nocase_lookup(engine):
+    engine.insert('users', user(1, email='Alice@Example.com'))
+    assert engine.get('users', 'email', 'alice@example.COM')['id'] == 'user_0001'
+    # Case only folds on fields declared nocase
+    assert engine.get('users', 'id', 'USER_0001') is None
+
+
+def test_unique_index_rejects_duplicates(engine):
+    engine.insert('users', user(1, email='alice@example.com'))
+    with pytest.raises(DuplicateKeyError) as e:
+        engine.insert('users', user(2, email='ALICE@example.com'))
+    assert e.value.field == 'email'
+    assert engine.count('users') == 1
+
+
+def test_unique_index_rejects_duplicates_within_a_batch(engine):
+    with pytest.raises(DuplicateKeyError):
+        engine.insert_many('users', [user(1, email='bob@example.com'), user(2, email='Bob@example.com')])
+    assert engine.count('users') == 0
+
+
+def test_update_rejects_duplicates(engine):
+    engine.insert_many('users', [user(1), user(2)])
+    with pytest.raises(DuplicateKeyError):
+        engine.update('users', 'id', 'user_0002', {'email': user(1)['email'].upper()})
+    assert engine.get('users', 'id', 'user_0002')['email'] == user(2)['email']
+
+
+def test_update_and_remove(engine):
+    engine.insert_many('users', [user(1), user(2)])
+    assert engine.update('users', 'id', 'user_0001', {'name': 'Alice'}, unset=('created_at',)) == 1
+    updated = engine.get('users', 'id', 'user_0001')
+    assert updated['name'] == 'Alice' and 'created_at' not in updated
+    assert engine.remove('users', 'id', 'user_0002') == 1
+    assert engine.count('users') == 1
+
+
+def test_page_walks_every_record_once(engine):
+    engine.insert_many('users', [user(n) for n in (3, 1, 4, 0, 2)])
+    seen, after = [], None
+    while True:
+        page = engine.page('users', 'created_at', 2, after=after, fields=('id', 'created_at'))
+        if not page:
+            break
+        seen += [r['id'] for r in page]
+        after = (page[-1]['created_at'], page[-1]['id'])
+    assert seen == [f"user_{n:04d}" for n in range(5)]
+
+
+def test_page_descending_within_group(engine):
+    engine.insert_many('documents', [
+        {'id': f"doc_{n}", 'user_id': 'a' if n % 2 else 'b', 'timestamp': f"2024-01-0{n + 1}"}
+        for n in range(6)
+    ])
+    first = engine.page('documents', 'timestamp', 2, descending=True, where=('user_id', 'a'))
+    assert [r['id'] for r in first] == ['doc_5', 'doc_3']
+    rest = engine.page('documents', 'timestamp', 2, descending=True, where=('user_id', 'a'),
+                       after=(first[-1]['timestamp'], first[-1]['id']))
+    assert [r['id'] for r in rest] == ['doc_1']
@@ -0,0 +1,187 @@
+"""
+Inventa Blob Store
+==================
+Content-addressed storage for encrypted file payloads.
+
+Blobs are raw bytes stored under UPLOAD_FOLDER, addressed by the SHA-256
+of their contents and sharded two levels deep:
+
+    uploads/blobs/ab/cd/abcd1234...
+
+Document payload records keep only the blob reference (`blob_ref`), and so
+does the proof-of-work entry in document metadata.
+
+Small payloads are stored with `put()`; large ones are streamed in with
+`writer()`, which hashes the bytes as they are written and only files the
+blob under its reference on `commit()`.
+"""
+
+import os
+import re
+import base64
+import hashlib
+import tempfile
+from typing import BinaryIO, Dict
+
+from config import get_config
+
+config = get_config()
+
+_REF_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class BlobWriter:
+    """
+    Streams bytes into a temp file while computing their SHA-256.
+    `commit()` moves the file under its reference; leaving a `with` block
+    without committing (or calling `abort()`) deletes it.
+    """
+
+    def __init__(self, store: 'BlobStore'):
+        self._store = store
+        fd, self._tmp_path = tempfile.mkstemp(dir=store.tmp_dir)
+        self._file = os.fdopen(fd, 'wb')
+        self._sha = hashlib.sha256()
+        self.size = 0
+        self.ref = None
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self._sha.update(data)
+        self.size += len(data)
+
+    def commit(self) -> str:
+        """Make the blob durable and return its reference."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        ref = self._sha.hexdigest()
+        path = self._store.path(ref)
+        if os.path.exists(path):
+            os.remove(self._tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp_path, path)
+        self.ref = ref
+        return ref
+
+    def abort(self):
+        """Discard the blob (no-op once committed)."""
+        if self.ref is not None:
+            return
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.abort()
+
+
+class BlobStore:
+    """Hash-sharded, write-once blob storage on the local filesystem."""
+
+    def __init__(self, root: str):
+        # Absolute, so paths stay valid for consumers that resolve relative
+        # paths elsewhere (Flask's send_file uses the app's root_path)
+        root = os.path.abspath(root)
+        self.root = os.path.join(root, 'blobs')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, ref: str) -> str:
+        """Return the filesystem path for a blob reference."""
+        if not _REF_RE.match(ref or ''):
+            raise ValueError(f"Invalid blob reference: {ref!r}")
+        return os.path.join(self.root, ref[:2], ref[2:4], ref)
+
+    def put(self, data: bytes) -> str:
+        """Store bytes and return their blob reference."""
+        ref = hashlib.sha256(data).hexdigest()
+        path = self.path(ref)
+        if os.path.exists(path):
+            return ref
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return ref
+
+    def writer(self) -> BlobWriter:
+        """Start streaming a new blob (see `BlobWriter`)."""
+        return BlobWriter(self)
+
+    def get(self, ref: str) -> bytes:
+        """Read a blob fully into memory."""
+        with self.open(ref) as f:
+            return f.read()
+
+    def open(self, ref: str) -> BinaryIO:
+        """Open a blob for streaming reads."""
+        return open(self.path(ref), 'rb')
+
+    def exists(self, ref: str) -> bool:
+        return os.path.exists(self.path(ref))
+
+    def size(self, ref: str) -> int:
+        return os.path.getsize(self.path(ref))
+
+    def delete(self, ref: str) -> bool:
+        try:
+            os.remove(self.path(ref))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def migrate_inline_payloads(database, store: BlobStore) -> Dict[str, int]:
+    """
+    Move base64 `encrypted_data` embedded in document payload records into
+    the blob store, leaving a `blob_ref` behind. Safe to re-run.
+    """
+    moved = skipped = 0
+    for payload in list(database.iter_document_payloads()):
+        if 'encrypted_data' not in payload:
+            skipped += 1
+            continue
+        ref = store.put(base64.b64decode(payload['encrypted_data']))
+        database.update_document(payload['id'], {'blob_ref': ref}, unset=('encrypted_data',))
+        moved += 1
+    return {'moved': moved, 'skipped': skipped}
+
+
+def migrate_inline_proofs(database, store: BlobStore) -> Dict[str, int]:
+    """
+    Move base64 proof-of-work files embedded in document metadata
+    (`metadata.proof_of_work.data`) into the blob store, leaving a
+    `blob_ref` behind. Safe to re-run.
+    """
+    moved = skipped = 0
+    for doc in database.get_all_documents(fields=('id', 'metadata')):
+        metadata = doc.get('metadata') or {}
+        proof = metadata.get('proof_of_work')
+        if not isinstance(proof, dict) or 'data' not in proof:
+            skipped += 1
+            continue
+        data = base64.b64decode(proof['data'])
+        proof = {k: v for k, v in proof.items() if k != 'data'}
+        proof.update(blob_ref=store.put(data), size=len(data))
+        database.update_document(doc['id'], {'metadata': dict(metadata, proof_of_work=proof)})
+        moved += 1
+    return {'moved': moved, 'skipped': skipped}
+
+
+# Create a global blob store instance
+blobs = BlobStore(config.UPLOAD_FOLDER)
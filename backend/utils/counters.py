@@ -0,0 +1,51 @@
+"""
+Inventa Counters
+================
+Running aggregates over the login log, fed one record at a time by
+`SegmentedLog` as it tails newly appended lines (see `observers` there).
+Reading them is O(1) regardless of history size, and a snapshot never
+sees a record half-added (the counters have their own lock, since they are
+read outside the log's).
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+
+class LoginCounters:
+    """Totals, per-status counts, distinct users and per-day buckets for login records."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.total = 0
+            self.by_status = Counter()
+            self.users = set()
+            self.daily = Counter()  # 'YYYY-MM-DD' -> logins
+
+    def add(self, record: dict):
+        timestamp = record.get('timestamp')
+        with self._lock:
+            self.total += 1
+            self.by_status[record.get('status')] += 1
+            if record.get('user_id'):
+                self.users.add(record['user_id'])
+            if isinstance(timestamp, str):
+                self.daily[timestamp[:10]] += 1
+
+    def snapshot(self, today: Optional[str] = None) -> dict:
+        """Current values, in the shape returned by `Database.get_login_stats`."""
+        today = today or datetime.utcnow().date().isoformat()
+        with self._lock:
+            return {
+                'total_logins': self.total,
+                'successful_logins': self.by_status['success'],
+                'failed_logins': self.by_status['failed'],
+                'unique_users': len(self.users),
+                'today_logins': self.daily[today]
+            }
@@ -3,7 +3,7 @@ Inventa Cryptography Utilities
 ==============================
 Handles all cryptographic operations including:
 - SHA-256 document hashing
-- AES-GCM encryption/decryption
+- AES-GCM encryption/decryption (single-shot and segmented)
 - ECC key pair generation
 - ECDSA signing and verification
 """
@@ -13,11 +13,15 @@ import hashlib
 import base64
 import json
 from datetime import datetime
+from typing import BinaryIO, Iterator
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 
+from utils.keycache import key_cache
+
 
 def generate_document_id():
     """Generate a unique document ID."""
@@ -31,19 +35,6 @@ def generate_user_id():
     return f"user_{hashlib.sha256(random_bytes).hexdigest()[:12]}"
 
 
-def hash_password(password: str) -> str:
-    """
-    Hash a password using SHA-256.
-    In production, use bcrypt or Argon2 instead.
-    """
-    return hashlib.sha256(password.encode('utf-8')).hexdigest()
-
-
-def verify_password(password: str, password_hash: str) -> bool:
-    """Verify a password against its hash."""
-    return hash_password(password) == password_hash
-
-
 def hash_file(file_data: bytes) -> str:
     """
     Generate SHA-256 hash of file data.
@@ -77,18 +68,15 @@ def generate_ecc_keypair():
     return private_pem, public_pem
 
 
-def sign_document(data: str, private_key_pem: str) -> str:
+def sign_document(data: str, private_key_pem: str, user_id: str = None) -> str:
     """
     Sign document data using ECDSA with the private key.
     Returns base64-encoded signature.
+    The parsed key is cached per user (see `utils.keycache`).
     """
     try:
         # Load private key
-        private_key = serialization.load_pem_private_key(
-            private_key_pem.encode('utf-8'),
-            password=None,
-            backend=default_backend()
-        )
+        private_key = key_cache.private_key(private_key_pem, user_id)
         
         # Sign the data
         signature = private_key.sign(
@@ -102,17 +90,15 @@ def sign_document(data: str, private_key_pem: str) -> str:
         return ""
 
 
-def verify_signature(data: str, signature_b64: str, public_key_pem: str) -> bool:
+def verify_signature(data: str, signature_b64: str, public_key_pem: str, user_id: str = None) -> bool:
     """
     Verify a signature using the public key.
     Returns True if signature is valid.
+    The parsed key is cached per user (see `utils.keycache`).
     """
     try:
         # Load public key
-        public_key = serialization.load_pem_public_key(
-            public_key_pem.encode('utf-8'),
-            backend=default_backend()
-        )
+        public_key = key_cache.public_key(public_key_pem, user_id)
         
         # Decode signature
         signature = base64.b64decode(signature_b64)
@@ -133,10 +119,11 @@ def generate_aes_key() -> bytes:
     return os.urandom(32)
 
 
-def encrypt_file(file_data: bytes, key: bytes = None) -> dict:
+def encrypt_file(file_data: bytes, key: bytes = None, raw: bool = False) -> dict:
     """
     Encrypt file data using AES-256-GCM.
     Returns dict with encrypted data, nonce, and key (all base64 encoded).
+    With `raw=True` the encrypted data is returned as bytes instead.
     """
     if key is None:
         key = generate_aes_key()
@@ -149,19 +136,145 @@ def encrypt_file(file_data: bytes, key: bytes = None) -> dict:
     encrypted_data = aesgcm.encrypt(nonce, file_data, None)
     
     return {
-        'encrypted_data': base64.b64encode(encrypted_data).decode('utf-8'),
+        'encrypted_data': encrypted_data if raw else base64.b64encode(encrypted_data).decode('utf-8'),
         'nonce': base64.b64encode(nonce).decode('utf-8'),
         'key': base64.b64encode(key).decode('utf-8')
     }
 
 
-def decrypt_file(encrypted_data_b64: str, nonce_b64: str, key_b64: str) -> bytes:
+# ==================== SEGMENTED ENCRYPTION ====================
+#
+# Format v2 (v1 is a single AES-GCM call over the whole file, see
+# encrypt_file). The plaintext is cut into SEGMENT_SIZE segments, each
+# sealed on its own with AES-256-GCM and stored back to back:
+#
+#     [segment 0 ciphertext | tag] [segment 1 ciphertext | tag] ...
+#
+# Segment nonces are nonce_prefix (7 random bytes) || index (4 bytes,
+# big endian) || final flag (1 byte), and the document id is the
+# associated data. A segment therefore only decrypts at its own position,
+# in its own document, and dropping trailing segments is detected because
+# the last one must carry the final flag. Every segment but the last is
+# full, so any byte range maps to the segments covering it.
+
+ENCRYPTION_VERSION = 2
+SEGMENT_SIZE = 64 * 1024
+TAG_SIZE = 16
+_NONCE_PREFIX_SIZE = 7
+
+
+def _segment_nonce(prefix: bytes, index: int, final: bool) -> bytes:
+    return prefix + index.to_bytes(4, 'big') + (b'\x01' if final else b'\x00')
+
+
+class SegmentEncryptor:
+    """
+    Encrypts a file chunk by chunk into the segmented format; feed it with
+    `update()` and finish with `finalize()`. Holds at most one segment.
+    """
+
+    def __init__(self, document_id: str, key: bytes = None, segment_size: int = SEGMENT_SIZE):
+        self.key = key or generate_aes_key()
+        self.nonce_prefix = os.urandom(_NONCE_PREFIX_SIZE)
+        self.segment_size = segment_size
+        self._aad = document_id.encode('utf-8')
+        self._aesgcm = AESGCM(self.key)
+        self._buffer = bytearray()
+        self._index = 0
+
+    def _seal(self, data: bytes, final: bool) -> bytes:
+        nonce = _segment_nonce(self.nonce_prefix, self._index, final)
+        self._index += 1
+        return self._aesgcm.encrypt(nonce, data, self._aad)
+
+    def update(self, data: bytes) -> bytes:
+        """Return the ciphertext of the segments completed by `data`."""
+        self._buffer += data
+        out, pos = [], 0
+        # A full segment is only sealed once more data follows it: the
+        # last one (full or not) is sealed as final by finalize()
+        while len(self._buffer) - pos > self.segment_size:
+            out.append(self._seal(bytes(self._buffer[pos:pos + self.segment_size]), final=False))
+            pos += self.segment_size
+        del self._buffer[:pos]
+        return b''.join(out)
+
+    def finalize(self) -> bytes:
+        """Return the final segment (possibly empty plaintext, never empty output)."""
+        out = self._seal(bytes(self._buffer), final=True)
+        self._buffer = bytearray()
+        return out
+
+    @property
+    def params(self) -> dict:
+        """
+        Payload fields describing the encryption (base64 nonce prefix). The
+        key is not included: it is stored wrapped, see `utils.envelope`.
+        """
+        return {
+            'encryption_version': ENCRYPTION_VERSION,
+            'segment_size': self.segment_size,
+            'nonce': base64.b64encode(self.nonce_prefix).decode('utf-8')
+        }
+
+
+class SegmentDecryptor:
+    """
+    Random-access decryption of a segmented ciphertext of `ciphertext_size`
+    bytes. Raises ValueError if a segment fails authentication.
+    """
+
+    def __init__(self, document_id: str, key: bytes, nonce_b64: str, ciphertext_size: int,
+                 segment_size: int = SEGMENT_SIZE):
+        self.segment_size = segment_size
+        self.nonce_prefix = base64.b64decode(nonce_b64)
+        self._aad = document_id.encode('utf-8')
+        self._aesgcm = AESGCM(key)
+        stride = segment_size + TAG_SIZE
+        self.segments = max(1, -(-ciphertext_size // stride))
+        self.size = ciphertext_size - self.segments * TAG_SIZE
+        if self.size < 0 or len(self.nonce_prefix) != _NONCE_PREFIX_SIZE:
+            raise ValueError('Not a segmented ciphertext')
+
+    def decrypt_segment(self, index: int, data: bytes) -> bytes:
+        nonce = _segment_nonce(self.nonce_prefix, index, index == self.segments - 1)
+        try:
+            return self._aesgcm.decrypt(nonce, data, self._aad)
+        except InvalidTag:
+            raise ValueError(f'Segment {index} failed authentication') from None
+
+    def iter_range(self, f: BinaryIO, start: int = 0, end: int = None) -> Iterator[bytes]:
+        """
+        Yield the plaintext bytes [start, end) read from the seekable
+        ciphertext file `f`, decrypting only the segments involved.
+        """
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            if self.size == 0:
+                # Still authenticate the (empty) final segment
+                f.seek(0)
+                self.decrypt_segment(0, f.read(TAG_SIZE))
+            return
+        stride = self.segment_size + TAG_SIZE
+        first, last = start // self.segment_size, (end - 1) // self.segment_size
+        f.seek(first * stride)
+        for index in range(first, last + 1):
+            plain = self.decrypt_segment(index, f.read(stride))
+            offset = index * self.segment_size
+            yield plain[max(start - offset, 0):end - offset]
+
+
+def decrypt_file(encrypted_data_b64, nonce_b64: str, key_b64: str) -> bytes:
     """
     Decrypt file data using AES-256-GCM.
+    `encrypted_data_b64` may be a base64 string or raw ciphertext bytes.
     Returns decrypted file bytes.
     """
     try:
-        encrypted_data = base64.b64decode(encrypted_data_b64)
+        if isinstance(encrypted_data_b64, (bytes, bytearray)):
+            encrypted_data = bytes(encrypted_data_b64)
+        else:
+            encrypted_data = base64.b64decode(encrypted_data_b64)
         nonce = base64.b64decode(nonce_b64)
         key = base64.b64decode(key_b64)
         
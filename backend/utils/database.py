@@ -1,138 +1,323 @@
 """
 Inventa Database Utilities
 ==========================
-TinyDB wrapper for document-based storage.
+Database wrapper for document-based storage.
 Handles all database operations for users, documents, and login history.
+The actual storage backend (TinyDB or SQLite) is selected via
+`Config.STORAGE_ENGINE`; see `utils.storage`. Login history lives in its
+own append-only segment log (`utils.logstore`).
+
+Documents are split in two tables: `documents` holds the metadata every
+listing reads, `document_payloads` the blob reference and encryption
+material only downloads need.
 """
 
 import os
-from tinydb import TinyDB, Query
-from tinydb.table import Table
-from typing import Optional, List, Dict, Any
+import threading
+from contextlib import contextmanager
+from itertools import islice
+from typing import Optional, List, Dict, Any, Tuple, Iterable, Iterator
 from datetime import datetime
 
 from config import get_config
+from utils.storage import Fields, Index, DuplicateKeyError, create_engine
+from utils.logstore import SegmentedLog
+from utils.counters import LoginCounters
+from utils.pagination import encode_cursor, decode_cursor, LOG_CURSOR
+from utils.export import EXPORT_VERSION
+from utils.keycache import key_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 config = get_config()
 
+# Indexed fields per table (used by engines that support real indexes).
+# Ordered indexes back the paginated listings.
+SCHEMA = {
+    config.USERS_TABLE: (
+        Index('id', unique=True),
+        Index('email', nocase=True, unique=True),
+        Index('username', unique=True),
+        Index('created_at', ordered=True),
+    ),
+    config.DOCUMENTS_TABLE: (
+        Index('id'), Index('hash'), Index('user_id'),
+        Index('timestamp', ordered=True),
+        Index('timestamp', ordered=True, group='user_id'),
+    ),
+    config.DOCUMENT_PAYLOADS_TABLE: (Index('id', unique=True),),
+    # Legacy: only read once, to import old records into the login log
+    config.LOGIN_HISTORY_TABLE: (Index('id'), Index('user_id')),
+}
+
+# Fields stripped from records in redacted exports
+SENSITIVE_FIELDS = {
+    config.USERS_TABLE: ('password_hash', 'private_key'),
+    config.DOCUMENTS_TABLE: ('encrypted_data', 'encryption_key', 'wrapped_key', 'encryption_nonce'),
+}
+
+# Document fields kept in the payload table rather than with the metadata
+PAYLOAD_FIELDS = ('blob_ref', 'encrypted_data', 'encryption_key', 'encryption_nonce',
+                  'encryption_version', 'segment_size', 'wrapped_key', 'kek_id')
+
+
+def public_metadata(metadata: Optional[dict]) -> dict:
+    """
+    Document metadata as returned by the API: proof-of-work files are only
+    referenced (blob_ref, size), never embedded, even in records written
+    before they moved to the blob store.
+    """
+    metadata = dict(metadata or {})
+    proof = metadata.get('proof_of_work')
+    if isinstance(proof, dict) and 'data' in proof:
+        metadata['proof_of_work'] = {k: v for k, v in proof.items() if k != 'data'}
+    return metadata
+
+
+def split_document(doc: dict) -> Tuple[dict, dict]:
+    """Split a full document record into (metadata, payload)."""
+    meta = {k: v for k, v in doc.items() if k not in PAYLOAD_FIELDS}
+    payload = {k: v for k, v in doc.items() if k in PAYLOAD_FIELDS}
+    payload['id'] = doc.get('id')
+    return meta, payload
+
+
+def storage_path(engine_name: str) -> str:
+    """Return the on-disk path used by the given storage engine."""
+    if engine_name == 'sqlite':
+        return config.SQLITE_DATABASE_PATH
+    return config.DATABASE_PATH
+
 
 class Database:
     """
-    TinyDB database wrapper for Inventa.
-    Provides CRUD operations for users, documents, and login history.
+    Database wrapper for Inventa.
+    Provides CRUD operations for users, documents, and login history
+    on top of the configured storage engine.
+    Safe to share between request threads: the engines and the login log
+    do their own locking.
     """
     
     _instance = None
+    _instance_lock = threading.Lock()
     
     def __new__(cls):
-        """Singleton pattern to ensure only one database instance."""
+        """Singleton pattern to ensure only one database instance (thread-safe)."""
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialize()
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._initialize()
+                    cls._instance = instance
         return cls._instance
     
     def _initialize(self):
         """Initialize the database connection."""
-        # Ensure data directory exists
-        db_path = config.DATABASE_PATH
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        db_path = storage_path(config.STORAGE_ENGINE)
+        
+        # Initialize the storage engine
+        self.engine = create_engine(
+            config.STORAGE_ENGINE, db_path, SCHEMA,
+            write_behind=config.WRITE_BEHIND,
+            commit_window=config.WRITE_BEHIND_WINDOW_MS / 1000.0,
+            commit_max_ops=config.WRITE_BEHIND_MAX_OPS,
+            checkpoint_ops=config.WRITE_BEHIND_CHECKPOINT_OPS,
+            checkpoint_interval=config.WRITE_BEHIND_CHECKPOINT_SECONDS,
+            format=config.DATABASE_FORMAT,
+            compact_ratio=config.COMPACT_GARBAGE_RATIO,
+            compact_min_bytes=config.COMPACT_MIN_BYTES
+        )
         
-        # Initialize TinyDB
-        self.db = TinyDB(db_path, indent=2)
+        # Table names
+        self.users = config.USERS_TABLE
+        self.documents = config.DOCUMENTS_TABLE
+        self.document_payloads = config.DOCUMENT_PAYLOADS_TABLE
+        self.login_history = config.LOGIN_HISTORY_TABLE
         
-        # Get table references
-        self.users = self.db.table(config.USERS_TABLE)
-        self.documents = self.db.table(config.DOCUMENTS_TABLE)
-        self.login_history = self.db.table(config.LOGIN_HISTORY_TABLE)
+        # Login history log, with running aggregates for get_login_stats
+        self.login_counters = LoginCounters()
+        self.logins = SegmentedLog(
+            config.LOGIN_LOG_DIR,
+            max_segment_bytes=config.LOGIN_LOG_SEGMENT_BYTES,
+            max_segment_age=config.LOGIN_LOG_SEGMENT_SECONDS,
+            fsync_every=config.LOGIN_LOG_FSYNC_EVERY,
+            index_fields=('user_id',),
+            observers=(self.login_counters,)
+        )
+        self._import_legacy_login_history()
+        self._split_document_payloads()
         
-        print(f"✅ Database initialized at: {db_path}")
-        print(f"   - Users: {len(self.users)} records")
-        print(f"   - Documents: {len(self.documents)} records")
-        print(f"   - Login History: {len(self.login_history)} records")
+        print(f"✅ Database initialized at: {db_path} ({self.engine.name})")
+        print(f"   - Users: {self.engine.count(self.users)} records")
+        print(f"   - Documents: {self.engine.count(self.documents)} records")
+        print(f"   - Login History: {self.logins.count()} records")
+    
+    @contextmanager
+    def _migration_lock(self):
+        """
+        Serialize the startup migrations below across processes: every
+        gunicorn worker runs them, and each must see the others' result.
+        """
+        with open(storage_path(config.STORAGE_ENGINE) + '.migrate.lock', 'a+b') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            yield
+    
+    def _import_legacy_login_history(self):
+        """Move login history stored in the main database into the login log."""
+        if not self.engine.count(self.login_history):
+            return
+        with self._migration_lock():
+            # Another worker may have moved them while we waited
+            if not self.engine.count(self.login_history):
+                return
+            legacy = self.engine.all(self.login_history)
+            legacy.sort(key=lambda x: x.get('timestamp', ''))
+            for entry in legacy:
+                self.logins.append(dict(entry))
+            self.logins.flush()
+            self.engine.truncate(self.login_history)
+            self.wait_for_commit()
+        print(f"✅ Moved {len(legacy)} login records to {config.LOGIN_LOG_DIR}")
+    
+    def _split_document_payloads(self):
+        """Move payload fields of documents stored before the table split into their own table."""
+        if self.engine.count(self.document_payloads) >= self.engine.count(self.documents):
+            return
+        with self._migration_lock():
+            # Re-count: another worker may have split them while we waited
+            if self.engine.count(self.document_payloads) >= self.engine.count(self.documents):
+                return
+            split = {p['id'] for p in self.engine.iter_all(self.document_payloads)}
+            moved = 0
+            for doc in list(self.engine.iter_all(self.documents)):
+                meta, payload = split_document(doc)
+                if doc.get('id') not in split:
+                    try:
+                        self.engine.insert(self.document_payloads, payload)
+                        moved += 1
+                    except DuplicateKeyError:
+                        pass  # already split
+                # Also finishes documents an interrupted run copied but did not strip
+                if len(meta) < len(doc):
+                    self.engine.update(self.documents, 'id', doc['id'], {},
+                                       unset=[k for k in PAYLOAD_FIELDS if k in doc])
+            self.wait_for_commit()
+        print(f"✅ Moved payloads of {moved} documents to {self.document_payloads}")
     
     # ==================== USER OPERATIONS ====================
     
     def create_user(self, user_data: dict) -> dict:
-        """Create a new user."""
+        """
+        Create a new user.
+        Raises DuplicateKeyError if the email (case-insensitive), username
+        or id is already taken; the check and insert are atomic.
+        """
         user_data['created_at'] = datetime.utcnow().isoformat() + 'Z'
-        self.users.insert(user_data)
+        self.engine.insert(self.users, user_data)
         print(f"✅ User created: {user_data.get('username')}")
         return user_data
     
     def get_user_by_id(self, user_id: str) -> Optional[dict]:
         """Get user by ID."""
-        User = Query()
-        result = self.users.search(User.id == user_id)
-        return result[0] if result else None
+        return self.engine.get(self.users, 'id', user_id)
     
     def get_user_by_email(self, email: str) -> Optional[dict]:
-        """Get user by email (case-insensitive)."""
-        User = Query()
-        result = self.users.search(User.email.test(lambda e: e.lower() == email.lower()))
-        return result[0] if result else None
+        """Get user by email (case-insensitive, via the normalized email index)."""
+        return self.engine.get(self.users, 'email', email)
     
     def get_user_by_username(self, username: str) -> Optional[dict]:
         """Get user by username."""
-        User = Query()
-        result = self.users.search(User.username == username)
-        return result[0] if result else None
+        return self.engine.get(self.users, 'username', username)
     
     def get_all_users(self) -> List[dict]:
         """Get all users."""
-        return self.users.all()
+        return self.engine.all(self.users)
+    
+    def get_users_page(self, limit: int, after: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """Get one page of users, oldest first. Returns (users, next cursor)."""
+        return self._page(self.users, 'created_at', limit, after)
     
     def update_user(self, user_id: str, data: dict) -> bool:
         """Update user data."""
-        User = Query()
-        self.users.update(data, User.id == user_id)
+        self.engine.update(self.users, 'id', user_id, data)
+        if 'private_key' in data or 'public_key' in data:
+            key_cache.invalidate(user_id)
         return True
     
     def delete_user(self, user_id: str) -> bool:
         """Delete a user."""
-        User = Query()
-        self.users.remove(User.id == user_id)
+        self.engine.remove(self.users, 'id', user_id)
+        key_cache.invalidate(user_id)
         return True
     
     # ==================== DOCUMENT OPERATIONS ====================
     
     def create_document(self, doc_data: dict) -> dict:
-        """Create a new document record."""
+        """Create a new document record (metadata and payload)."""
         doc_data['created_at'] = datetime.utcnow().isoformat() + 'Z'
-        self.documents.insert(doc_data)
+        meta, payload = split_document(doc_data)
+        # Payload first, so a listed document can always be downloaded
+        self.engine.insert(self.document_payloads, payload)
+        self.engine.insert(self.documents, meta)
         print(f"✅ Document created: {doc_data.get('id')}")
         return doc_data
     
     def get_document_by_id(self, doc_id: str) -> Optional[dict]:
-        """Get document by ID."""
-        Doc = Query()
-        result = self.documents.search(Doc.id == doc_id)
-        return result[0] if result else None
+        """Get document metadata by ID (see `get_document_payload`)."""
+        return self.engine.get(self.documents, 'id', doc_id)
     
     def get_document_by_hash(self, doc_hash: str) -> Optional[dict]:
-        """Get document by hash."""
-        Doc = Query()
-        result = self.documents.search(Doc.hash == doc_hash)
-        return result[0] if result else None
-    
-    def get_documents_by_user(self, user_id: str) -> List[dict]:
-        """Get all documents for a user."""
-        Doc = Query()
-        return self.documents.search(Doc.user_id == user_id)
-    
-    def get_all_documents(self) -> List[dict]:
-        """Get all documents."""
-        return self.documents.all()
-    
-    def update_document(self, doc_id: str, data: dict) -> bool:
-        """Update document data."""
-        Doc = Query()
-        self.documents.update(data, Doc.id == doc_id)
+        """Get document metadata by hash."""
+        return self.engine.get(self.documents, 'hash', doc_hash)
+    
+    def get_document_payload(self, doc_id: str) -> Optional[dict]:
+        """Get a document's blob reference and encryption material."""
+        return self.engine.get(self.document_payloads, 'id', doc_id)
+    
+    def iter_document_payloads(self) -> Iterator[dict]:
+        """Stream every document payload record."""
+        return self.engine.iter_all(self.document_payloads)
+    
+    def get_documents_by_user(self, user_id: str, fields: Fields = None) -> List[dict]:
+        """Get all documents for a user (only `fields` of each, if given)."""
+        return self.engine.search(self.documents, 'user_id', user_id, fields=fields)
+    
+    def get_all_documents(self, fields: Fields = None) -> List[dict]:
+        """Get all documents (only `fields` of each, if given)."""
+        return self.engine.all(self.documents, fields=fields)
+    
+    def get_documents_page(self, limit: int, after: Optional[str] = None,
+                           user_id: Optional[str] = None,
+                           fields: Fields = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Get one page of documents (optionally one user's), newest first,
+        with only `fields` of each if given. Returns (documents, next cursor).
+        """
+        where = ('user_id', user_id) if user_id is not None else None
+        return self._page(self.documents, 'timestamp', limit, after, descending=True,
+                          where=where, fields=fields)
+    
+    def update_document(self, doc_id: str, data: dict, unset: tuple = ()) -> bool:
+        """Update document data, optionally removing the `unset` fields."""
+        meta, payload = split_document(data)
+        meta.pop('id', None)
+        payload.pop('id')
+        meta_unset = [k for k in unset if k not in PAYLOAD_FIELDS]
+        payload_unset = [k for k in unset if k in PAYLOAD_FIELDS]
+        if meta or meta_unset:
+            self.engine.update(self.documents, 'id', doc_id, meta, unset=meta_unset)
+        if payload or payload_unset:
+            self.engine.update(self.document_payloads, 'id', doc_id, payload, unset=payload_unset)
         return True
     
     def delete_document(self, doc_id: str) -> bool:
-        """Delete a document."""
-        Doc = Query()
-        self.documents.remove(Doc.id == doc_id)
+        """Delete a document and its payload."""
+        self.engine.remove(self.documents, 'id', doc_id)
+        self.engine.remove(self.document_payloads, 'id', doc_id)
         return True
     
     # ==================== LOGIN HISTORY OPERATIONS ====================
@@ -140,69 +325,208 @@ class Database:
     def record_login(self, login_data: dict) -> dict:
         """Record a login attempt."""
         login_data['timestamp'] = datetime.utcnow().isoformat() + 'Z'
-        self.login_history.insert(login_data)
+        self.logins.append(login_data)
         return login_data
     
     def get_login_history(self, limit: int = 100) -> List[dict]:
         """Get login history, most recent first."""
-        history = self.login_history.all()
-        # Sort by timestamp descending
-        history.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-        return history[:limit]
-    
-    def get_user_login_history(self, user_id: str) -> List[dict]:
-        """Get login history for a specific user."""
-        Login = Query()
-        history = self.login_history.search(Login.user_id == user_id)
-        history.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-        return history
+        return list(islice(self.logins.iter_newest_first(), limit))
+    
+    def get_login_history_page(self, limit: int, after: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """Get one page of login history, most recent first. Returns (entries, next cursor)."""
+        before = decode_cursor(after, LOG_CURSOR) if after else None
+        entries, position = self.logins.page_newest_first(limit, before)
+        return entries, encode_cursor(*position) if position else None
+    
+    def get_user_login_history(self, user_id: str, limit: Optional[int] = None) -> List[dict]:
+        """
+        Get login history for a specific user, most recent first (at most
+        `limit` entries). Served from the log's per-user position index.
+        """
+        return self.logins.newest_by('user_id', user_id, limit)[0]
+    
+    def get_user_login_history_page(self, user_id: str, limit: int,
+                                    after: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """Get one page of a user's login history, most recent first. Returns (entries, next cursor)."""
+        before = decode_cursor(after, LOG_CURSOR) if after else None
+        entries, position = self.logins.newest_by('user_id', user_id, limit, before)
+        return entries, encode_cursor(*position) if position else None
     
     def get_login_stats(self) -> dict:
-        """Get login statistics."""
-        all_logins = self.login_history.all()
-        
-        total = len(all_logins)
-        successful = len([l for l in all_logins if l.get('status') == 'success'])
-        failed = len([l for l in all_logins if l.get('status') == 'failed'])
-        
-        # Get unique users
-        unique_users = set(l.get('user_id') for l in all_logins if l.get('user_id'))
-        
-        # Today's logins
-        today = datetime.utcnow().date().isoformat()
-        today_logins = len([l for l in all_logins if l.get('timestamp', '').startswith(today)])
-        
-        return {
-            'total_logins': total,
-            'successful_logins': successful,
-            'failed_logins': failed,
-            'unique_users': len(unique_users),
-            'today_logins': today_logins
-        }
+        """
+        Get login statistics.
+        Served from counters updated as new log records are read (including
+        those written by other workers), so the cost does not grow with
+        history size.
+        """
+        self.logins.refresh()
+        return self.login_counters.snapshot()
+    
+    # ==================== PAGINATION ====================
+    
+    def _page(self, table: str, field: str, limit: int, after: Optional[str],
+              descending: bool = False, where: Optional[tuple] = None,
+              fields: Fields = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Keyset pagination over an ordered index on (field, id). `after` is
+        the cursor returned with the previous page; raises ValueError if it
+        is malformed.
+        """
+        key = decode_cursor(after) if after else None
+        if fields is not None:
+            # The cursor is built from the sort key
+            fields = tuple(dict.fromkeys((*fields, field, 'id')))
+        rows = self.engine.page(table, field, limit + 1, after=key, descending=descending,
+                                where=where, fields=fields)
+        if len(rows) <= limit:
+            return rows, None
+        last = rows[limit - 1]
+        return rows[:limit], encode_cursor(last[field], last['id'])
     
     # ==================== UTILITY OPERATIONS ====================
     
+    def wait_for_commit(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every write made by the current thread is durable.
+        Only blocks in write-behind mode; returns False on timeout.
+        """
+        return self.engine.wait_for_commit(timeout)
+    
     def get_stats(self) -> dict:
         """Get overall database statistics."""
         return {
-            'users_count': len(self.users),
-            'documents_count': len(self.documents),
-            'login_history_count': len(self.login_history),
+            'users_count': self.engine.count(self.users),
+            'documents_count': self.engine.count(self.documents),
+            'login_history_count': self.logins.count(),
             'login_stats': self.get_login_stats()
         }
     
+    def compact(self, min_garbage: Optional[float] = None) -> bool:
+        """
+        Rewrite the main database without superseded data (see
+        `StorageEngine.compact`). Returns True if it was rewritten.
+        """
+        return self.engine.compact(min_garbage)
+    
+    def snapshot(self, dest: Optional[str] = None) -> str:
+        """
+        Write a point-in-time copy of the main database (users and
+        documents) and return its path; defaults to a timestamped file in
+        `Config.SNAPSHOT_DIR`. The copy can be restored with
+        `restore_snapshot` or used directly as the database file.
+        """
+        if dest is None:
+            base, ext = os.path.splitext(os.path.basename(storage_path(self.engine.name)))
+            stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+            dest = os.path.join(config.SNAPSHOT_DIR, f"{base}-{stamp}{ext}")
+        directory = os.path.dirname(dest)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.engine.snapshot(dest)
+        return dest
+    
+    def restore_snapshot(self, source: str):
+        """Replace users and documents with the contents of a snapshot."""
+        self.engine.restore_snapshot(source)
+    
     def clear_all(self):
         """Clear all data (use with caution!)."""
-        self.db.drop_tables()
-        self._initialize()
+        self.engine.drop_all()
+        self.logins.clear()
         print("⚠️ All data cleared!")
     
+    def iter_export(self, redact: bool = True) -> Iterator[dict]:
+        """
+        Stream every record as export entries (see `utils.export`), one at
+        a time. With `redact`, sensitive fields are dropped per record.
+        """
+        yield {
+            'type': 'header',
+            'version': EXPORT_VERSION,
+            'exported_at': datetime.utcnow().isoformat() + 'Z',
+            'redacted': redact
+        }
+        counts = {}
+        for table in (self.users, self.documents):
+            hidden = SENSITIVE_FIELDS.get(table, ()) if redact else ()
+            n = 0
+            for record in self.engine.iter_all(table):
+                if table == self.documents:
+                    payload = self.get_document_payload(record.get('id')) or {}
+                    record = dict(record, **{k: v for k, v in payload.items() if k != 'id'})
+                if hidden:
+                    record = {k: v for k, v in record.items() if k not in hidden}
+                yield {'type': table, 'record': dict(record)}
+                n += 1
+            counts[table] = n
+        n = 0
+        for entry in self.logins.iter_records():
+            yield {'type': self.login_history, 'record': entry}
+            n += 1
+        counts[self.login_history] = n
+        yield {'type': 'footer', 'counts': counts}
+    
+    def import_entries(self, entries: Iterable[dict], batch_size: int = 500) -> Dict[str, int]:
+        """
+        Restore records from export entries (see `iter_export`), inserting
+        them in batches as they are read. Raises ValueError on an unknown
+        entry type, a missing header, or counts that disagree with the
+        footer (a truncated export raises after restoring what it holds).
+        Returns the number of records restored per table.
+        """
+        tables = (self.users, self.documents, self.login_history)
+        counts = {table: 0 for table in tables}
+        batch, batch_type = [], None
+        
+        def flush():
+            if not batch:
+                return
+            if batch_type == self.login_history:
+                self.logins.append_many(batch)
+            elif batch_type == self.documents:
+                metas, payloads = zip(*(split_document(doc) for doc in batch))
+                self.engine.insert_many(self.document_payloads, payloads)
+                self.engine.insert_many(self.documents, metas)
+            else:
+                self.engine.insert_many(batch_type, batch)
+            counts[batch_type] += len(batch)
+            batch.clear()
+        
+        entries = iter(entries)
+        header = next(entries, None)
+        if not header or header.get('type') != 'header':
+            raise ValueError('Missing export header')
+        if header.get('version') != EXPORT_VERSION:
+            raise ValueError(f"Unsupported export version: {header.get('version')}")
+        
+        footer = None
+        for entry in entries:
+            kind = entry['type']
+            if kind == 'footer':
+                footer = entry
+                break
+            if kind not in tables:
+                raise ValueError(f"Unknown export entry type: {kind}")
+            if kind != batch_type or len(batch) >= batch_size:
+                flush()
+                batch_type = kind
+            batch.append(entry['record'])
+        flush()
+        self.wait_for_commit()
+        
+        if footer is None:
+            raise ValueError(f"Export is truncated (no footer); restored {counts}")
+        expected = footer.get('counts', {})
+        if any(expected.get(t, 0) != counts[t] for t in tables):
+            raise ValueError(f"Export counts {expected} do not match restored {counts}")
+        return counts
+    
     def export_all(self) -> dict:
         """Export all data as a dictionary."""
         return {
-            'users': self.users.all(),
-            'documents': self.documents.all(),
-            'login_history': self.login_history.all(),
+            'users': self.engine.all(self.users),
+            'documents': self.engine.all(self.documents),
+            'login_history': list(self.logins.iter_records()),
             'exported_at': datetime.utcnow().isoformat() + 'Z'
         }
 
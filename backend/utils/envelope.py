@@ -0,0 +1,254 @@
+"""
+Inventa Envelope Encryption
+===========================
+Per-document data keys (DEKs) wrapped by master key-encryption keys (KEKs).
+
+Each document is encrypted with its own random AES-256 DEK (see
+`utils.crypto`). Instead of storing the DEK itself, the payload record
+stores it wrapped with the active KEK:
+
+    wrapped_key = base64(nonce || AES-256-GCM(KEK, DEK, aad=document_id:kek_id))
+    kek_id      = id of the KEK that wrapped it
+
+KEKs come from ENCRYPTION_KEKS ("id:base64key,..."); ENCRYPTION_ACTIVE_KEK
+picks the one new documents use (default: the first). Rotating the KEK
+means listing a new key first and rewrapping the DEKs, 60 bytes per
+document whatever the file size; the blobs are never touched. Old KEKs
+stay listed until `RewrapJob` has moved every document off them.
+
+Unwrapped DEKs are kept in a small LRU so repeated downloads (e.g. a
+media player's range requests) skip the unwrap. Without any KEK configured,
+DEKs are stored raw (`encryption_key`) as before; such records, and those
+written before envelope encryption, are wrapped by the rewrap job once a
+KEK is set.
+"""
+
+import os
+import time
+import base64
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+from config import get_config
+from utils.database import db, storage_path
+
+config = get_config()
+
+
+def parse_keks(spec: str) -> Dict[str, bytes]:
+    """Parse "id:base64key,id:base64key" into {id: 32-byte key}. Raises ValueError."""
+    keks = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        kek_id, sep, encoded = item.partition(':')
+        if not sep or not kek_id:
+            raise ValueError(f"KEK entries must look like id:base64key (got {item[:12]!r}...)")
+        key = base64.b64decode(encoded)
+        if len(key) != 32:
+            raise ValueError(f"KEK {kek_id!r} must be 32 bytes (AES-256)")
+        keks[kek_id] = key
+    return keks
+
+
+def generate_kek(kek_id: str) -> str:
+    """A new KEK entry for ENCRYPTION_KEKS."""
+    return f"{kek_id}:{base64.b64encode(os.urandom(32)).decode('utf-8')}"
+
+
+class KeyRing:
+    """Wraps and unwraps document DEKs with the configured KEKs."""
+
+    def __init__(self, keks: Dict[str, bytes], active: Optional[str] = None, cache_size: int = 256):
+        self.keks = dict(keks)
+        self.active = active or next(iter(self.keks), None)
+        if self.active is not None and self.active not in self.keks:
+            raise ValueError(f"Active KEK {self.active!r} is not in the KEK set")
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[tuple, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.active is not None
+
+    @staticmethod
+    def _aad(document_id: str, kek_id: str) -> bytes:
+        return f"{document_id}:{kek_id}".encode('utf-8')
+
+    def wrap(self, document_id: str, dek: bytes) -> dict:
+        """
+        Payload fields holding `dek`: wrapped with the active KEK, or the
+        raw key (base64) when no KEK is configured.
+        """
+        if not self.enabled:
+            return {'encryption_key': base64.b64encode(dek).decode('utf-8')}
+        nonce = os.urandom(12)
+        wrapped = AESGCM(self.keks[self.active]).encrypt(nonce, dek, self._aad(document_id, self.active))
+        return {
+            'wrapped_key': base64.b64encode(nonce + wrapped).decode('utf-8'),
+            'kek_id': self.active
+        }
+
+    def unwrap(self, document_id: str, payload: dict) -> bytes:
+        """Return a document's DEK from its payload. Raises ValueError if it can't."""
+        if 'wrapped_key' not in payload:
+            return base64.b64decode(payload['encryption_key'])
+
+        kek_id, wrapped = payload.get('kek_id'), payload['wrapped_key']
+        cache_key = (document_id, kek_id, wrapped)
+        with self._lock:
+            dek = self._cache.get(cache_key)
+            if dek is not None:
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+                return dek
+            self.misses += 1
+
+        kek = self.keks.get(kek_id)
+        if kek is None:
+            raise ValueError(f"Unknown KEK {kek_id!r}")
+        raw = base64.b64decode(wrapped)
+        try:
+            dek = AESGCM(kek).decrypt(raw[:12], raw[12:], self._aad(document_id, kek_id))
+        except Exception:
+            raise ValueError(f"Could not unwrap the key of {document_id}") from None
+
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache[cache_key] = dek
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return dek
+
+    def needs_rewrap(self, payload: dict) -> bool:
+        """True if a payload's DEK is raw or wrapped by a KEK other than the active one."""
+        if not self.enabled or not ('wrapped_key' in payload or 'encryption_key' in payload):
+            return False
+        return payload.get('kek_id') != self.active
+
+    def rewrap(self, document_id: str, payload: dict) -> dict:
+        """Payload fields re-wrapping the DEK with the active KEK."""
+        return self.wrap(document_id, self.unwrap(document_id, payload))
+
+    def stats(self) -> dict:
+        """Unwrap cache counters for this process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'activeKek': self.active,
+                'keks': len(self.keks),
+                'cached': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class RewrapJob:
+    """
+    Moves every document DEK to the active KEK, at most `rate` documents a
+    second (0 = unlimited) so it can run next to live traffic. Only one
+    process runs it at a time (flock on `lock_path`).
+    """
+
+    def __init__(self, database, key_ring: KeyRing, rate: float, lock_path: str):
+        self.db = database
+        self.key_ring = key_ring
+        self.rate = rate
+        self.lock_path = lock_path
+        self._thread = None
+
+    def pending(self) -> List[str]:
+        """Ids of the documents whose DEK needs rewrapping."""
+        return [p['id'] for p in self.db.iter_document_payloads() if self.key_ring.needs_rewrap(p)]
+
+    def run(self, limit: Optional[int] = None, rate: Optional[float] = None) -> Dict[str, int]:
+        """
+        Rewrap up to `limit` pending DEKs. Returns counts of rewrapped,
+        failed and (with `limit`) remaining documents; raises RuntimeError
+        if another process is already running the job.
+        """
+        rate = self.rate if rate is None else rate
+        with open(self.lock_path, 'a+b') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise RuntimeError('A rewrap job is already running') from None
+            return self._rewrap(self.pending(), limit, rate)
+
+    def _rewrap(self, doc_ids: List[str], limit: Optional[int], rate: float) -> Dict[str, int]:
+        todo = doc_ids if limit is None else doc_ids[:limit]
+        rewrapped = failed = 0
+        interval = 1.0 / rate if rate > 0 else 0.0
+        next_at = time.monotonic()
+        for doc_id in todo:
+            if interval:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at = max(next_at, time.monotonic()) + interval
+            # Re-read: the payload may have changed since it was listed
+            payload = self.db.get_document_payload(doc_id)
+            if not payload or not self.key_ring.needs_rewrap(payload):
+                continue
+            try:
+                fields = self.key_ring.rewrap(doc_id, payload)
+            except (ValueError, KeyError) as e:
+                print(f"⚠️  Rewrap failed for {doc_id}: {e}")
+                failed += 1
+                continue
+            self.db.update_document(doc_id, fields, unset=('encryption_key',))
+            rewrapped += 1
+        if rewrapped:
+            self.db.wait_for_commit()
+        return {'rewrapped': rewrapped, 'failed': failed, 'remaining': len(doc_ids) - len(todo)}
+
+    def start(self):
+        """Run the job once on a background thread, if a KEK is configured."""
+        if not self.key_ring.enabled:
+            print("⚠️  ENCRYPTION_KEKS is not set: document keys are stored unwrapped")
+            return
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run_background, name='dek-rewrap', daemon=True)
+        self._thread.start()
+
+    def _run_background(self):
+        try:
+            result = self.run()
+        except RuntimeError:
+            return  # another worker has it
+        except Exception as e:
+            print(f"⚠️  Rewrap job error: {e}")
+            return
+        if result['rewrapped'] or result['failed']:
+            print(f"✅ Rewrapped {result['rewrapped']} document keys with KEK "
+                  f"{self.key_ring.active!r} ({result['failed']} failed)")
+
+
+# Create the global key ring and rewrap job
+key_ring = KeyRing(
+    parse_keks(config.ENCRYPTION_KEKS),
+    config.ENCRYPTION_ACTIVE_KEK or None,
+    config.DEK_CACHE_SIZE
+)
+rewrap_job = RewrapJob(
+    db,
+    key_ring,
+    config.REWRAP_RATE,
+    storage_path(config.STORAGE_ENGINE) + '.rewrap.lock'
+)
@@ -0,0 +1,69 @@
+"""
+Inventa Export Streams
+======================
+NDJSON encoding for streaming database exports and restores.
+
+An export is one JSON object per line:
+
+    {"type":"header","version":1,"exported_at":"...","redacted":true}
+    {"type":"users","record":{...}}
+    {"type":"documents","record":{...}}
+    {"type":"login_history","record":{...}}
+    {"type":"footer","counts":{"users":2,"documents":5,"login_history":9}}
+
+The footer lets a restore detect a truncated file. Streams are produced
+and consumed record by record, optionally gzip-compressed on the fly, so
+memory use stays flat whatever the database size.
+"""
+
+import gzip
+import json
+import zlib
+from typing import BinaryIO, Iterable, Iterator
+
+EXPORT_VERSION = 1
+_CHUNK_SIZE = 64 * 1024
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+def ndjson_chunks(entries: Iterable[dict], chunk_size: int = _CHUNK_SIZE) -> Iterator[bytes]:
+    """Encode entries as NDJSON, yielding ~chunk_size byte chunks."""
+    buffer, size = [], 0
+    for entry in entries:
+        line = (json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8')
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a byte stream on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def read_ndjson(f: BinaryIO) -> Iterator[dict]:
+    """
+    Yield entries from a buffered binary NDJSON stream, gunzipping it if
+    it is compressed. Raises ValueError on a malformed line.
+    """
+    if f.peek(2)[:2] == _GZIP_MAGIC:
+        f = gzip.GzipFile(fileobj=f)
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {number}: invalid JSON ({e})") from e
+        if not isinstance(entry, dict) or 'type' not in entry:
+            raise ValueError(f"Line {number}: not an export entry")
+        yield entry
@@ -0,0 +1,133 @@
+"""
+Inventa In-Memory Indexes
+=========================
+Secondary indexes used by storage engines that have no native indexing
+(TinyDB):
+
+- HashIndex maps a field value to the record ids that carry it, so
+  equality lookups are O(1) instead of a full table scan.
+- SortedIndex keeps records ordered by (field, tiebreak), optionally per
+  group, so keyset pagination reads only the requested page.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+class HashIndex:
+    """
+    Maps field values to record ids.
+    Ids are kept in insertion order so lookups return records in the same
+    order a table scan would.
+    """
+
+    def __init__(self, field: str, nocase: bool = False):
+        self.field = field
+        self.nocase = nocase
+        self._map: Dict[Hashable, Dict[int, None]] = {}
+
+    def key(self, value: Any) -> Optional[Hashable]:
+        """Normalize a field value into an index key (None = not indexable)."""
+        if value is None:
+            return None
+        if self.nocase and isinstance(value, str):
+            return value.lower()
+        try:
+            hash(value)
+        except TypeError:
+            return None
+        return value
+
+    def add(self, record: dict, record_id: int):
+        key = self.key(record.get(self.field))
+        if key is not None:
+            self._map.setdefault(key, {})[record_id] = None
+
+    def discard(self, record: dict, record_id: int):
+        key = self.key(record.get(self.field))
+        ids = self._map.get(key)
+        if ids is not None:
+            ids.pop(record_id, None)
+            if not ids:
+                del self._map[key]
+
+    def lookup(self, value: Any) -> List[int]:
+        """Return the ids of records whose field equals `value`."""
+        ids = self._map.get(self.key(value))
+        return list(ids) if ids else []
+
+    def first(self, value: Any) -> Optional[int]:
+        ids = self._map.get(self.key(value))
+        return next(iter(ids)) if ids else None
+
+    def clear(self):
+        self._map.clear()
+
+    def __len__(self):
+        return len(self._map)
+
+
+class SortedIndex:
+    """
+    Keeps record ids sorted by (field value, tiebreak value), e.g.
+    (timestamp, id). With `group` set, one ordering is kept per value of
+    that field (e.g. per user_id). Records missing any of these fields are
+    not indexed.
+
+    Inserts cost O(log n) to locate plus a list insert; fetching a page
+    after a cursor costs O(log n + page size).
+    """
+
+    def __init__(self, field: str, group: Optional[str] = None, tiebreak: str = 'id'):
+        self.field = field
+        self.group = group
+        self.tiebreak = tiebreak
+        self._groups: Dict[Hashable, List[Tuple[Any, Any, int]]] = {}
+
+    def _entry(self, record: dict, record_id: int) -> Optional[Tuple[Hashable, Tuple[Any, Any, int]]]:
+        value, tiebreak = record.get(self.field), record.get(self.tiebreak)
+        if value is None or tiebreak is None:
+            return None
+        group = record.get(self.group) if self.group else None
+        if self.group and group is None:
+            return None
+        return group, (value, tiebreak, record_id)
+
+    def add(self, record: dict, record_id: int):
+        entry = self._entry(record, record_id)
+        if entry is not None:
+            insort(self._groups.setdefault(entry[0], []), entry[1])
+
+    def discard(self, record: dict, record_id: int):
+        entry = self._entry(record, record_id)
+        if entry is None:
+            return
+        keys = self._groups.get(entry[0])
+        if not keys:
+            return
+        i = bisect_left(keys, entry[1])
+        if i < len(keys) and keys[i] == entry[1]:
+            del keys[i]
+            if not keys:
+                del self._groups[entry[0]]
+
+    def page(self, limit: int, after: Optional[Sequence] = None,
+             descending: bool = False, group: Any = None) -> List[int]:
+        """
+        Return up to `limit` record ids in order, starting just past the
+        (value, tiebreak) key `after`.
+        """
+        keys = self._groups.get(group, [])
+        if descending:
+            end = len(keys) if after is None else bisect_left(keys, (after[0], after[1]))
+            start = max(0, end - limit)
+            return [k[2] for k in reversed(keys[start:end])]
+        # Record ids are positive ints, so (value, tiebreak, inf) sorts after every real entry
+        start = 0 if after is None else bisect_right(keys, (after[0], after[1], float('inf')))
+        return [k[2] for k in keys[start:start + limit]]
+
+    def clear(self):
+        self._groups.clear()
+
+    def __len__(self):
+        return sum(len(keys) for keys in self._groups.values())
@@ -0,0 +1,219 @@
+"""
+Inventa Write Journal
+=====================
+Group-commit write-ahead journal and shared change log for the TinyDB
+engine.
+
+Every database write is appended to the journal as one JSON line, in a
+single write() so other processes can tail the file and apply the change
+without re-reading the database. A background thread batches the fsync()
+calls: while other writers are on their way (`writing()`), it holds the
+batch open for a short window (or until a batch size is reached) so their
+writes become durable together; a lone write is synced at once, like
+PostgreSQL's commit_delay with commit_siblings. Callers receive a
+CommitTicket they can wait on when they need confirmation before
+responding.
+
+The first line of every journal file is a header recording the sequence
+number of the checkpoint it continues from:
+
+    {"op":"base","seq":1200}
+    {"op":"insert","table":"documents","records":[...],"seq":1201}
+
+At a checkpoint the database file is rewritten and the journal is replaced
+by a fresh file (new inode) holding a header plus any operations appended
+after the state the checkpoint captured.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import BinaryIO, List, Optional, Tuple
+
+
+class CommitTicket:
+    """Handle for one journaled write; `wait()` blocks until it is durable."""
+
+    def __init__(self, seq: int):
+        self.seq = seq
+        self.error: Optional[BaseException] = None
+        self._event = threading.Event()
+
+    def _resolve(self, error: Optional[BaseException] = None):
+        self.error = error
+        self._event.set()
+
+    @property
+    def done(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the write is durable. Returns False on timeout or failure."""
+        return self._event.wait(timeout) and self.error is None
+
+
+def encode_op(op: dict) -> bytes:
+    return (json.dumps(op, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def read_ops(f: BinaryIO, offset: int = 0) -> Tuple[List[dict], int]:
+    """
+    Read complete operation lines from an open journal file, starting at
+    `offset`. Returns (ops, offset just past the last complete line). A
+    partial line at the end (a write in progress, or torn by a crash) is
+    left unread.
+    """
+    ops = []
+    f.seek(offset)
+    data = f.read()
+    end = data.rfind(b'\n') + 1
+    for line in data[:end].splitlines():
+        try:
+            ops.append(json.loads(line))
+        except ValueError:
+            break
+    return ops, offset + end
+
+
+class GroupCommitJournal:
+    """Append-only operation journal with batched (group) fsync."""
+
+    def __init__(self, path: str, window: float = 0.005, max_ops: int = 64):
+        """
+        Args:
+            path: Journal file path.
+            window: Seconds to wait for writers in progress before syncing a batch.
+            max_ops: Sync immediately once this many writes are pending.
+        """
+        self.path = path
+        self.window = window
+        self.max_ops = max_ops
+
+        self._cond = threading.Condition()
+        self._pending: List[CommitTicket] = []
+        self._inflight: List[CommitTicket] = []
+        self._writers = 0
+        self._closed = False
+        self._handle = None
+        self.inode = None
+
+        self.reopen()
+        self._thread = threading.Thread(target=self._run, name='journal-commit', daemon=True)
+        self._thread.start()
+
+    def reopen(self):
+        """(Re)open the file currently at `path`, e.g. after a checkpoint swapped it."""
+        with self._cond:
+            if self._handle is not None:
+                self._flush_pending()
+                self._handle.close()
+            self._handle = open(self.path, 'ab', buffering=0)
+            self.inode = os.fstat(self._handle.fileno()).st_ino
+
+    @staticmethod
+    def create(path: str, base_seq: int, tail: bytes = b''):
+        """
+        Atomically replace `path` with a journal continuing from `base_seq`,
+        optionally followed by already-encoded operation lines (`tail`).
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(encode_op({'op': 'base', 'seq': base_seq}) + tail)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # ==================== WRITES ====================
+
+    @contextmanager
+    def writing(self):
+        """
+        Mark a write in progress, from before its caller queues for locks
+        until it has appended, so the flush thread waits for it to join the
+        current batch instead of syncing without it.
+        """
+        with self._cond:
+            self._writers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writers -= 1
+                if not self._writers:
+                    self._cond.notify_all()
+
+    def append(self, op: dict) -> Tuple[CommitTicket, int]:
+        """
+        Write one operation (which must carry its `seq`) to the journal.
+        The line is visible to other processes immediately; durability
+        follows with the next group fsync. Returns (ticket, bytes written).
+        """
+        line = encode_op(op)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Journal is closed')
+            self._handle.write(line)
+            ticket = CommitTicket(op['seq'])
+            self._pending.append(ticket)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_ops:
+                self._cond.notify_all()
+        return ticket, len(line)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                # Give writers in progress a chance to join this batch; with
+                # none on the way there is nothing to wait for
+                deadline = time.monotonic() + self.window
+                while self._writers and len(self._pending) < self.max_ops and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._pending:
+                    continue  # flushed by sync()/reopen() meanwhile
+                batch, self._pending = self._pending, []
+                self._inflight = batch
+                fileno = self._handle.fileno()
+            self._commit(fileno, batch)
+            with self._cond:
+                self._inflight = []
+                self._cond.notify_all()
+
+    @staticmethod
+    def _commit(fileno: int, batch: List[CommitTicket]):
+        error = None
+        try:
+            os.fsync(fileno)
+        except BaseException as e:  # surface I/O errors to every waiter
+            error = e
+            print(f"Journal commit error: {e}")
+        for ticket in batch:
+            ticket._resolve(error)
+
+    def _flush_pending(self):
+        """fsync and resolve pending tickets now (caller holds the condition)."""
+        while self._inflight:
+            self._cond.wait()
+        if self._pending:
+            batch, self._pending = self._pending, []
+            self._commit(self._handle.fileno(), batch)
+
+    def sync(self):
+        """Block until everything appended so far is durable."""
+        with self._cond:
+            self._flush_pending()
+
+    def close(self):
+        with self._cond:
+            self._flush_pending()
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._handle.close()
@@ -0,0 +1,139 @@
+"""
+Inventa Key Cache
+=================
+Bounded LRU cache of parsed ECC key objects.
+
+Loading a PEM key (base64 decoding, DER parsing, building the key
+object) costs several times more than the ECDSA P-256 sign or verify it
+is loaded for. `sign_document` and `verify_signature` therefore fetch keys
+from this cache, keyed by (user id, kind, fingerprint), where the
+fingerprint is the SHA-256 of the PEM. A user whose keys change gets new
+fingerprints, so stale entries are never served, even by a worker that
+did not see the change; `invalidate(user_id)` just frees them early.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.backends import default_backend
+
+from config import get_config
+
+config = get_config()
+
+PRIVATE = 'private'
+PUBLIC = 'public'
+
+
+def fingerprint(pem: str) -> str:
+    """SHA-256 of a PEM-encoded key."""
+    return hashlib.sha256(pem.encode('utf-8')).hexdigest()
+
+
+def _load_private(pem: str):
+    return serialization.load_pem_private_key(pem.encode('utf-8'), password=None, backend=default_backend())
+
+
+def _load_public(pem: str):
+    return serialization.load_pem_public_key(pem.encode('utf-8'), backend=default_backend())
+
+
+_LOADERS: Dict[str, Callable[[str], object]] = {PRIVATE: _load_private, PUBLIC: _load_public}
+
+
+class KeyCache:
+    """Thread-safe LRU of loaded keys; `maxsize=0` disables caching."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple[Optional[str], str, str], object]' = OrderedDict()
+        self._by_user: Dict[str, Set[Tuple[Optional[str], str, str]]] = {}
+        self.hits = self.misses = self.evictions = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, pem: str, user_id: Optional[str] = None):
+        """
+        Return the loaded `kind` (PRIVATE or PUBLIC) key for `pem`, parsing
+        it on a miss. Raises like the cryptography loaders on a bad key.
+        """
+        key = (user_id, kind, fingerprint(pem))
+        with self._lock:
+            loaded = self._entries.get(key)
+            if loaded is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return loaded
+            self.misses += 1
+
+        # Parse outside the lock; a concurrent miss on the same key just
+        # loads it twice
+        loaded = _LOADERS[kind](pem)
+        if self.maxsize <= 0:
+            return loaded
+
+        with self._lock:
+            self._entries[key] = loaded
+            self._entries.move_to_end(key)
+            if user_id is not None:
+                self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                old, _ = self._entries.popitem(last=False)
+                self._discard_user_key(old)
+                self.evictions += 1
+        return loaded
+
+    def private_key(self, pem: str, user_id: Optional[str] = None):
+        return self.get(PRIVATE, pem, user_id)
+
+    def public_key(self, pem: str, user_id: Optional[str] = None):
+        return self.get(PUBLIC, pem, user_id)
+
+    def _discard_user_key(self, key):
+        user_id = key[0]
+        if user_id is None:
+            return
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+    def invalidate(self, user_id: str) -> int:
+        """Drop every cached key of a user; returns how many were dropped."""
+        with self._lock:
+            keys = self._by_user.pop(user_id, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Create a global key cache instance
+key_cache = KeyCache(config.KEY_CACHE_SIZE)
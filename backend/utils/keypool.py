@@ -0,0 +1,105 @@
+"""
+Inventa Key Pair Pool
+=====================
+Pre-generated ECC key pairs for `register`.
+
+Generating a P-256 key pair and serializing it to PKCS8/SPKI PEM is the
+most expensive step of a registration. A background thread keeps a stock
+of ready pairs instead: once a `take()` leaves fewer than `low` pairs it
+refills up to `high`, so a burst of registrations only pops from a deque.
+If the pool runs dry, `take()` generates a pair inline as before.
+
+Every pair is handed out at most once: `deque.popleft()` is atomic, and a
+forked worker (gunicorn --preload) drops the pairs it inherited from the
+parent, which the parent or its other children could also hand out, and
+starts its own refill thread.
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Callable, Tuple
+
+from config import get_config
+from utils.crypto import generate_ecc_keypair
+
+config = get_config()
+
+
+class KeyPairPool:
+    """Background-refilled stock of (private_pem, public_pem) pairs; `high=0` disables it."""
+
+    def __init__(self, low: int, high: int,
+                 generate: Callable[[], Tuple[str, str]] = generate_ecc_keypair):
+        self.high = max(high, 0)
+        self.low = min(max(low, 1), self.high) if self.high else 0
+        self._generate = generate
+        self._pairs = deque()
+        self._wanted = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.hits = self.misses = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """Discard pairs shared with the parent; refill if the parent was."""
+        was_running = self._thread is not None
+        self._pairs = deque()
+        self._wanted = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        if was_running:
+            self.start()
+
+    def start(self):
+        """Start the refill thread (idempotent)."""
+        if self.high <= 0 or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._refill, name='keypair-pool', daemon=True)
+                self._thread.start()
+
+    def _refill(self):
+        while True:
+            # Cleared before filling, so a take() during the fill is not lost
+            self._wanted.clear()
+            while len(self._pairs) < self.high:
+                try:
+                    self._pairs.append(self._generate())
+                except Exception as e:
+                    print(f"⚠️  Key pair pool refill failed: {e}")
+                    break
+            self._wanted.wait()
+
+    def take(self) -> Tuple[str, str]:
+        """Return a fresh (private_pem, public_pem) pair, never handed out before."""
+        self.start()
+        try:
+            pair = self._pairs.popleft()
+        except IndexError:
+            pair = None
+        if len(self._pairs) < self.low:
+            self._wanted.set()
+
+        with self._lock:
+            if pair is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return pair if pair is not None else self._generate()
+
+    def stats(self) -> dict:
+        """Pool level and how many takes it served (hits) or missed, in this process."""
+        return {
+            'available': len(self._pairs),
+            'low': self.low,
+            'high': self.high,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+# Create a global key pair pool
+keypair_pool = KeyPairPool(config.KEYPAIR_POOL_LOW, config.KEYPAIR_POOL_HIGH)
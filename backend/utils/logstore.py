@@ -0,0 +1,363 @@
+"""
+Inventa Log Store
+=================
+Append-only JSONL segment store for write-heavy, append-only data
+(login history).
+
+Records are appended as one JSON line to the active segment file:
+
+    data/login_history/00000001-1700000000.jsonl
+    data/login_history/00000002-1700086400.jsonl
+
+The active segment is rotated once it exceeds a size or age limit.
+Appends are O(1) and never rewrite existing data; reads walk segments
+newest-first, reading each file backwards in blocks, so "most recent N"
+queries never load the whole history. A record's (segment, offset)
+position serves as a stable pagination cursor.
+
+Fields listed in `index_fields` (e.g. user_id) get a time-ordered
+position index: for each value, the positions of its records in append
+order. It is built by tailing the segments incrementally (bytes appended
+by any process are parsed once), so "most recent N for this user" reads
+just N lines. The same pass feeds `observers` (running aggregates such as
+`utils.counters.LoginCounters`) every new record.
+
+Several processes may append to the same log: each line is a single
+O_APPEND write, and rotation is coordinated with an flock so every
+process moves on to the same new segment.
+"""
+
+import os
+import json
+import time
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_BLOCK_SIZE = 64 * 1024
+_SUFFIX = '.jsonl'
+_OFFSET_BITS = 40  # packed position: segment seq << 40 | byte offset
+
+
+def _pack(position: Tuple[int, int]) -> int:
+    return (position[0] << _OFFSET_BITS) | position[1]
+
+
+def _unpack(packed: int) -> Tuple[int, int]:
+    return packed >> _OFFSET_BITS, packed & ((1 << _OFFSET_BITS) - 1)
+
+
+class SegmentedLog:
+    """Append-only JSON-lines log split into rotating segment files."""
+
+    def __init__(self, directory: str, max_segment_bytes: int = 8 * 1024 * 1024,
+                 max_segment_age: int = 24 * 3600, fsync_every: int = 1,
+                 index_fields: Iterable[str] = (), observers: Iterable = ()):
+        """
+        Args:
+            directory: Folder holding the segment files.
+            max_segment_bytes: Rotate once the active segment reaches this size.
+            max_segment_age: Rotate once the active segment is this many seconds old.
+            fsync_every: fsync after this many appends (0 = leave it to the OS).
+            index_fields: Record fields to keep a per-value position index for.
+            observers: Objects with add(record) and reset(), fed every record once.
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.fsync_every = fsync_every
+        self.index_fields = tuple(index_fields)
+        self.observers = tuple(observers)
+
+        self._lock = threading.Lock()
+        self._handle = None
+        self._active: Optional[Tuple[int, int]] = None  # (seq, created_at)
+        self._unsynced = 0
+
+        # Tail-scan state, guarded by _index_lock
+        self._index_lock = threading.Lock()
+        self._scanned: Dict[str, Tuple[int, int]] = {}  # path -> (bytes scanned, records)
+        self._paths: Dict[int, str] = {}  # segment seq -> path
+        self._positions: Dict[str, Dict[Hashable, array]] = {f: {} for f in self.index_fields}
+
+        os.makedirs(directory, exist_ok=True)
+
+    # ==================== SEGMENTS ====================
+
+    def segments(self) -> List[str]:
+        """Segment paths, oldest first."""
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(_SUFFIX))
+        return [os.path.join(self.directory, n) for n in names]
+
+    @staticmethod
+    def _parse_name(path: str) -> Tuple[int, int]:
+        seq, created = os.path.basename(path)[:-len(_SUFFIX)].split('-')
+        return int(seq), int(created)
+
+    def _segment_path(self, seq: int, created: int) -> str:
+        return os.path.join(self.directory, f"{seq:08d}-{created}{_SUFFIX}")
+
+    def _open_active(self):
+        """Open (or create) the newest segment for appending."""
+        segments = self.segments()
+        if segments:
+            seq, created = self._parse_name(segments[-1])
+        else:
+            seq, created = 1, int(time.time())
+        self._active = (seq, created)
+        self._handle = open(self._segment_path(seq, created), 'ab', buffering=0)
+
+    def _should_rotate(self) -> bool:
+        seq, created = self._active
+        if self.max_segment_age and time.time() - created >= self.max_segment_age:
+            return True
+        return self._handle.tell() >= self.max_segment_bytes
+
+    def _rotate(self):
+        self._sync()
+        self._handle.close()
+        with open(os.path.join(self.directory, '.lock'), 'a+b') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            newest = self.segments()[-1]
+            if self._parse_name(newest)[0] > self._active[0]:
+                # Another process already rotated; join its segment
+                self._active = self._parse_name(newest)
+            else:
+                self._active = (self._active[0] + 1, int(time.time()))
+            self._handle = open(self._segment_path(*self._active), 'ab', buffering=0)
+
+    def _sync(self):
+        if self._handle is not None and self._unsynced:
+            os.fsync(self._handle.fileno())
+            self._unsynced = 0
+
+    # ==================== WRITES ====================
+
+    def append(self, record: dict) -> dict:
+        """Append one record. O(1); fsync is batched per `fsync_every`."""
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._lock:
+            if self._handle is None:
+                self._open_active()
+            elif self._handle.tell() and self._should_rotate():
+                self._rotate()
+            # One unbuffered write per line keeps appends atomic
+            self._handle.write(line)
+            self._unsynced += 1
+            if self.fsync_every and self._unsynced >= self.fsync_every:
+                self._sync()
+        return record
+
+    def append_many(self, records: Iterable[dict]) -> int:
+        """Append records in order with one fsync at the end (bulk loads)."""
+        n = 0
+        with self._lock:
+            for record in records:
+                line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+                if self._handle is None:
+                    self._open_active()
+                elif self._handle.tell() and self._should_rotate():
+                    self._rotate()
+                self._handle.write(line)
+                self._unsynced += 1
+                n += 1
+            self._sync()
+        return n
+
+    def flush(self):
+        """Force buffered appends to stable storage."""
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._handle is not None:
+                self._sync()
+                self._handle.close()
+                self._handle = None
+
+    def clear(self):
+        """Delete every segment."""
+        self.close()
+        with self._lock:
+            for path in self.segments():
+                os.remove(path)
+        with self._index_lock:
+            self._reset_index()
+
+    # ==================== READS ====================
+
+    @staticmethod
+    def _read_backwards(path: str, end: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+        """
+        Yield (offset, line) for the lines of a file from last to first,
+        block by block. With `end`, only lines starting before it are read.
+        """
+        with open(path, 'rb') as f:
+            pos = f.seek(0, os.SEEK_END) if end is None else end
+            tail = b''
+            while pos > 0:
+                step = min(_BLOCK_SIZE, pos)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + tail  # bytes [pos, pos + len(buf))
+                stop = len(buf)
+                while True:
+                    nl = buf.rfind(b'\n', 0, stop)
+                    if nl < 0:
+                        break
+                    if stop > nl + 1:
+                        yield pos + nl + 1, buf[nl + 1:stop]
+                    stop = nl
+                tail = buf[:stop]
+            if tail:
+                yield 0, tail
+
+    def _iter_positions(self, before: Optional[Tuple[int, int]] = None) -> Iterator[Tuple[Tuple[int, int], dict]]:
+        """
+        Yield ((segment seq, offset), record) newest first. With `before`,
+        start just before that position.
+        """
+        for path in reversed(self.segments()):
+            seq, _ = self._parse_name(path)
+            end = None
+            if before is not None:
+                if seq > before[0]:
+                    continue
+                if seq == before[0]:
+                    end = before[1]
+            for offset, line in self._read_backwards(path, end):
+                try:
+                    yield (seq, offset), json.loads(line)
+                except ValueError:
+                    continue  # torn trailing write
+
+    def iter_newest_first(self) -> Iterator[dict]:
+        """Yield records from newest to oldest, lazily."""
+        for _, record in self._iter_positions():
+            yield record
+
+    def page_newest_first(self, limit: int, before: Optional[Tuple[int, int]] = None
+                          ) -> Tuple[List[dict], Optional[Tuple[int, int]]]:
+        """
+        Return up to `limit` records, newest first, starting just before the
+        position `before`, plus the position to continue from (None when
+        there is nothing older). Reads only the lines returned.
+        """
+        records, last = [], None
+        for position, record in self._iter_positions(before):
+            if len(records) == limit:
+                return records, last
+            records.append(record)
+            last = position
+        return records, None
+
+    def iter_records(self) -> Iterator[dict]:
+        """Yield records from oldest to newest, lazily."""
+        for path in self.segments():
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    # ==================== POSITION INDEX ====================
+
+    def _reset_index(self):
+        self._scanned.clear()
+        self._paths.clear()
+        self._positions = {f: {} for f in self.index_fields}
+        for observer in self.observers:
+            observer.reset()
+
+    def _scan(self):
+        """Index records appended since the last scan (caller holds _index_lock)."""
+        segments = self.segments()
+        present = set(segments)
+        if any(path not in present for path in self._scanned):
+            self._reset_index()  # segments were removed; start over
+        for path in segments:
+            seq, _ = self._parse_name(path)
+            self._paths[seq] = path
+            size = os.path.getsize(path)
+            pos, records = self._scanned.get(path, (0, 0))
+            if size <= pos:
+                continue
+            with open(path, 'rb') as f:
+                f.seek(pos)
+                for line in f:
+                    if not line.endswith(b'\n') or pos + len(line) > size:
+                        break  # write in progress
+                    if line.strip():
+                        records += 1
+                        if self.index_fields or self.observers:
+                            self._index_line(_pack((seq, pos)), line)
+                    pos += len(line)
+            self._scanned[path] = (pos, records)
+
+    def _index_line(self, packed: int, line: bytes):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return
+        for field, positions in self._positions.items():
+            value = record.get(field)
+            if isinstance(value, (str, int)):
+                positions.setdefault(value, array('q')).append(packed)
+        for observer in self.observers:
+            observer.add(record)
+
+    def refresh(self):
+        """Bring the position index and observers up to date with the segments."""
+        with self._index_lock:
+            self._scan()
+
+    def count(self) -> int:
+        """Number of records; only bytes appended since the last call are scanned."""
+        with self._index_lock:
+            self._scan()
+            return sum(records for _, records in self._scanned.values())
+
+    def newest_by(self, field: str, value: Hashable, limit: Optional[int] = None,
+                  before: Optional[Tuple[int, int]] = None
+                  ) -> Tuple[List[dict], Optional[Tuple[int, int]]]:
+        """
+        Records whose indexed `field` equals `value`, newest first: up to
+        `limit` of them (all if None), starting just before position
+        `before`. Returns (records, position to continue from or None).
+        Reads only the returned lines.
+        """
+        if field not in self._positions:
+            raise ValueError(f"Field is not indexed: {field}")
+        with self._index_lock:
+            self._scan()
+            positions = self._positions[field].get(value)
+            if not positions:
+                return [], None
+            end = len(positions) if before is None else bisect_left(positions, _pack(before))
+            start = 0 if limit is None else max(0, end - limit)
+            picked = positions[start:end]
+            paths = dict(self._paths)
+
+        records = []
+        handles = {}
+        try:
+            for packed in reversed(picked):
+                seq, offset = _unpack(packed)
+                f = handles.get(seq)
+                if f is None:
+                    f = handles[seq] = open(paths[seq], 'rb')
+                f.seek(offset)
+                records.append(json.loads(f.readline()))
+        finally:
+            for f in handles.values():
+                f.close()
+        return records, (_unpack(picked[0]) if start > 0 and picked else None)
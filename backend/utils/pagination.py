@@ -0,0 +1,81 @@
+"""
+Inventa Pagination Helpers
+==========================
+Opaque cursors and request parsing for keyset-paginated listings.
+
+A cursor encodes the sort key of the last item on a page (for example
+`[timestamp, id]`, or `[segment, offset]` for the login log) as URL-safe
+base64 JSON. The next page starts strictly after that key, so pages stay
+stable while new records are added.
+"""
+
+import json
+import base64
+from typing import Mapping, Optional, Tuple
+
+from config import get_config
+
+config = get_config()
+
+
+def encode_cursor(*key) -> str:
+    raw = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+# Cursor key layouts: (sort value, id) for table listings, (segment, offset)
+# for the login log
+TABLE_CURSOR = (str, str)
+LOG_CURSOR = (int, int)
+
+
+def decode_cursor(cursor: str, types: Tuple[type, ...] = TABLE_CURSOR) -> tuple:
+    """
+    Decode a cursor into its key, one part per entry of `types` (ints must
+    be non-negative). Raises ValueError if it is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(key, list) or len(key) != len(types):
+        raise ValueError('Invalid cursor')
+    for part, kind in zip(key, types):
+        if isinstance(part, bool) or not isinstance(part, kind) or (kind is int and part < 0):
+            raise ValueError('Invalid cursor')
+    return tuple(key)
+
+
+def page_args(args: Mapping, default_limit: Optional[int] = None,
+              cursor_types: Tuple[type, ...] = TABLE_CURSOR,
+              lenient: bool = False) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Read `?limit=&after=` from request args. Returns (limit, after); limit
+    is None when the client asked for neither (unpaginated listing) and is
+    clamped to `Config.MAX_PAGE_SIZE`. Raises ValueError on a bad limit or
+    a cursor that is malformed or not of the listing's `cursor_types`.
+
+    `lenient=True` keeps the behaviour of listings that took `limit` before
+    cursors existed: without `after`, a bad limit means the default.
+    """
+    after = args.get('after') or None
+    limit = args.get('limit')
+    if limit is None:
+        if after is None and default_limit is None:
+            return None, None
+        limit = default_limit or config.DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        limit = None
+        error = 'limit must be an integer'
+    else:
+        error = 'limit must be positive' if limit < 1 else None
+    if error:
+        if not lenient or after is not None:
+            raise ValueError(error)
+        limit = default_limit or config.DEFAULT_PAGE_SIZE
+    if after is not None:
+        decode_cursor(after, cursor_types)
+    return min(limit, config.MAX_PAGE_SIZE), after
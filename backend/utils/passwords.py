@@ -0,0 +1,200 @@
+"""
+Inventa Password Hashing
+========================
+Salted, memory-hard password hashes with versioned hash strings:
+
+    $scrypt$ln=15,r=8,p=1$<salt>$<hash>             hashlib.scrypt (default)
+    $argon2id$v=19$m=65536,t=3,p=1$<salt>$<hash>   argon2-cffi, if installed
+
+Accounts created before this module have an unsalted SHA-256 hex digest.
+Those still verify, and `needs_rehash` flags them (and hashes made with
+other settings) so `login` can replace them with the current scheme while
+it has the password.
+
+Each hash takes tens of milliseconds and tens of megabytes (128 * r * 2^ln
+bytes for scrypt, memory_cost KiB for Argon2), so hashing runs on a small
+thread pool (`workers` at a time; both KDFs release the GIL) with at most
+`queue` requests waiting. Beyond that `HashingBusyError` is raised and the route
+answers 503 rather than piling up requests and memory during a burst.
+"""
+
+import os
+import hmac
+import base64
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from config import get_config
+
+try:
+    import argon2
+    from argon2.exceptions import InvalidHashError, VerificationError
+except ImportError:  # optional: PASSWORD_SCHEME=argon2id needs argon2-cffi
+    argon2 = None
+
+config = get_config()
+
+SCHEMES = ('scrypt', 'argon2id')
+_SALT_SIZE = 16
+_SCRYPT_DKLEN = 32
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing pool and its queue are full."""
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _is_legacy(stored: str) -> bool:
+    """Unsalted SHA-256 hex digest, as stored before versioned hashes."""
+    return len(stored) == 64 and all(c in '0123456789abcdef' for c in stored)
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded pool of `workers` threads."""
+
+    def __init__(self, scheme: str = 'scrypt', scrypt_log_n: int = 15, scrypt_r: int = 8,
+                 scrypt_p: int = 1, argon2_time_cost: int = 3, argon2_memory_cost: int = 65536,
+                 argon2_parallelism: int = 1, workers: int = 2, queue: int = 16):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown password scheme {scheme!r} (expected one of {SCHEMES})")
+        if scheme == 'argon2id' and argon2 is None:
+            print("⚠️  PASSWORD_SCHEME=argon2id needs argon2-cffi; hashing with scrypt")
+            scheme = 'scrypt'
+        self.scheme = scheme
+        self.scrypt_params = {'ln': scrypt_log_n, 'r': scrypt_r, 'p': scrypt_p}
+        self._argon2 = argon2.PasswordHasher(
+            time_cost=argon2_time_cost,
+            memory_cost=argon2_memory_cost,
+            parallelism=argon2_parallelism,
+            type=argon2.Type.ID
+        ) if argon2 is not None else None
+        self.workers = max(workers, 1)
+        self.queue = max(queue, 0)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue)
+        self._lock = threading.Lock()
+        self.completed = self.rejected = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The parent's pool threads (and the slots they held) do not exist in the child
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue)
+        self._lock = threading.Lock()
+
+    # ---------- KDFs (run on the pool) ----------
+
+    def _scrypt(self, password: str, salt: bytes, ln: int, r: int, p: int) -> bytes:
+        n = 1 << ln
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                              maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=_SCRYPT_DKLEN)
+
+    def _hash(self, password: str) -> str:
+        if self.scheme == 'argon2id':
+            return self._argon2.hash(password)
+        salt = os.urandom(_SALT_SIZE)
+        params = self.scrypt_params
+        digest = self._scrypt(password, salt, params['ln'], params['r'], params['p'])
+        return f"$scrypt$ln={params['ln']},r={params['r']},p={params['p']}${_b64(salt)}${_b64(digest)}"
+
+    def _verify(self, password: str, stored: str) -> bool:
+        if stored.startswith('$scrypt$'):
+            try:
+                _, _, settings, salt, digest = stored.split('$')
+                params = dict(item.split('=') for item in settings.split(','))
+                expected = _unb64(digest)
+                computed = self._scrypt(password, _unb64(salt), int(params['ln']),
+                                        int(params['r']), int(params['p']))
+            except (ValueError, KeyError):
+                return False
+            return hmac.compare_digest(computed, expected)
+        if stored.startswith('$argon2'):
+            if self._argon2 is None:
+                print("⚠️  Found an Argon2 password hash but argon2-cffi is not installed")
+                return False
+            try:
+                return self._argon2.verify(stored, password)
+            except (VerificationError, InvalidHashError):
+                return False
+        return False
+
+    # ---------- bounded pool ----------
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusyError('Too many password hashes in progress')
+        try:
+            if self._executor is None:
+                with self._lock:
+                    if self._executor is None:
+                        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+            result = self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+        with self._lock:
+            self.completed += 1
+        return result
+
+    # ---------- public API ----------
+
+    def hash(self, password: str) -> str:
+        """Hash `password` with the current scheme. Raises HashingBusyError."""
+        return self._run(self._hash, password)
+
+    def verify(self, password: str, stored: Optional[str]) -> bool:
+        """Check `password` against a stored hash of any version. Raises HashingBusyError."""
+        if not stored:
+            return False
+        if _is_legacy(stored):
+            # Cheap enough to check inline; replaced on login (see needs_rehash)
+            legacy = hashlib.sha256(password.encode('utf-8')).hexdigest()
+            return hmac.compare_digest(legacy, stored)
+        return self._run(self._verify, password, stored)
+
+    def needs_rehash(self, stored: str) -> bool:
+        """True unless `stored` was made with the current scheme and settings."""
+        if self.scheme == 'argon2id':
+            if not stored.startswith('$argon2id$'):
+                return True
+            try:
+                return self._argon2.check_needs_rehash(stored)
+            except InvalidHashError:
+                return True
+        params = self.scrypt_params
+        return not stored.startswith(f"$scrypt$ln={params['ln']},r={params['r']},p={params['p']}$")
+
+    def stats(self) -> dict:
+        """Scheme, pool limits and how many hashes ran or were turned away in this process."""
+        return {
+            'scheme': self.scheme,
+            'workers': self.workers,
+            'queue': self.queue,
+            'completed': self.completed,
+            'rejected': self.rejected
+        }
+
+
+# Create the global password hasher
+password_hasher = PasswordHasher(
+    scheme=config.PASSWORD_SCHEME,
+    scrypt_log_n=config.PASSWORD_SCRYPT_LOG_N,
+    scrypt_r=config.PASSWORD_SCRYPT_R,
+    scrypt_p=config.PASSWORD_SCRYPT_P,
+    argon2_time_cost=config.PASSWORD_ARGON2_TIME_COST,
+    argon2_memory_cost=config.PASSWORD_ARGON2_MEMORY_COST,
+    argon2_parallelism=config.PASSWORD_ARGON2_PARALLELISM,
+    workers=config.PASSWORD_HASH_WORKERS,
+    queue=config.PASSWORD_HASH_QUEUE
+)
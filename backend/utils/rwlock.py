@@ -0,0 +1,106 @@
+"""
+Inventa Reader/Writer Lock
+==========================
+Shared/exclusive lock for in-process state read by many request threads
+(gunicorn `--threads`) and written by few.
+
+- Any number of threads may hold the read lock at once.
+- The write lock is exclusive; waiting writers block new readers, so a
+  steady stream of reads cannot starve writes.
+- Both sides are re-entrant: a thread already holding the read lock may
+  take it again even while a writer waits, and the writer may take either
+  lock again. Upgrading from read to write is not supported.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class RWLock:
+    """Writer-preferring reader/writer lock."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None  # ident of the thread holding the write lock
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def _read_depth(self) -> int:
+        return getattr(self._local, 'depth', 0)
+
+    # ==================== READ ====================
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writer_depth += 1
+            return
+        depth = self._read_depth()
+        if depth:
+            self._local.depth = depth + 1
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        self._local.depth = 1
+
+    def release_read(self):
+        if self._writer == threading.get_ident():
+            self._writer_depth -= 1
+            return
+        depth = self._read_depth() - 1
+        self._local.depth = depth
+        if depth:
+            return
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Hold the lock shared for the duration of the block."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    # ==================== WRITE ====================
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writer_depth += 1
+            return
+        if self._read_depth():
+            raise RuntimeError('Cannot upgrade a read lock to a write lock')
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the lock exclusively for the duration of the block."""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,106 @@
+"""
+Inventa Database File Formats
+=============================
+Encoders for the TinyDB database file, selected with
+`Config.DATABASE_FORMAT`:
+
+- json:    pretty-printed JSON (indent=2), the original format
+- compact: JSON without whitespace, encoded with orjson when it is
+           installed (falls back to the standard library)
+- binary:  length-prefixed records, each record a compact JSON payload
+
+Binary layout (integers are big-endian unsigned 32-bit):
+
+    b'INVDB\\x01\\n'                       magic and version
+    per table:  name length, name (UTF-8), record count
+    per record: document id, payload length, payload
+
+Readers detect the format from the first bytes, so a file in any format
+can be opened whatever DATABASE_FORMAT says; the engine rewrites it in the
+configured format at its next checkpoint.
+"""
+
+import json
+import struct
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # optional fast encoder
+    orjson = None
+
+MAGIC = b'INVDB\x01\n'
+FORMATS = ('json', 'compact', 'binary')
+
+_U32 = struct.Struct('>I')
+_RECORD = struct.Struct('>II')
+
+Data = Dict[str, Dict[str, Any]]
+
+
+def _compact(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _parse(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(bytes(raw))
+
+
+def detect_format(raw: bytes) -> str:
+    """Guess the format of an encoded database ('binary' or 'json')."""
+    return 'binary' if raw.startswith(MAGIC) else 'json'
+
+
+# ==================== ENCODE ====================
+
+def dumps(data: Data, fmt: str = 'json') -> bytes:
+    """Encode TinyDB's `{table: {doc_id: document}}` mapping."""
+    if fmt == 'json':
+        return json.dumps(data, indent=2).encode('utf-8')
+    if fmt == 'compact':
+        return _compact(data)
+    if fmt == 'binary':
+        parts = [MAGIC]
+        for table, docs in data.items():
+            name = table.encode('utf-8')
+            parts += [_U32.pack(len(name)), name, _U32.pack(len(docs))]
+            for doc_id, doc in docs.items():
+                payload = _compact(doc)
+                parts += [_RECORD.pack(int(doc_id), len(payload)), payload]
+        return b''.join(parts)
+    raise ValueError(f"Unknown database format: {fmt} (choose from {', '.join(FORMATS)})")
+
+
+# ==================== DECODE ====================
+
+def loads(raw: bytes) -> Data:
+    """Decode a database in any supported format."""
+    if detect_format(raw) == 'json':
+        return _parse(raw)
+
+    view = memoryview(raw)
+    pos = len(MAGIC)
+    data: Data = {}
+    try:
+        while pos < len(view):
+            (name_len,) = _U32.unpack_from(view, pos)
+            pos += _U32.size
+            table = bytes(view[pos:pos + name_len]).decode('utf-8')
+            pos += name_len
+            (count,) = _U32.unpack_from(view, pos)
+            pos += _U32.size
+            docs = data[table] = {}
+            for _ in range(count):
+                doc_id, size = _RECORD.unpack_from(view, pos)
+                pos += _RECORD.size
+                if pos + size > len(view):
+                    raise ValueError('record runs past end of file')
+                docs[str(doc_id)] = _parse(view[pos:pos + size])
+                pos += size
+    except struct.error as e:
+        raise ValueError(f"Truncated database file: {e}") from e
+    return data
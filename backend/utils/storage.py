@@ -0,0 +1,1295 @@
+"""
+Inventa Storage Engines
+=======================
+Pluggable storage backends used by the Database wrapper.
+
+Engines:
+- TinyDBEngine: the original single JSON file store, with in-memory
+  hash indexes on every indexed field
+- SQLiteEngine: SQLite in WAL mode with real column indexes
+
+Every engine exposes the same small table-level API (insert, get, search,
+update, remove, ...) so `utils.database.Database` can keep its method
+surface regardless of which backend is configured, plus maintenance
+operations: `compact()` (reclaim space taken by superseded data) and
+`snapshot()` / `restore_snapshot()` (point-in-time copies for hot backups
+and fast restarts).
+"""
+
+import os
+import re
+import json
+import atexit
+import sqlite3
+import tempfile
+import threading
+import weakref
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Sequence, Tuple
+
+from tinydb import TinyDB, Query
+from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import MemoryStorage, Storage
+
+from utils.indexes import HashIndex, SortedIndex
+from utils.journal import GroupCommitJournal, read_ops
+from utils.rwlock import RWLock
+from utils import serialization
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+_FIELD_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class DuplicateKeyError(Exception):
+    """Raised when a write would violate a unique index."""
+
+    def __init__(self, table: str, field: str, value: Any = None):
+        super().__init__(f"Duplicate value for {table}.{field}")
+        self.table = table
+        self.field = field
+        self.value = value
+
+
+class Index:
+    """
+    Declares an indexed field on a table.
+
+    `ordered=True` declares an ordered index on (field, id) instead of an
+    equality index, used by `StorageEngine.page()`; `group` keeps one such
+    ordering per value of another field (e.g. per user_id).
+    """
+
+    def __init__(self, field: str, nocase: bool = False, unique: bool = False,
+                 ordered: bool = False, group: Optional[str] = None):
+        for name in (field, group or field):
+            if not _FIELD_RE.match(name):
+                raise ValueError(f"Invalid index field: {name}")
+        self.field = field
+        self.nocase = nocase
+        self.unique = unique
+        self.ordered = ordered
+        self.group = group
+
+    @property
+    def key(self):
+        """Name the index is registered under within its table."""
+        return (self.field, self.group) if self.ordered else self.field
+
+    def __repr__(self):
+        if self.ordered:
+            return f"Index({self.field!r}, ordered=True, group={self.group!r})"
+        return f"Index({self.field!r}, nocase={self.nocase}, unique={self.unique})"
+
+
+# Schema type: table name -> indexed fields
+Schema = Dict[str, Tuple[Index, ...]]
+
+# Ordered indexes break ties on this field (every paged table has one)
+PAGE_TIEBREAK = 'id'
+
+# Projection: the record fields a read should return (None = whole records)
+Fields = Optional[Sequence[str]]
+
+
+def project(record: dict, fields: Fields) -> dict:
+    """Keep only `fields` of a record; fields it lacks come back as None."""
+    if fields is None:
+        return record
+    return {f: record.get(f) for f in fields}
+
+
+class StorageEngine:
+    """
+    Base class for storage engines.
+    Records are plain dicts; lookups are equality matches on a single field.
+    Fields declared with `Index(..., nocase=True)` match case-insensitively,
+    and writes that would duplicate an `Index(..., unique=True)` value raise
+    DuplicateKeyError without modifying anything.
+
+    Listing reads accept `fields` to return only those top-level fields of
+    each record (see `project`), so engines can skip decoding the rest.
+    """
+
+    name = 'base'
+
+    def __init__(self, schema: Schema):
+        self.schema = schema
+
+    def _nocase(self, table: str, field: str) -> bool:
+        return any(i.field == field and i.nocase for i in self.schema.get(table, ()))
+
+    def insert(self, table: str, record: dict) -> dict:
+        """Insert a record (atomically checked against unique indexes)."""
+        raise NotImplementedError
+
+    def get(self, table: str, field: str, value: Any) -> Optional[dict]:
+        """Return the first record whose `field` equals `value`."""
+        result = self.search(table, field, value)
+        return result[0] if result else None
+
+    def search(self, table: str, field: str, value: Any, fields: Fields = None) -> List[dict]:
+        raise NotImplementedError
+
+    def all(self, table: str, fields: Fields = None) -> List[dict]:
+        raise NotImplementedError
+
+    def iter_all(self, table: str, batch_size: int = 500) -> Iterator[dict]:
+        """
+        Yield every record in insertion order, fetching `batch_size` at a
+        time so callers can stream a table without materializing it.
+        """
+        yield from self.all(table)
+
+    def page(self, table: str, field: str, limit: int, after: Optional[Tuple[Any, Any]] = None,
+             descending: bool = False, where: Optional[Tuple[str, Any]] = None,
+             fields: Fields = None) -> List[dict]:
+        """
+        Keyset pagination: up to `limit` records ordered by (`field`, id),
+        starting just past the key `after`, optionally restricted to records
+        whose `where[0]` equals `where[1]`. Records without `field` or id are
+        skipped. Engines serve this from an `Index(field, ordered=True,
+        group=where[0])`; this fallback sorts the whole table.
+        """
+        records = self.search(table, *where) if where else self.all(table)
+        rows = sorted(
+            (r for r in records if r.get(field) is not None and r.get(PAGE_TIEBREAK) is not None),
+            key=lambda r: (r[field], r[PAGE_TIEBREAK]), reverse=descending
+        )
+        if after is not None:
+            after = tuple(after)
+            if descending:
+                rows = [r for r in rows if (r[field], r[PAGE_TIEBREAK]) < after]
+            else:
+                rows = [r for r in rows if (r[field], r[PAGE_TIEBREAK]) > after]
+        return [project(r, fields) for r in rows[:limit]]
+
+    def update(self, table: str, field: str, value: Any, data: dict, unset: Iterable[str] = ()) -> int:
+        """
+        Merge `data` into every matching record and drop the `unset` keys.
+        Returns the match count.
+        """
+        raise NotImplementedError
+
+    def remove(self, table: str, field: str, value: Any) -> int:
+        raise NotImplementedError
+
+    def count(self, table: str) -> int:
+        raise NotImplementedError
+
+    def truncate(self, table: str):
+        """Remove every record from a table."""
+        raise NotImplementedError
+
+    def insert_many(self, table: str, records: Iterable[dict]) -> int:
+        n = 0
+        for record in records:
+            self.insert(table, record)
+            n += 1
+        return n
+
+    def drop_all(self):
+        raise NotImplementedError
+
+    def wait_for_commit(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until this thread's writes are durable. Engines that persist
+        synchronously return True immediately.
+        """
+        return True
+
+    # ---------- maintenance ----------
+
+    def garbage_ratio(self) -> float:
+        """Fraction (0-1) of the on-disk size taken by superseded data."""
+        return 0.0
+
+    def compact(self, min_garbage: Optional[float] = None) -> bool:
+        """
+        Rewrite live data without the superseded parts, without blocking
+        readers. With `min_garbage`, only when `garbage_ratio()` reaches it.
+        Returns True if compaction ran.
+        """
+        raise NotImplementedError
+
+    def snapshot(self, dest: str):
+        """Write a consistent point-in-time copy of the database to `dest`."""
+        raise NotImplementedError
+
+    def restore_snapshot(self, source: str):
+        """Replace the whole database with a snapshot made by `snapshot()`."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# ==================== TINYDB ====================
+
+class AtomicFileStorage(Storage):
+    """
+    TinyDB storage that replaces the database file atomically on every
+    write (temp file + fsync + rename), so a crash never leaves a torn file.
+    Writes use `format` (see `utils.serialization`); reads accept any format.
+    """
+
+    def __init__(self, path: str, format: str = 'json'):
+        if format not in serialization.FORMATS:
+            raise ValueError(f"Unknown database format: {format}")
+        self.path = path
+        self.format = format
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        return serialization.loads(raw) if raw.strip() else None
+
+    def write(self, data: Dict[str, Dict[str, Any]]):
+        directory = os.path.dirname(self.path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(serialization.dumps(data, self.format))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class _DeferredCache(CachingMiddleware):
+    """Serve reads from memory; only write to disk on explicit flush()."""
+    WRITE_CACHE_SIZE = float('inf')
+
+
+class _ProcessLock:
+    """
+    Exclusive inter-process lock (flock on a lock file). Re-entrant within
+    a process; callers serialize threads with their own lock first.
+    A no-op where fcntl is unavailable (single-process use only).
+    """
+
+    def __init__(self, path: str):
+        self._handle = open(path, 'a+b')
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+
+    def close(self):
+        self._handle.close()
+
+
+class TinyDBEngine(StorageEngine):
+    """
+    TinyDB-backed engine (the whole database lives in one file, written in
+    `format`: 'json', 'compact' or 'binary'; see `utils.serialization`).
+
+    Reads are served from an in-memory copy of the file, and every indexed
+    field has a hash-map index (`utils.indexes.HashIndex`), so lookups on
+    indexed fields cost O(1) regardless of table size.
+
+    Writes are applied in memory and appended to a journal
+    (`<path>.journal`, see `utils.journal`) whose fsyncs are group-committed;
+    the JSON file is only rewritten at checkpoints. By default each write
+    waits for its fsync; in write-behind mode it returns immediately and
+    callers may `wait_for_commit()`.
+
+    Checkpoints (compaction) run on a background thread, every
+    `checkpoint_ops` writes, every `checkpoint_interval` seconds, or once
+    the journal makes up `compact_ratio` of the bytes on disk (and at least
+    `compact_min_bytes`). The new file is built from disk in a private
+    replica, so neither readers nor writers wait while it is serialized;
+    only the final rename and journal swap take the write lock.
+
+    The journal doubles as a change log shared by every process using the
+    same file (e.g. gunicorn workers): writers hold an flock on
+    `<path>.lock`, first apply any operations other processes appended,
+    then append their own. Readers compare the journal's inode and size
+    against what they have applied (one stat() call) and apply only the
+    new lines; a new inode means another process checkpointed, and the
+    JSON file is reloaded.
+
+    Within a process, request threads share a reader/writer lock
+    (`utils.rwlock.RWLock`): lookups run concurrently, while writes,
+    checkpoints and applying other processes' changes are exclusive.
+
+    The engine closes itself at interpreter exit and restarts its threads in
+    forked children; short-lived engines that are closed explicitly (file
+    conversions, migrations) pass `register_hooks=False` to skip both.
+    """
+
+    name = 'tinydb'
+    META_TABLE = '_meta'
+
+    def __init__(self, path: str, schema: Schema, write_behind: bool = False,
+                 commit_window: float = 0.005, commit_max_ops: int = 64,
+                 checkpoint_ops: int = 1000, checkpoint_interval: float = 30.0,
+                 format: str = 'json', compact_ratio: float = 0.5,
+                 compact_min_bytes: int = 1024 * 1024, register_hooks: bool = True):
+        super().__init__(schema)
+        self.path = path
+        self.format = format
+        self.journal_path = path + '.journal'
+        self.write_behind = write_behind
+        self.commit_window = commit_window if write_behind else 0
+        self.commit_max_ops = commit_max_ops
+        self.checkpoint_ops = checkpoint_ops
+        self.checkpoint_interval = checkpoint_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+
+        self.db: Optional[TinyDB] = None
+        self._rw = RWLock()
+        self._compact_lock = threading.Lock()
+        self._local = threading.local()
+        self._indexes: Dict[str, Dict[str, HashIndex]] = {}
+        self._reader = None
+        self._reader_inode = None
+        self._applied_seq = 0
+        self._offset = 0
+        self._ops_since_checkpoint = 0
+        self._data_size = 0
+        self._stopping = False
+
+        self._plock = _ProcessLock(path + '.lock')
+        with self._plock:
+            if not os.path.exists(self.journal_path):
+                meta = AtomicFileStorage(path).read() or {}
+                seq = meta.get(self.META_TABLE, {}).get('1', {}).get('journal_seq', 0)
+                GroupCommitJournal.create(self.journal_path, seq)
+            self._reload()
+        self._start_background()
+        if register_hooks:
+            # Fork hooks cannot be unregistered, so hold the engine weakly:
+            # a closed engine is not kept alive (or restarted) by it
+            atexit.register(self.close)
+            if hasattr(os, 'register_at_fork'):
+                after_fork = weakref.WeakMethod(self._after_fork)
+
+                def run_after_fork():
+                    method = after_fork()
+                    if method is not None:
+                        method()
+                os.register_at_fork(after_in_child=run_after_fork)
+
+    def _start_background(self):
+        self.journal = GroupCommitJournal(self.journal_path, self.commit_window, self.commit_max_ops)
+        self._checkpoint_wanted = threading.Event()
+        self._checkpointer = threading.Thread(
+            target=self._checkpoint_loop, name='tinydb-checkpoint', daemon=True
+        )
+        self._checkpointer.start()
+
+    def _after_fork(self):
+        """Give a forked worker (gunicorn --preload) its own locks and threads."""
+        if self._stopping:
+            return
+        self._rw = RWLock()
+        self._compact_lock = threading.Lock()
+        self._local = threading.local()
+        self._plock = _ProcessLock(self.path + '.lock')
+        self._start_background()
+
+    # ---------- indexes ----------
+
+    def _build_indexes(self):
+        self._indexes = {
+            table: {
+                i.key: (SortedIndex(i.field, group=i.group, tiebreak=PAGE_TIEBREAK) if i.ordered
+                        else HashIndex(i.field, nocase=i.nocase))
+                for i in indexes
+            }
+            for table, indexes in self.schema.items()
+        }
+        for table, indexes in self._indexes.items():
+            for doc in self.db.table(table):
+                for index in indexes.values():
+                    index.add(doc, doc.doc_id)
+
+    def _index(self, table: str, field: str) -> Optional[HashIndex]:
+        return self._indexes.get(table, {}).get(field)
+
+    def _check_unique(self, table: str, record: dict, ignore: Iterable[int] = (),
+                      seen: Optional[Dict[str, set]] = None):
+        """
+        Raise DuplicateKeyError if `record` collides with another record.
+
+        `seen` collects the unique values of the records checked so far in
+        the same write, so a batch cannot collide with itself either.
+        """
+        for i in self.schema.get(table, ()):
+            value = record.get(i.field)
+            if not i.unique or value is None:
+                continue
+            holders = self._indexes[table][i.field].lookup(value)
+            if any(doc_id not in ignore for doc_id in holders):
+                raise DuplicateKeyError(table, i.field, value)
+            if seen is not None:
+                key = value.lower() if i.nocase and isinstance(value, str) else value
+                batch = seen.setdefault(i.field, set())
+                if key in batch:
+                    raise DuplicateKeyError(table, i.field, value)
+                batch.add(key)
+
+    def _reindex(self, table: str, doc_ids: Iterable[int], add: bool):
+        tbl = self.db.table(table)
+        for doc_id in doc_ids:
+            doc = tbl.get(doc_id=doc_id)
+            if doc is None:
+                continue
+            for index in self._indexes.get(table, {}).values():
+                if add:
+                    index.add(doc, doc_id)
+                else:
+                    index.discard(doc, doc_id)
+
+    def _cond(self, table: str, field: str, value: Any):
+        q = Query()[field]
+        if self._nocase(table, field) and isinstance(value, str):
+            needle = value.lower()
+            return q.test(lambda v: isinstance(v, str) and v.lower() == needle)
+        return q == value
+
+    def _matching_ids(self, table: str, field: str, value: Any) -> List[int]:
+        index = self._index(table, field)
+        if index is not None:
+            return index.lookup(value)
+        return [doc.doc_id for doc in self.db.table(table).search(self._cond(table, field, value))]
+
+    # ---------- writes ----------
+
+    def _apply(self, op: dict):
+        """Apply one write operation in memory (caller holds the write lock)."""
+        kind, table = op['op'], op.get('table')
+        tbl = self.db.table(table) if table else None
+
+        if kind == 'insert':
+            records = op['records']
+            seen = {}
+            for record in records:
+                self._check_unique(table, record, seen=seen)
+            doc_ids = tbl.insert_multiple(records)
+            for record, doc_id in zip(records, doc_ids):
+                for index in self._indexes.get(table, {}).values():
+                    index.add(record, doc_id)
+            return len(doc_ids)
+
+        if kind in ('update', 'remove'):
+            doc_ids = self._matching_ids(table, op['field'], op['value'])
+            if not doc_ids:
+                return 0
+            if kind == 'remove':
+                self._reindex(table, doc_ids, add=False)
+                tbl.remove(doc_ids=doc_ids)
+                return len(doc_ids)
+
+            data, unset = op['data'], op.get('unset', ())
+
+            def transform(doc):
+                doc.update(data)
+                for key in unset:
+                    doc.pop(key, None)
+
+            seen = {}
+            for doc_id in doc_ids:
+                updated = dict(tbl.get(doc_id=doc_id))
+                transform(updated)
+                self._check_unique(table, updated, ignore=doc_ids, seen=seen)
+            self._reindex(table, doc_ids, add=False)
+            tbl.update(transform, doc_ids=doc_ids)
+            self._reindex(table, doc_ids, add=True)
+            return len(doc_ids)
+
+        if kind == 'truncate':
+            tbl.truncate()
+            for index in self._indexes.get(table, {}).values():
+                index.clear()
+            return 0
+
+        if kind == 'drop':
+            self.db.drop_tables()
+            self._build_indexes()
+            return 0
+
+        raise ValueError(f"Unknown operation: {kind}")
+
+    def _write(self, op: dict):
+        with self.journal.writing(), self._rw.write():
+            with self._plock:
+                self._refresh(locked=True)
+                if self.journal.inode != self._reader_inode:
+                    self.journal.reopen()
+                result = self._apply(op)
+                op = dict(op, seq=self._applied_seq + 1)
+                ticket, size = self.journal.append(op)
+                self._applied_seq = op['seq']
+                self._offset += size
+            self._local.ticket = ticket
+            self._ops_since_checkpoint += 1
+            if self._ops_since_checkpoint >= self.checkpoint_ops or self._journal_is_large():
+                self._checkpoint_wanted.set()
+        if not self.write_behind:
+            ticket.wait()
+        return result
+
+    def insert(self, table: str, record: dict) -> dict:
+        self._write({'op': 'insert', 'table': table, 'records': [record]})
+        return record
+
+    def insert_many(self, table: str, records: Iterable[dict]) -> int:
+        return self._write({'op': 'insert', 'table': table, 'records': list(records)})
+
+    def update(self, table: str, field: str, value: Any, data: dict, unset: Iterable[str] = ()) -> int:
+        return self._write({
+            'op': 'update', 'table': table, 'field': field, 'value': value,
+            'data': data, 'unset': list(unset)
+        })
+
+    def remove(self, table: str, field: str, value: Any) -> int:
+        return self._write({'op': 'remove', 'table': table, 'field': field, 'value': value})
+
+    def truncate(self, table: str):
+        self._write({'op': 'truncate', 'table': table})
+
+    def drop_all(self):
+        self._write({'op': 'drop'})
+
+    # ---------- reads ----------
+
+    def _read_lock(self):
+        """
+        Apply other processes' writes if the journal changed (exclusive),
+        then return the shared lock for the actual read.
+        """
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            st = None
+        if st is not None and (st.st_ino != self._reader_inode or st.st_size > self._offset):
+            with self._rw.write():
+                self._refresh()
+        return self._rw.read()
+
+    def get(self, table: str, field: str, value: Any) -> Optional[dict]:
+        index = self._index(table, field)
+        if index is None:
+            return super().get(table, field, value)
+        with self._read_lock():
+            doc_id = index.first(value)
+            return self.db.table(table).get(doc_id=doc_id) if doc_id is not None else None
+
+    def search(self, table: str, field: str, value: Any, fields: Fields = None) -> List[dict]:
+        with self._read_lock():
+            tbl = self.db.table(table)
+            if self._index(table, field) is None:
+                # Plain scan: Table.search() would mutate TinyDB's query cache
+                cond = self._cond(table, field, value)
+                return [project(doc, fields) for doc in tbl if cond(doc)]
+            return [project(tbl.get(doc_id=doc_id), fields)
+                    for doc_id in self._matching_ids(table, field, value)]
+
+    def all(self, table: str, fields: Fields = None) -> List[dict]:
+        with self._read_lock():
+            if fields is None:
+                return self.db.table(table).all()
+            return [project(doc, fields) for doc in self.db.table(table)]
+
+    def iter_all(self, table: str, batch_size: int = 500) -> Iterator[dict]:
+        # Snapshot the ids, then hold the read lock only per batch
+        with self._read_lock():
+            doc_ids = [doc.doc_id for doc in self.db.table(table)]
+        for start in range(0, len(doc_ids), batch_size):
+            with self._read_lock():
+                tbl = self.db.table(table)
+                batch = [tbl.get(doc_id=doc_id) for doc_id in doc_ids[start:start + batch_size]]
+            yield from (doc for doc in batch if doc is not None)
+
+    def page(self, table: str, field: str, limit: int, after: Optional[Tuple[Any, Any]] = None,
+             descending: bool = False, where: Optional[Tuple[str, Any]] = None,
+             fields: Fields = None) -> List[dict]:
+        index = self._indexes.get(table, {}).get((field, where[0] if where else None))
+        if index is None:
+            return super().page(table, field, limit, after, descending, where, fields)
+        with self._read_lock():
+            tbl = self.db.table(table)
+            doc_ids = index.page(limit, after, descending, group=where[1] if where else None)
+            return [project(tbl.get(doc_id=doc_id), fields) for doc_id in doc_ids]
+
+    def count(self, table: str) -> int:
+        with self._read_lock():
+            return len(self.db.table(table))
+
+    # ---------- journal & checkpoints ----------
+
+    def wait_for_commit(self, timeout: Optional[float] = None) -> bool:
+        ticket = getattr(self._local, 'ticket', None)
+        return ticket.wait(timeout) if ticket is not None else True
+
+    def _reload(self):
+        """Load the last checkpoint and apply the journal that follows it."""
+        while True:
+            self.db = TinyDB(self.path, format=self.format, storage=_DeferredCache(AtomicFileStorage))
+            meta = self.db.table(self.META_TABLE).get(doc_id=1) or {}
+            self._applied_seq = meta.get('journal_seq', 0)
+            self._build_indexes()
+            if self._reader is not None:
+                self._reader.close()
+            self._reader = open(self.journal_path, 'rb')
+            self._reader_inode = os.fstat(self._reader.fileno()).st_ino
+            self._offset = 0
+            self._data_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if self._catch_up():
+                return
+
+    def _catch_up(self) -> bool:
+        """
+        Apply journal lines appended since the last call. Returns False if
+        the journal does not continue from the loaded checkpoint.
+        """
+        ops, self._offset = read_ops(self._reader, self._offset)
+        for op in ops:
+            if op['op'] == 'base':
+                if op['seq'] > self._applied_seq:
+                    return False  # a newer checkpoint replaced the one we loaded
+                continue
+            if op['seq'] <= self._applied_seq:
+                continue
+            try:
+                self._apply(op)
+            except DuplicateKeyError:
+                pass  # rejected when first attempted, too
+            self._applied_seq = op['seq']
+        return True
+
+    def _refresh(self, locked: bool = False):
+        """Pick up writes made by other processes (caller holds the write lock)."""
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._reader_inode:
+            self._reload()
+        elif st.st_size > self._offset and not self._catch_up():
+            self._reload()
+        if locked and os.path.getsize(self.journal_path) > self._offset:
+            # A writer died mid-line while holding the lock; drop the torn tail
+            os.truncate(self.journal_path, self._offset)
+
+    # ---------- checkpoints, compaction & snapshots ----------
+
+    def _journal_is_large(self) -> bool:
+        journal = self._offset
+        return journal >= self.compact_min_bytes and journal >= self.compact_ratio * (self._data_size + journal)
+
+    def garbage_ratio(self) -> float:
+        """Share of the bytes on disk taken by the journal (folded away by a checkpoint)."""
+        try:
+            journal = os.path.getsize(self.journal_path)
+            data = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        except FileNotFoundError:
+            return 0.0
+        return journal / (data + journal) if data + journal else 0.0
+
+    def _build_checkpoint(self) -> Tuple[Dict[str, Dict[str, Any]], int, int, int]:
+        """
+        Rebuild the current state from disk (last checkpoint + journal) in a
+        private replica, without touching the live copy or its locks.
+        Returns (data, seq, journal inode, journal offset covered).
+        """
+        # Journal first: if another process checkpoints in between, the file
+        # is newer than this journal and its lines are simply skipped
+        with open(self.journal_path, 'rb') as f:
+            inode = os.fstat(f.fileno()).st_ino
+            ops, offset = read_ops(f)
+        replica = _Replica(AtomicFileStorage(self.path).read() or {}, self.schema)
+        for op in ops:
+            if op['op'] == 'base':
+                if op['seq'] > replica.seq:
+                    raise RuntimeError('Journal does not continue from the database file')
+                continue
+            if op['seq'] <= replica.seq:
+                continue
+            try:
+                replica._apply(op)
+            except DuplicateKeyError:
+                pass
+            replica.seq = op['seq']
+        data = replica.db.storage.read()
+        data[self.META_TABLE] = {'1': {'journal_seq': replica.seq}}
+        return data, replica.seq, inode, offset
+
+    def checkpoint(self) -> bool:
+        """
+        Write the current state to a fresh database file and start a new
+        journal. Returns False if another process checkpointed first.
+        """
+        with self._compact_lock:
+            data, seq, inode, offset = self._build_checkpoint()
+            directory = os.path.dirname(self.path) or '.'
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(serialization.dumps(data, self.format))
+                    f.flush()
+                    os.fsync(f.fileno())
+                del data
+
+                with self._rw.write(), self._plock:
+                    self._refresh(locked=True)
+                    if self._reader_inode != inode:
+                        return False
+                    self.journal.sync()
+                    # Writes that landed while the file was being built
+                    self._reader.seek(offset)
+                    tail = self._reader.read(self._offset - offset)
+                    # File before journal: after a crash in between, the old
+                    # journal's lines up to `seq` are skipped on reload
+                    os.replace(tmp_path, self.path)
+                    GroupCommitJournal.create(self.journal_path, seq, tail)
+                    self.journal.reopen()
+                    # Closed below: dropping the last handle on the old
+                    # journal frees the file, which can take a while
+                    old_reader, self._reader = self._reader, open(self.journal_path, 'rb')
+                    st = os.fstat(self._reader.fileno())
+                    self._reader_inode, self._offset = st.st_ino, st.st_size
+                    self._data_size = os.path.getsize(self.path)
+                    self._ops_since_checkpoint = tail.count(b'\n')
+                    self._checkpoint_wanted.clear()
+                old_reader.close()
+                return True
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def compact(self, min_garbage: Optional[float] = None) -> bool:
+        if min_garbage is not None and self.garbage_ratio() < min_garbage:
+            return False
+        return self.checkpoint()
+
+    def snapshot(self, dest: str) -> int:
+        """
+        Write a consistent copy of the database (a standalone file in this
+        engine's format, usable as DATABASE_PATH) to `dest` without
+        blocking readers or writers. Returns the journal seq it captures.
+        """
+        data, seq, _, _ = self._build_checkpoint()
+        AtomicFileStorage(dest, self.format).write(data)
+        return seq
+
+    def restore_snapshot(self, source: str):
+        """
+        Replace the database with a snapshot. Other processes reload it when
+        they notice the new journal.
+        """
+        data = AtomicFileStorage(source).read()
+        if not isinstance(data, dict):
+            raise ValueError(f"Not a database snapshot: {source}")
+        with self._compact_lock, self._rw.write(), self._plock:
+            self._refresh(locked=True)
+            self.journal.sync()
+            # Keep sequence numbers moving forward so the current journal's
+            # lines are skipped should we crash before replacing it
+            data[self.META_TABLE] = {'1': {'journal_seq': self._applied_seq}}
+            AtomicFileStorage(self.path, self.format).write(data)
+            GroupCommitJournal.create(self.journal_path, self._applied_seq)
+            self.journal.reopen()
+            self._reload()
+            self._ops_since_checkpoint = 0
+
+    def _checkpoint_loop(self):
+        while not self._stopping:
+            self._checkpoint_wanted.wait(self.checkpoint_interval)
+            if self._stopping:
+                return
+            if self._ops_since_checkpoint:
+                try:
+                    self.checkpoint()
+                except Exception as e:
+                    print(f"Checkpoint error: {e}")
+
+    def close(self):
+        if self._stopping:
+            return
+        self._stopping = True
+        atexit.unregister(self.close)
+        self._checkpoint_wanted.set()
+        if self._ops_since_checkpoint:
+            self.checkpoint()
+        self.journal.close()
+        self._checkpointer.join()
+        if self._reader is not None:
+            self._reader.close()
+        self._plock.close()
+
+
+class _Replica(TinyDBEngine):
+    """In-memory copy of a TinyDB database used to build checkpoints off the live engine."""
+
+    def __init__(self, data: Dict[str, Dict[str, Any]], schema: Schema):
+        StorageEngine.__init__(self, schema)
+        self.db = TinyDB(storage=MemoryStorage)
+        self.db.storage.write(data)
+        self.seq = data.get(self.META_TABLE, {}).get('1', {}).get('journal_seq', 0)
+        self._build_indexes()
+
+
+# ==================== SQLITE ====================
+
+class SQLiteEngine(StorageEngine):
+    """
+    SQLite engine running in WAL mode.
+
+    Each table stores the full record as JSON in a `data` column. Indexed
+    fields are promoted to real columns with a B-tree index; lookups on any
+    other field fall back to `json_extract`. Connections are per-thread so
+    readers never block each other under WAL.
+
+    With `synchronous=NORMAL`, WAL commits are not fsynced individually
+    (fsync happens at WAL checkpoints) yet survive a process crash, so the
+    write-behind options are accepted but not needed here.
+
+    Row counts are kept in `_row_counts` by insert/delete triggers, so
+    `count()` is O(1) instead of a COUNT(*) scan.
+
+    Deleted rows leave free pages behind; `compact()` folds the WAL into the
+    file and VACUUMs it (run it from `flask db compact --if-garbage`, SQLite
+    already bounds the WAL itself with auto-checkpoints). Snapshots use
+    `VACUUM INTO`, which reads one consistent WAL snapshot while other
+    connections keep reading and writing.
+    """
+
+    name = 'sqlite'
+    COUNTS_TABLE = '_row_counts'
+
+    def __init__(self, path: str, schema: Schema, **options):
+        super().__init__(schema)
+        self.path = path
+        self._local = threading.local()
+        self._create_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _q(name: str) -> str:
+        """Quote an identifier."""
+        return '"' + name.replace('"', '""') + '"'
+
+    def _create_schema(self):
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._q(self.COUNTS_TABLE)} "
+            f"(name TEXT PRIMARY KEY, n INTEGER NOT NULL)"
+        )
+        for table, indexes in self.schema.items():
+            columns = self._column_defs(table)
+            cols = ''.join(
+                f", {self._q(c)} TEXT" + (" COLLATE NOCASE" if nocase else "")
+                for c, nocase in columns.items()
+            )
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._q(table)} "
+                f"(_rowid INTEGER PRIMARY KEY AUTOINCREMENT{cols}, data TEXT NOT NULL)"
+            )
+            # Columns added to the schema after the table was created
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({self._q(table)})")}
+            for c, nocase in columns.items():
+                if c not in existing:
+                    conn.execute(
+                        f"ALTER TABLE {self._q(table)} ADD COLUMN {self._q(c)} TEXT"
+                        + (" COLLATE NOCASE" if nocase else "")
+                    )
+                    conn.execute(f"UPDATE {self._q(table)} SET {self._q(c)} = json_extract(data, '$.{c}')")
+            for i in indexes:
+                if i.ordered:
+                    parts = ([i.group] if i.group else []) + [i.field, PAGE_TIEBREAK]
+                    name = '_'.join(['ord', table] + parts[:-1])
+                    conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS {self._q(name)} "
+                        f"ON {self._q(table)} ({', '.join(self._q(p) for p in parts)})"
+                    )
+                    continue
+                if not i.unique:
+                    conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS {self._q(f'idx_{table}_{i.field}')} "
+                        f"ON {self._q(table)} ({self._q(i.field)})"
+                    )
+                    continue
+                try:
+                    conn.execute(
+                        f"CREATE UNIQUE INDEX IF NOT EXISTS {self._q(f'uq_{table}_{i.field}')} "
+                        f"ON {self._q(table)} ({self._q(i.field)})"
+                    )
+                    conn.execute(f"DROP INDEX IF EXISTS {self._q(f'idx_{table}_{i.field}')}")
+                except sqlite3.IntegrityError:
+                    print(f"⚠️ Existing duplicates in {table}.{i.field}; unique index not created")
+                    conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS {self._q(f'idx_{table}_{i.field}')} "
+                        f"ON {self._q(table)} ({self._q(i.field)})"
+                    )
+            self._create_count_triggers(conn, table)
+
+    def _create_count_triggers(self, conn: sqlite3.Connection, table: str):
+        """Seed the table's row count and keep it current with triggers."""
+        counts, name = self._q(self.COUNTS_TABLE), "'" + table.replace("'", "''") + "'"
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                f"INSERT OR IGNORE INTO {counts} (name, n) SELECT ?, COUNT(*) FROM {self._q(table)}",
+                (table,)
+            )
+            for event, delta in (('INSERT', '+ 1'), ('DELETE', '- 1')):
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {self._q(f'count_{event.lower()}_{table}')} "
+                    f"AFTER {event} ON {self._q(table)} "
+                    f"BEGIN UPDATE {counts} SET n = n {delta} WHERE name = {name}; END"
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _column_defs(self, table: str) -> Dict[str, bool]:
+        """Promoted columns (indexed fields and ordered-index groups) -> NOCASE."""
+        columns: Dict[str, bool] = {}
+        for i in self.schema.get(table, ()):
+            for field in (i.group, i.field):
+                if field:
+                    columns[field] = columns.get(field, False) or (i.nocase and field == i.field)
+        return columns
+
+    def _columns(self, table: str) -> List[str]:
+        return list(self._column_defs(table))
+
+    def _where(self, table: str, field: str) -> str:
+        if not _FIELD_RE.match(field):
+            raise ValueError(f"Invalid field name: {field}")
+        if field in self._columns(table):
+            return f"{self._q(field)} = ?"
+        return f"json_extract(data, '$.{field}') = ?"
+
+    @staticmethod
+    def _column_value(value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        return value if isinstance(value, str) else json.dumps(value)
+
+    def _row_params(self, table: str, record: dict) -> list:
+        params = [self._column_value(record.get(c)) for c in self._columns(table)]
+        params.append(json.dumps(record, separators=(',', ':')))
+        return params
+
+    def _insert_sql(self, table: str) -> str:
+        cols = self._columns(table) + ['data']
+        return (
+            f"INSERT INTO {self._q(table)} ({', '.join(self._q(c) for c in cols)}) "
+            f"VALUES ({', '.join('?' for _ in cols)})"
+        )
+
+    @staticmethod
+    def _duplicate_error(table: str, error: sqlite3.IntegrityError) -> Exception:
+        """Translate a UNIQUE constraint failure into DuplicateKeyError."""
+        message = str(error)
+        prefix = 'UNIQUE constraint failed: '
+        if message.startswith(prefix):
+            field = message[len(prefix):].split(',')[0].split('.')[-1].strip()
+            return DuplicateKeyError(table, field)
+        return error
+
+    def insert(self, table: str, record: dict) -> dict:
+        try:
+            self._conn().execute(self._insert_sql(table), self._row_params(table, record))
+        except sqlite3.IntegrityError as e:
+            raise self._duplicate_error(table, e) from e
+        return record
+
+    def insert_many(self, table: str, records: Iterable[dict]) -> int:
+        conn = self._conn()
+        sql = self._insert_sql(table)
+        n = 0
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for record in records:
+                conn.execute(sql, self._row_params(table, record))
+                n += 1
+            conn.execute('COMMIT')
+        except Exception as e:
+            conn.execute('ROLLBACK')
+            if isinstance(e, sqlite3.IntegrityError):
+                raise self._duplicate_error(table, e) from e
+            raise
+        return n
+
+    def _select(self, fields: Fields) -> str:
+        """Column expression for a read: the whole record, or a JSON object of `fields`."""
+        if fields is None:
+            return 'data'
+        for f in fields:
+            if not _FIELD_RE.match(f):
+                raise ValueError(f"Invalid field: {f}")
+        return 'json_object(' + ', '.join(f"'{f}', json_extract(data, '$.{f}')" for f in fields) + ')'
+
+    def search(self, table: str, field: str, value: Any, fields: Fields = None) -> List[dict]:
+        rows = self._conn().execute(
+            f"SELECT {self._select(fields)} FROM {self._q(table)} "
+            f"WHERE {self._where(table, field)} ORDER BY _rowid",
+            (value,)
+        )
+        return [json.loads(r[0]) for r in rows]
+
+    def get(self, table: str, field: str, value: Any) -> Optional[dict]:
+        row = self._conn().execute(
+            f"SELECT data FROM {self._q(table)} WHERE {self._where(table, field)} "
+            f"ORDER BY _rowid LIMIT 1",
+            (value,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self, table: str, fields: Fields = None) -> List[dict]:
+        rows = self._conn().execute(f"SELECT {self._select(fields)} FROM {self._q(table)} ORDER BY _rowid")
+        return [json.loads(r[0]) for r in rows]
+
+    def iter_all(self, table: str, batch_size: int = 500) -> Iterator[dict]:
+        # Keyset batches on _rowid: no read transaction stays open between batches
+        last = 0
+        while True:
+            rows = self._conn().execute(
+                f"SELECT _rowid, data FROM {self._q(table)} WHERE _rowid > ? ORDER BY _rowid LIMIT ?",
+                (last, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            for _, raw in rows:
+                yield json.loads(raw)
+
+    def page(self, table: str, field: str, limit: int, after: Optional[Tuple[Any, Any]] = None,
+             descending: bool = False, where: Optional[Tuple[str, Any]] = None,
+             fields: Fields = None) -> List[dict]:
+        columns = self._columns(table)
+        if field not in columns or PAGE_TIEBREAK not in columns:
+            return super().page(table, field, limit, after, descending, where, fields)
+        order = (self._q(field), self._q(PAGE_TIEBREAK))
+        clauses, params = [f"{order[0]} IS NOT NULL", f"{order[1]} IS NOT NULL"], []
+        if where:
+            clauses.append(self._where(table, where[0]))
+            params.append(where[1])
+        if after is not None:
+            clauses.append(f"({order[0]}, {order[1]}) {'<' if descending else '>'} (?, ?)")
+            params += [self._column_value(after[0]), self._column_value(after[1])]
+        direction = 'DESC' if descending else 'ASC'
+        rows = self._conn().execute(
+            f"SELECT {self._select(fields)} FROM {self._q(table)} WHERE {' AND '.join(clauses)} "
+            f"ORDER BY {order[0]} {direction}, {order[1]} {direction} LIMIT ?",
+            params + [limit]
+        )
+        return [json.loads(r[0]) for r in rows]
+
+    def update(self, table: str, field: str, value: Any, data: dict, unset: Iterable[str] = ()) -> int:
+        conn = self._conn()
+        cols = self._columns(table)
+        sets = ', '.join(f"{self._q(c)} = ?" for c in cols + ['data'])
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                f"SELECT _rowid, data FROM {self._q(table)} WHERE {self._where(table, field)}",
+                (value,)
+            ).fetchall()
+            for rowid, raw in rows:
+                record = json.loads(raw)
+                record.update(data)
+                for key in unset:
+                    record.pop(key, None)
+                conn.execute(
+                    f"UPDATE {self._q(table)} SET {sets} WHERE _rowid = ?",
+                    self._row_params(table, record) + [rowid]
+                )
+            conn.execute('COMMIT')
+        except Exception as e:
+            conn.execute('ROLLBACK')
+            if isinstance(e, sqlite3.IntegrityError):
+                raise self._duplicate_error(table, e) from e
+            raise
+        return len(rows)
+
+    def remove(self, table: str, field: str, value: Any) -> int:
+        cur = self._conn().execute(
+            f"DELETE FROM {self._q(table)} WHERE {self._where(table, field)}",
+            (value,)
+        )
+        return cur.rowcount
+
+    def count(self, table: str) -> int:
+        row = self._conn().execute(
+            f"SELECT n FROM {self._q(self.COUNTS_TABLE)} WHERE name = ?", (table,)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self._q(table)}").fetchone()[0]
+
+    def truncate(self, table: str):
+        self._conn().execute(f"DELETE FROM {self._q(table)}")
+
+    def drop_all(self):
+        conn = self._conn()
+        for table in self.schema:
+            conn.execute(f"DROP TABLE IF EXISTS {self._q(table)}")
+        conn.execute(f"DELETE FROM {self._q(self.COUNTS_TABLE)}")
+        self._create_schema()
+
+    # ---------- maintenance ----------
+
+    def garbage_ratio(self) -> float:
+        """Share of database pages on the freelist (left behind by deletes)."""
+        conn = self._conn()
+        pages = conn.execute('PRAGMA page_count').fetchone()[0]
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return free / pages if pages else 0.0
+
+    def compact(self, min_garbage: Optional[float] = None) -> bool:
+        """
+        Fold the WAL back into the database file, then VACUUM it (with
+        `min_garbage`, only if that share of pages is free). Returns True if
+        the file was rewritten.
+        """
+        conn = self._conn()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        if min_garbage is not None and self.garbage_ratio() < min_garbage:
+            return False
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return True
+
+    def snapshot(self, dest: str):
+        """Write a consistent, vacuumed copy of the database to `dest` (atomically)."""
+        directory = os.path.dirname(os.path.abspath(dest))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        os.close(fd)
+        os.remove(tmp_path)  # VACUUM INTO refuses to overwrite a file
+        try:
+            self._conn().execute('VACUUM INTO ?', (tmp_path,))
+            os.replace(tmp_path, dest)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def restore_snapshot(self, source: str):
+        """Copy a snapshot over the live database (one transaction, seen by every connection)."""
+        if not os.path.exists(source):
+            raise FileNotFoundError(source)
+        src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+        try:
+            src.backup(self._conn())
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"Not a database snapshot: {source} ({e})") from e
+        finally:
+            src.close()
+        self._create_schema()
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# ==================== FACTORY & MIGRATION ====================
+
+ENGINES = {
+    TinyDBEngine.name: TinyDBEngine,
+    SQLiteEngine.name: SQLiteEngine,
+}
+
+
+def create_engine(name: str, path: str, schema: Schema, **options) -> StorageEngine:
+    """
+    Instantiate the storage engine registered under `name`.
+    Extra keyword options are passed to engines that accept them.
+    """
+    engine_cls = ENGINES.get(name)
+    if engine_cls is None:
+        raise ValueError(f"Unknown storage engine: {name} (choose from {', '.join(ENGINES)})")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return engine_cls(path, schema, **options)
+
+
+def convert_tinydb_file(path: str, fmt: str, output: Optional[str] = None) -> Dict[str, int]:
+    """
+    Rewrite a TinyDB database file in another on-disk format (see
+    `utils.serialization`), including writes still in its journal.
+
+    Converts in place through a checkpoint (atomic, safe while the app is
+    running) unless `output` is given, in which case a standalone copy is
+    written there. Returns the number of records per table.
+    """
+    if fmt not in serialization.FORMATS:
+        raise ValueError(f"Unknown database format: {fmt}")
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    engine = TinyDBEngine(path, {}, format=fmt, register_hooks=False)
+    try:
+        if output is None:
+            engine.checkpoint()
+            data = engine.db.storage.read()
+        else:
+            with engine._rw.read():
+                data = {t: docs for t, docs in engine.db.storage.read().items()
+                        if t != TinyDBEngine.META_TABLE}
+                AtomicFileStorage(output, fmt).write(data)
+    finally:
+        engine.close()
+    return {t: len(docs) for t, docs in data.items() if t != TinyDBEngine.META_TABLE}
+
+
+def migrate_tinydb_file(json_path: str, target: StorageEngine, force: bool = False) -> Dict[str, int]:
+    """
+    One-shot copy of a TinyDB JSON file into another engine.
+
+    Records are copied in their original insertion order. Refuses to run
+    against a non-empty target unless `force` is set.
+    Returns the number of records copied per table.
+    """
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(json_path)
+
+    if not force and any(target.count(t) for t in target.schema):
+        raise RuntimeError('Target storage is not empty (use --force to copy anyway)')
+
+    # Open through the engine so journaled writes since the last checkpoint are included
+    source = TinyDBEngine(json_path, target.schema, register_hooks=False)
+    try:
+        copied = {}
+        for table in target.schema:
+            rows = [dict(doc) for doc in source.all(table)]
+            if rows:
+                copied[table] = target.insert_many(table, rows)
+    finally:
+        source.close()
+    return copied
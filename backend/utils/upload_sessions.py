@@ -0,0 +1,361 @@
+"""
+Inventa Upload Sessions
+=======================
+Resumable uploads: a client opens a session for a file of known size,
+PUTs it in numbered chunks (in any order, retrying the ones that fail)
+and finalizes it, which registers the document like a one-shot upload.
+
+Sessions live on local disk under UPLOAD_FOLDER, so any worker can serve
+any request of a session:
+
+    uploads/sessions/<session id>/
+        session.json        owner, file name, size, chunk size
+        lock                flock: chunk writes shared, finalize exclusive
+        chunks/00000000     one file per received chunk
+
+Chunks are write-once (a retried PUT of a stored chunk is a no-op), so
+the data cannot change under the running SHA-256 kept for the contiguous
+prefix of received chunks. That hash lives in process memory; a worker
+that did not see the earlier chunks (or restarted) catches up by reading
+them from disk.
+
+A session expires `ttl` seconds after its last chunk; expired sessions
+are removed when accessed and by a sweep that runs at most once a minute,
+from a background thread (`start()`, see wsgi.py) and when sessions are
+created or looked up.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+from config import get_config
+
+config = get_config()
+
+_ID_RE = re.compile(r'^upload_[0-9a-f]{24}$')
+_READ_SIZE = 1024 * 1024
+_SWEEP_INTERVAL = 60
+
+
+class SessionError(Exception):
+    """A request the session cannot accept; `status` is the HTTP status to report."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class _Progress:
+    """Running hash over the contiguous prefix of received chunks."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_index = 0
+        self.sha = hashlib.sha256()
+
+
+class UploadSession:
+    """One upload session directory (see the module docstring)."""
+
+    def __init__(self, store: 'UploadSessionStore', session_id: str, info: dict):
+        self.store = store
+        self.id = session_id
+        self.info = info
+        self.dir = os.path.join(store.root, session_id)
+        self.chunks_dir = os.path.join(self.dir, 'chunks')
+
+    @property
+    def user_id(self) -> str:
+        return self.info['user_id']
+
+    @property
+    def filename(self) -> str:
+        return self.info['filename']
+
+    @property
+    def size(self) -> int:
+        return self.info['size']
+
+    @property
+    def chunk_size(self) -> int:
+        return self.info['chunk_size']
+
+    @property
+    def chunk_count(self) -> int:
+        return -(-self.size // self.chunk_size)
+
+    @property
+    def expires_at(self) -> str:
+        expires = os.path.getmtime(os.path.join(self.dir, 'session.json')) + self.store.ttl
+        return datetime.utcfromtimestamp(expires).isoformat() + 'Z'
+
+    # ---------- chunks ----------
+
+    def chunk_path(self, index: int) -> str:
+        return os.path.join(self.chunks_dir, f'{index:08d}')
+
+    def chunk_length(self, index: int) -> int:
+        """Expected size of chunk `index` (all are chunk_size but the last)."""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def received(self) -> List[int]:
+        """Indexes of the chunks stored so far, in order."""
+        return sorted(int(name) for name in os.listdir(self.chunks_dir) if name.isdigit())
+
+    def missing(self) -> List[int]:
+        received = set(self.received())
+        return [i for i in range(self.chunk_count) if i not in received]
+
+    def write_chunk(self, index: int, stream: BinaryIO) -> bool:
+        """
+        Store chunk `index` from `stream`, which must hold exactly its
+        expected length. Returns False if the chunk was already stored (the
+        new copy is discarded). Raises SessionError otherwise.
+        """
+        if not 0 <= index < self.chunk_count:
+            raise SessionError(f'Chunk index must be between 0 and {self.chunk_count - 1}')
+        expected = self.chunk_length(index)
+        path = self.chunk_path(index)
+        if os.path.exists(path):
+            return False
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.chunks_dir, prefix='.tmp')
+        try:
+            written = 0
+            with os.fdopen(fd, 'wb') as f:
+                while written <= expected:
+                    data = stream.read(min(_READ_SIZE, expected + 1 - written))
+                    if not data:
+                        break
+                    f.write(data)
+                    written += len(data)
+                if written != expected:
+                    raise SessionError(f'Chunk {index} must be {expected} bytes')
+                f.flush()
+                os.fsync(f.fileno())
+            # link() rather than rename(): never replaces a chunk stored meanwhile
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                return False
+        finally:
+            os.remove(tmp_path)
+
+        os.utime(os.path.join(self.dir, 'session.json'))  # push back the expiry
+        self.hashed_bytes()
+        return True
+
+    def read(self) -> Iterator[bytes]:
+        """Yield the uploaded file, chunk file by chunk file."""
+        for index in range(self.chunk_count):
+            with open(self.chunk_path(index), 'rb') as f:
+                while True:
+                    data = f.read(_READ_SIZE)
+                    if not data:
+                        break
+                    yield data
+
+    # ---------- hashing ----------
+
+    def _advance(self) -> _Progress:
+        progress = self.store._progress_for(self.id)
+        with progress.lock:
+            while progress.next_index < self.chunk_count:
+                try:
+                    f = open(self.chunk_path(progress.next_index), 'rb')
+                except FileNotFoundError:
+                    break
+                with f:
+                    for data in iter(lambda: f.read(_READ_SIZE), b''):
+                        progress.sha.update(data)
+                progress.next_index += 1
+        return progress
+
+    def hashed_bytes(self) -> int:
+        """Hash newly contiguous chunks; return how many bytes are hashed."""
+        progress = self._advance()
+        return min(progress.next_index * self.chunk_size, self.size)
+
+    def digest(self) -> str:
+        """SHA-256 of the whole file (all chunks must be stored)."""
+        progress = self._advance()
+        if progress.next_index < self.chunk_count:
+            raise SessionError('Upload is incomplete')
+        return progress.sha.hexdigest()
+
+    # ---------- lifecycle ----------
+
+    @contextmanager
+    def locked(self, exclusive: bool = False):
+        """
+        Hold the session lock: shared while a chunk is written, exclusive
+        to finalize or delete. Raises SessionError (409) if it is taken.
+        """
+        with open(os.path.join(self.dir, 'lock'), 'a+b') as handle:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(handle.fileno(), (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise SessionError('Upload session is busy, try again', 409) from None
+            yield self
+
+    def delete(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.store._forget(self.id)
+
+    def to_dict(self) -> dict:
+        """Session state for API responses."""
+        received = self.received()
+        return {
+            'sessionId': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'chunkSize': self.chunk_size,
+            'chunkCount': self.chunk_count,
+            'receivedChunks': len(received),
+            'missingChunks': self.missing(),
+            'expiresAt': self.expires_at
+        }
+
+
+class UploadSessionStore:
+    """Creates, finds and expires upload sessions under `<root>/sessions`."""
+
+    def __init__(self, root: str, chunk_size: int, ttl: float):
+        self.root = os.path.join(root, 'sessions')
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._progress: Dict[str, _Progress] = {}
+        self._last_sweep = 0.0
+        self._thread = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        was_running = self._thread is not None
+        self._lock = threading.Lock()
+        self._progress = {}
+        self._thread = None
+        if was_running:
+            self.start()
+
+    def start(self):
+        """Sweep expired sessions on a background thread every minute (idempotent)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sweep_loop, name='upload-session-sweep', daemon=True)
+                self._thread.start()
+
+    def _sweep_loop(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️  Upload session sweep failed: {e}")
+            time.sleep(_SWEEP_INTERVAL)
+
+    def _progress_for(self, session_id: str) -> _Progress:
+        with self._lock:
+            return self._progress.setdefault(session_id, _Progress())
+
+    def _forget(self, session_id: str):
+        with self._lock:
+            self._progress.pop(session_id, None)
+
+    def create(self, user_id: str, filename: str, size: int) -> UploadSession:
+        self.sweep()
+        session_id = f"upload_{hashlib.sha256(os.urandom(16)).hexdigest()[:24]}"
+        info = {
+            'user_id': user_id,
+            'filename': filename,
+            'size': size,
+            'chunk_size': self.chunk_size,
+            'created_at': datetime.utcnow().isoformat() + 'Z'
+        }
+        session = UploadSession(self, session_id, info)
+        os.makedirs(session.chunks_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=session.dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(info, f)
+        os.replace(tmp_path, os.path.join(session.dir, 'session.json'))
+        return session
+
+    def get(self, session_id: str) -> Optional[UploadSession]:
+        """Return a live session, or None if it does not exist or has expired."""
+        self.sweep()
+        if not _ID_RE.match(session_id or ''):
+            return None
+        path = os.path.join(self.root, session_id, 'session.json')
+        try:
+            with open(path) as f:
+                info = json.load(f)
+            expired = os.path.getmtime(path) + self.ttl < time.time()
+        except (FileNotFoundError, ValueError):
+            return None
+        session = UploadSession(self, session_id, info)
+        if expired:
+            self._expire(session)
+            return None
+        return session
+
+    def _expire(self, session: UploadSession):
+        try:
+            with session.locked(exclusive=True):
+                session.delete()
+        except (SessionError, FileNotFoundError):
+            pass  # in use, or already gone
+
+    def sweep(self, force: bool = False) -> int:
+        """Remove expired sessions (at most once a minute unless forced)."""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_sweep < _SWEEP_INTERVAL:
+                return 0
+            self._last_sweep = now
+
+        removed = 0
+        for session_id in os.listdir(self.root):
+            session_dir = os.path.join(self.root, session_id)
+            try:
+                touched = os.path.getmtime(os.path.join(session_dir, 'session.json'))
+            except FileNotFoundError:
+                # Half-created or half-deleted session
+                touched = os.path.getmtime(session_dir) if os.path.isdir(session_dir) else now
+                if touched + self.ttl < now:
+                    shutil.rmtree(session_dir, ignore_errors=True)
+                    removed += 1
+                continue
+            if touched + self.ttl < now:
+                self._expire(UploadSession(self, session_id, {}))
+                removed += 1
+
+        # Hashes of sessions finished or expired in other workers
+        live = set(os.listdir(self.root))
+        with self._lock:
+            for session_id in [s for s in self._progress if s not in live]:
+                del self._progress[session_id]
+        return removed
+
+
+# Create a global upload session store
+upload_sessions = UploadSessionStore(
+    config.UPLOAD_FOLDER,
+    chunk_size=config.UPLOAD_CHUNK_SIZE,
+    ttl=config.UPLOAD_SESSION_TTL
+)
@@ -0,0 +1,184 @@
+"""
+Inventa Streaming Uploads
+=========================
+Single-pass processing of multipart document uploads.
+
+The request body is read in CHUNK_SIZE pieces and fed to werkzeug's
+sans-IO multipart decoder, so no part is ever buffered whole:
+
+- the document (`file`) is hashed (SHA-256 of the plaintext) and
+  encrypted in the segmented AES-GCM format as it arrives, and the
+  ciphertext is written straight into the blob store
+- the proof of work file (`proofOfWork`) is written to a blob as is
+- other fields are collected as text (up to MAX_FIELD_SIZE each)
+
+Peak memory per upload is a few chunks, whatever the file size.
+"""
+
+import hashlib
+from typing import BinaryIO, Callable, Dict, Iterable, Optional
+
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from utils.blobstore import BlobStore, BlobWriter
+from utils.crypto import SegmentEncryptor
+
+CHUNK_SIZE = 64 * 1024
+MAX_FIELD_SIZE = 64 * 1024
+# Bytes the decoder may hold while looking for a part boundary
+_MAX_BUFFER = 4 * CHUNK_SIZE
+
+
+class UploadError(Exception):
+    """The upload is malformed or not acceptable (reported as HTTP 400)."""
+
+
+class EncryptingSink:
+    """Hashes plaintext, encrypts it and streams the ciphertext into a blob."""
+
+    def __init__(self, store: BlobStore, document_id: str):
+        self.encryptor = SegmentEncryptor(document_id)
+        self.blob = store.writer()
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes):
+        self._sha.update(data)
+        self.size += len(data)
+        self.blob.write(self.encryptor.update(data))
+
+    def close(self):
+        self.blob.write(self.encryptor.finalize())
+
+    @property
+    def hash(self) -> str:
+        """SHA-256 of the plaintext, as `utils.crypto.hash_file` computes it."""
+        return self._sha.hexdigest()
+
+
+class _PlainSink:
+    """Writes a part to a blob unchanged."""
+
+    def __init__(self, store: BlobStore):
+        self.blob = store.writer()
+
+    def write(self, data: bytes):
+        self.blob.write(data)
+
+    def close(self):
+        pass
+
+
+def _next_event(decoder: MultipartDecoder):
+    try:
+        return decoder.next_event()
+    except ValueError as e:  # werkzeug: "Invalid form-data ..."
+        raise UploadError('Malformed upload') from e
+
+
+def parse_multipart(stream: BinaryIO, boundary: bytes, open_file: Callable[[str, str], Optional[object]],
+                    chunk_size: int = CHUNK_SIZE) -> Dict[str, str]:
+    """
+    Parse a multipart/form-data body from `stream`, one chunk at a time.
+    For each file part, `open_file(field name, filename)` returns a sink
+    with write()/close() that receives its bytes, or None to skip the part.
+    Returns the text fields. Raises UploadError on an oversized field or a
+    truncated body.
+    """
+    decoder = MultipartDecoder(boundary, max_form_memory_size=_MAX_BUFFER)
+    fields: Dict[str, str] = {}
+    part, sink, value = None, None, None
+
+    while True:
+        chunk = stream.read(chunk_size)
+        decoder.receive_data(chunk or None)
+        event = _next_event(decoder)
+        while not isinstance(event, (Epilogue, NeedData)):
+            if isinstance(event, Field):
+                part, sink, value = event, None, bytearray()
+            elif isinstance(event, File):
+                part, sink, value = event, open_file(event.name, event.filename or ''), None
+            elif isinstance(event, Data):
+                if value is not None:
+                    value += event.data
+                    if len(value) > MAX_FIELD_SIZE:
+                        raise UploadError(f"Field '{part.name}' is too large")
+                elif sink is not None:
+                    sink.write(event.data)
+                if not event.more_data:
+                    if value is not None:
+                        fields.setdefault(part.name, value.decode('utf-8', 'replace'))
+                    elif sink is not None:
+                        sink.close()
+                    part, sink, value = None, None, None
+            event = _next_event(decoder)
+        if isinstance(event, Epilogue):
+            return fields
+        if not chunk:
+            raise UploadError('Upload ended unexpectedly')
+
+
+class DocumentUpload:
+    """
+    Receives a document upload form (see the module docstring) for the
+    document `document_id` (the file is encrypted bound to it). Blobs are
+    only kept if `commit()` is called; leaving the `with` block otherwise
+    discards them, e.g. when the document turns out to be a duplicate.
+    """
+
+    def __init__(self, store: BlobStore, document_id: str,
+                 allowed: Callable[[str], bool] = lambda name: True):
+        self.store = store
+        self.document_id = document_id
+        self.allowed = allowed
+        self.fields: Dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.document: Optional[EncryptingSink] = None
+        self.proof_filename: Optional[str] = None
+        self.proof: Optional[BlobWriter] = None
+
+    def _open_file(self, name: str, filename: str):
+        if name == 'file' and self.filename is None:
+            self.filename = filename
+            if not filename:
+                return None
+            if not self.allowed(filename):
+                raise UploadError('File type not allowed')
+            self.document = EncryptingSink(self.store, self.document_id)
+            return self.document
+        if name == 'proofOfWork' and self.proof is None and filename:
+            sink = _PlainSink(self.store)
+            self.proof_filename, self.proof = filename, sink.blob
+            return sink
+        return None
+
+    def receive(self, stream: BinaryIO, boundary: bytes):
+        """Consume the request body."""
+        self.fields = parse_multipart(stream, boundary, self._open_file)
+
+    def receive_file(self, filename: str, chunks: Iterable[bytes]):
+        """Take the document from `chunks` rather than the form (resumable uploads)."""
+        self.filename = filename
+        self.document = EncryptingSink(self.store, self.document_id)
+        for data in chunks:
+            self.document.write(data)
+        self.document.close()
+
+    def commit(self):
+        """Keep the received blobs (their refs are then on `.document.blob` / `.proof`)."""
+        if self.document is not None:
+            self.document.blob.commit()
+        if self.proof is not None:
+            self.proof.commit()
+
+    def discard(self):
+        if self.document is not None:
+            self.document.blob.abort()
+        if self.proof is not None:
+            self.proof.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.discard()
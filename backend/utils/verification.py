@@ -0,0 +1,136 @@
+"""
+Inventa Proof Verification
+==========================
+Cryptographic checks of ownership proofs.
+
+At registration the owner's private key signs "hash:timestamp:user_id"
+(`signature_message`). A proof, as returned by /api/proof/<id>, carries
+those fields and the signature. Verifying it:
+
+- the signature must check out against the owner's public key as
+  registered here, never a key supplied with the proof
+- a registered document must match the proof's hash, owner and timestamp
+
+A proof may also name just a document (document_id or document_hash), in
+which case the stored record's own signature is checked. Batches are
+spread over a thread pool; public keys come from `utils.keycache`.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from config import get_config
+from utils.crypto import verify_signature
+from utils.database import db
+
+config = get_config()
+
+
+def signature_message(doc_hash: str, timestamp: str, user_id: str) -> str:
+    """The string signed when a document is registered."""
+    return f"{doc_hash}:{timestamp}:{user_id}"
+
+
+class ProofVerifier:
+    """Verifies ownership proofs against `database`, `workers` at a time in batches."""
+
+    def __init__(self, database, workers: int = 4):
+        self.db = database
+        self.workers = max(workers, 1)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The parent's pool threads do not exist in the child
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='verify')
+        return self._executor
+
+    def verify(self, proof) -> dict:
+        """
+        Verify one proof. Returns a result with `verified` (signature valid
+        and matching registration), `signatureValid`, `registered` and, when
+        something is off, an `error` explaining what.
+        """
+        if not isinstance(proof, dict):
+            return {'verified': False, 'signatureValid': False, 'registered': False,
+                    'error': 'Proof must be a JSON object'}
+
+        document = None
+        if proof.get('document_id'):
+            document = self.db.get_document_by_id(str(proof['document_id']))
+        elif proof.get('document_hash'):
+            document = self.db.get_document_by_hash(str(proof['document_hash']).strip().lower())
+
+        # Fields missing from the proof come from the registered record
+        stored = document or {}
+        doc_hash = str(proof.get('document_hash') or stored.get('hash') or '').strip().lower()
+        timestamp = proof.get('timestamp') or stored.get('timestamp')
+        owner_id = proof.get('owner_id') or stored.get('user_id')
+        signature = proof.get('signature') or stored.get('signature')
+
+        result = {
+            'verified': False,
+            'signatureValid': False,
+            'registered': False,
+            'documentId': stored.get('id'),
+            'hash': doc_hash or None,
+            'ownerId': owner_id
+        }
+
+        if not (doc_hash and timestamp and owner_id and signature):
+            if document is None and (proof.get('document_id') or proof.get('document_hash')):
+                result['error'] = 'No registration found for this document'
+            else:
+                result['error'] = 'Proof needs document_hash, timestamp, owner_id and signature'
+            return result
+
+        owner = self.db.get_user_by_id(str(owner_id))
+        if not owner or not owner.get('public_key'):
+            result['error'] = 'Unknown owner'
+            return result
+
+        result['signatureValid'] = verify_signature(
+            signature_message(doc_hash, timestamp, owner_id),
+            signature,
+            owner['public_key'],
+            owner['id']
+        )
+
+        if document is None:
+            document = self.db.get_document_by_hash(doc_hash)
+        result['registered'] = bool(
+            document
+            and document.get('hash') == doc_hash
+            and document.get('user_id') == owner_id
+            and document.get('timestamp') == timestamp
+        )
+        if document and result['registered']:
+            result['documentId'] = document['id']
+
+        result['verified'] = result['signatureValid'] and result['registered']
+        if not result['signatureValid']:
+            result['error'] = 'Signature does not match the owner\'s registered key'
+        elif not result['registered']:
+            result['error'] = 'No registration matches this proof'
+        return result
+
+    def verify_many(self, proofs: List) -> List[dict]:
+        """Verify proofs in parallel; results are in input order."""
+        if len(proofs) <= 1:
+            return [self.verify(proof) for proof in proofs]
+        return list(self._pool().map(self.verify, proofs))
+
+
+# Create a global verifier
+proof_verifier = ProofVerifier(db, config.VERIFY_WORKERS)
@@ -8,6 +8,16 @@ Usage:
 """
 
 from app import app
+from utils.keypool import keypair_pool
+from utils.envelope import rewrap_job
+from utils.upload_sessions import upload_sessions
+
+# Have key pairs ready before the first registrations
+keypair_pool.start()
+# Move document keys to the active master key (one worker at a time)
+rewrap_job.start()
+# Remove abandoned upload sessions even when no new ones are opened
+upload_sessions.start()
 
 if __name__ == '__main__':
     app.run()